@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Stand-in for an OpenAI-compatible chat completions endpoint, used by the benchmark.
+
+Every conversation follows the same script: the model makes `--tool-turns` calls to
+`get_cwd`, then answers with `--reply-tokens` tokens. Calls use the `[[qwen-tool-start]]`
+text protocol, or native tool_calls when the request passes `tools`. Replies stream at `--tokens-per-second` after an initial
+`--latency` delay, so the numbers the benchmark reports reflect the agent loop rather
+than a real model.
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOOL_CALL = '[[qwen-tool-start]]\n```\n{"name": "get_cwd", "input": ""}\n```\n[[qwen-tool-end]]'
+# Stands in for the reply's tokens when the model makes a native tool call
+NATIVE_TOOL_CALL = object()
+WORDS = ["The", " quick", " brown", " fox", " jumps", " over", " the", " lazy", " dog", "."]
+
+
+def scripted_reply(messages, tool_turns, reply_tokens, native=False):
+    """
+    Decide what the model says next, based on how many tool results it has seen.
+
+    Args:
+        messages (list): The conversation sent by the agent
+        tool_turns (int): Number of tool calls to make before answering
+        reply_tokens (int): Number of tokens in the final answer
+        native (bool): Make tool calls as tool_calls instead of text
+
+    Returns:
+        list: The reply as a list of tokens
+    """
+    tool_results = sum(
+        1 for message in messages
+        if message.get('role') == 'tool'
+        or (message.get('role') == 'user' and str(message.get('content', '')).startswith('Tool result'))
+    )
+    if tool_results < tool_turns:
+        return ["Let", " me", " check", ".\n"] + [NATIVE_TOOL_CALL if native else TOOL_CALL]
+    return [WORDS[i % len(WORDS)] for i in range(reply_tokens)]
+
+
+def apply_stop(tokens, stop):
+    """Cut the reply where a real model would halt on one of the stop sequences."""
+    if not stop:
+        return tokens
+    stops = [stop] if isinstance(stop, str) else stop
+    kept = []
+    for token in tokens:
+        for sequence in stops:
+            if sequence in token:
+                kept.append(token[:token.index(sequence)])
+                return kept
+        kept.append(token)
+    return kept
+
+
+class MockUpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    options = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Connection warm-up hits /models
+        if self.path.rstrip('/').endswith('/models'):
+            self.send_json({"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self.send_json({"error": "not found"}, 404)
+            return
+
+        options = self.options
+        tokens = scripted_reply(body.get('messages', []), options.tool_turns, options.reply_tokens, native=bool(body.get('tools')))
+        tokens = apply_stop(tokens, body.get('stop'))
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get('model', 'mock')}
+        interval = 1.0 / options.tokens_per_second if options.tokens_per_second > 0 else 0.0
+
+        finish_reason = "stop"
+        time.sleep(options.latency)
+        started = time.perf_counter()
+        for i, token in enumerate(tokens):
+            # Pace against the start time so sleep overshoot does not accumulate
+            delay = started + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if token is NATIVE_TOOL_CALL:
+                call = {"index": 0, "id": f"call_{i}", "type": "function", "function": {"name": "get_cwd", "arguments": "{}"}}
+                self.send_event({**base, "choices": [{"index": 0, "delta": {"tool_calls": [call]}, "finish_reason": None}]})
+                finish_reason = "tool_calls"
+            else:
+                self.send_event({**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+        self.send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]})
+        self.send_chunk(b'data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def send_event(self, obj):
+        self.send_chunk(('data: ' + json.dumps(obj) + '\n\n').encode())
+
+    def send_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+
+def serve(options):
+    handler = type('Handler', (MockUpstreamHandler,), {'options': options})
+    server = ThreadingHTTPServer((options.host, options.port), handler)
+    server.daemon_threads = True
+    print(f"Mock upstream listening on http://{options.host}:{options.port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible streaming server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0,
+                        help="Streaming rate of each reply, 0 for unthrottled (default: 200)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Seconds before the first token of each reply (default: 0.05)")
+    parser.add_argument("--tool-turns", type=int, default=1,
+                        help="Tool calls the model makes before answering (default: 1)")
+    parser.add_argument("--reply-tokens", type=int, default=100,
+                        help="Tokens in the final answer (default: 100)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    serve(parse_args())
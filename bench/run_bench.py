@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the chat API, runnable offline.
+
+Starts `bench/mock_upstream.py`, starts the API server with `USE_BASE_URL` pointing at
+it, then runs concurrent `/api/chat` conversations against the server and reports
+requests per second, time to first chunk, end-to-end latency percentiles and the
+server's memory growth.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers, or None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def child_pids(pid):
+    """Direct children of a process, read from /proc."""
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def read_rss(pid):
+    """
+    Resident set size of a process and its descendants in bytes.
+
+    hypercorn serves from a worker process, so the whole tree is counted.
+    Returns None where /proc is unavailable.
+    """
+    total = None
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        pending.extend(child_pids(current))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total = (total or 0) + int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+def wait_for(url, process, timeout=30.0, interval=0.1):
+    """Poll a URL until it answers, so the benchmark does not time server startup."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} before {url} answered")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(interval)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def start_mock(options):
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "mock_upstream.py"),
+        "--port", str(options.mock_port),
+        "--tokens-per-second", str(options.tokens_per_second),
+        "--latency", str(options.latency),
+        "--tool-turns", str(options.tool_turns),
+        "--reply-tokens", str(options.reply_tokens),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    wait_for(f"http://127.0.0.1:{options.mock_port}/v1/models", process)
+    return process
+
+
+def start_server(options, session_dir):
+    """
+    Start the API server and wait until it answers.
+
+    Returns:
+        tuple: (process, seconds from launch until /metrics first answered)
+    """
+    env = dict(os.environ)
+    env.update({
+        "USE_BASE_URL": f"http://127.0.0.1:{options.mock_port}/v1",
+        "USE_API_KEY": "bench",
+        "MODEL_NAME": "mock",
+        "API_PORT": str(options.port),
+        "SESSION_DIR": session_dir,
+    })
+    if options.server == "async":
+        command = [sys.executable, "-m", "hypercorn", "qwen_api_async:app", "--bind", f"127.0.0.1:{options.port}"]
+    else:
+        # The Flask CLI without the reloader keeps the server in a single process we can measure
+        command = [sys.executable, "-m", "flask", "--app", "qwen_api", "run",
+                   "--port", str(options.port), "--no-reload", "--no-debugger", "--with-threads"]
+    log = open(os.path.join(session_dir, "server.log"), "w")
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wait_for(f"http://127.0.0.1:{options.port}/metrics", process, interval=0.01)
+    return process, time.perf_counter() - started
+
+
+def run_conversation(url, prompt, max_tokens):
+    """
+    Send one chat request and time it.
+
+    Returns:
+        dict: time_to_first_chunk and latency in seconds, or an error message
+    """
+    payload = {
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.0,
+        "max_output_tokens": max_tokens,
+    }
+    started = time.perf_counter()
+    first_chunk = None
+    try:
+        with requests.post(url, json=payload, stream=True, timeout=300) as response:
+            if response.status_code != 200:
+                return {"error": f"HTTP {response.status_code}"}
+            # iter_content with no chunk size yields data as soon as it arrives
+            for data in response.iter_content(chunk_size=None):
+                if data and first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+    except requests.RequestException as e:
+        return {"error": str(e)}
+    return {"time_to_first_chunk": first_chunk, "latency": time.perf_counter() - started}
+
+
+def run_load(url, total, concurrency, max_tokens):
+    """Run `total` conversations with `concurrency` in flight and collect their timings."""
+    results = []
+    lock = threading.Lock()
+    remaining = iter(range(total))
+
+    def worker():
+        while True:
+            with lock:
+                n = next(remaining, None)
+            if n is None:
+                return
+            result = run_conversation(url, f"Benchmark conversation {n}", max_tokens)
+            with lock:
+                results.append(result)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed, rss_before, rss_after, server_start):
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency"] for r in ok]
+    first_chunks = [r["time_to_first_chunk"] for r in ok if r["time_to_first_chunk"] is not None]
+    report = {
+        "server_start_seconds": server_start,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "elapsed": elapsed,
+        "requests_per_second": len(ok) / elapsed if elapsed else None,
+        "time_to_first_chunk_p50": percentile(first_chunks, 50),
+        "time_to_first_chunk_p99": percentile(first_chunks, 99),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "rss_before": rss_before,
+        "rss_after": rss_after,
+        "rss_growth": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+    }
+    errors = sorted({r["error"] for r in results if "error" in r})
+    if errors:
+        report["error_samples"] = errors[:5]
+    return report
+
+
+def print_report(report, options):
+    def ms(value):
+        return "n/a" if value is None else f"{value * 1000:.1f} ms"
+
+    def mib(value):
+        return "n/a" if value is None else f"{value / (1024 * 1024):.1f} MiB"
+
+    print(f"\nServer: {options.server}, concurrency {options.concurrency}, "
+          f"{options.tokens_per_second:g} tokens/s, {options.latency:g}s upstream latency, "
+          f"{options.tool_turns} tool turn(s)")
+    print(f"Server cold start:    {ms(report['server_start_seconds'])}")
+    print(f"Requests:             {report['requests']} ({report['errors']} errors) in {report['elapsed']:.2f}s")
+    print(f"Requests per second:  {report['requests_per_second']:.2f}")
+    print(f"Time to first chunk:  p50 {ms(report['time_to_first_chunk_p50'])}, p99 {ms(report['time_to_first_chunk_p99'])}")
+    print(f"End-to-end latency:   p50 {ms(report['latency_p50'])}, p99 {ms(report['latency_p99'])}")
+    print(f"Server RSS:           {mib(report['rss_before'])} -> {mib(report['rss_after'])} "
+          f"(growth {mib(report['rss_growth'])})")
+    for error in report.get("error_samples", []):
+        print(f"  error: {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chat API against a mock upstream")
+    parser.add_argument("--server", choices=["flask", "async"], default="flask",
+                        help="Which API server to benchmark (default: flask)")
+    parser.add_argument("--port", type=int, default=18101, help="Port for the API server (default: 18101)")
+    parser.add_argument("--mock-port", type=int, default=18080, help="Port for the mock upstream (default: 18080)")
+    parser.add_argument("--requests", type=int, default=200, help="Conversations to run (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Conversations in flight (default: 16)")
+    parser.add_argument("--warmup", type=int, default=10, help="Conversations run before measuring (default: 10)")
+    parser.add_argument("--max-tokens", type=int, default=1000, help="max_output_tokens per request (default: 1000)")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0,
+                        help="Mock upstream streaming rate, 0 for unthrottled (default: 200)")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="Mock upstream delay before the first token (default: 0.05)")
+    parser.add_argument("--tool-turns", type=int, default=1,
+                        help="Tool calls per conversation before the answer (default: 1)")
+    parser.add_argument("--reply-tokens", type=int, default=100,
+                        help="Tokens in each final answer (default: 100)")
+    parser.add_argument("--json", type=str, help="Also write the report to this file as JSON")
+    return parser.parse_args(argv)
+
+
+def main():
+    options = parse_args()
+    url = f"http://127.0.0.1:{options.port}/api/chat"
+
+    with tempfile.TemporaryDirectory(prefix="qwen-bench-") as session_dir:
+        mock = start_mock(options)
+        server = None
+        try:
+            server, server_start = start_server(options, session_dir)
+            if options.warmup:
+                run_load(url, options.warmup, min(options.concurrency, options.warmup), options.max_tokens)
+
+            rss_before = read_rss(server.pid)
+            results, elapsed = run_load(url, options.requests, options.concurrency, options.max_tokens)
+            rss_after = read_rss(server.pid)
+        finally:
+            for process in (server, mock):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+
+    report = summarize(results, elapsed, rss_before, rss_after, server_start)
+    print_report(report, options)
+    if options.json:
+        with open(options.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,6 +19,9 @@ from rich import box
 stop_streaming = False
 console = Console()
 conversation_history = []
+session_id = None
+use_sessions = True
+show_stats = False
 
 #FIXME: DELETE ME
 # def signal_handler(sig, frame):
@@ -96,23 +99,69 @@ def format_tool_result(result):
         return Panel(f"Error formatting tool result: {str(e)}\n\nOriginal result: {result}", 
                    title="Tool Result (Error)", border_style="red", box=box.ROUNDED)
 
-def process_streaming_response(url, messages, temperature=0.4, max_tokens=2000):
-    """Process streaming response from the API"""
-    global stop_streaming
-    stop_streaming = False
-    
+def get_sessions_url(url):
+    """Derive the sessions endpoint from the chat endpoint URL"""
+    return url.rsplit("/api/chat", 1)[0] + "/api/sessions"
+
+def start_session(url, messages):
+    """Create a server-side session seeded with the given conversation"""
+    global session_id
+    response = requests.post(get_sessions_url(url), json={"messages": messages})
+    response.raise_for_status()
+    session_id = response.json()["session_id"]
+
+def post_chat(url, messages, temperature, max_tokens):
+    """Send a chat request, using a server-side session unless running stateless"""
     payload = {
-        "messages": messages,
         "temperature": temperature,
         "max_output_tokens": max_tokens
     }
+    if show_stats:
+        payload["stats"] = True
+
+    if not use_sessions:
+        payload["messages"] = messages
+        return requests.post(url, json=payload, stream=True, headers={'Accept': 'text/event-stream'})
+
+    # Only the new message is sent; the server keeps the rest of the conversation
+    for attempt in range(2):
+        if session_id is None:
+            start_session(url, messages[:-1])
+        payload["session_id"] = session_id
+        payload["message"] = messages[-1]["content"]
+        response = requests.post(url, json=payload, stream=True, headers={'Accept': 'text/event-stream'})
+        if response.status_code != 404:
+            return response
+        # The server no longer has the session; start a new one from our copy
+        start_session(url, messages[:-1])
+    return response
+
+def print_stats(stats):
+    """Print the timing summary the server sends at the end of a response"""
+    ttft = stats.get('time_to_first_token')
+    line = f"{stats['wall_time']:.2f}s total, {stats['iterations']} upstream call(s)"
+    if ttft is not None:
+        line += f", first token after {ttft:.2f}s"
+    if stats.get('tools'):
+        tool_time = sum(tool['seconds'] for tool in stats['tools'])
+        line += f", {len(stats['tools'])} tool call(s) in {tool_time:.2f}s"
+    if stats.get('context_tokens_saved'):
+        line += f", {stats['context_tokens_saved']} context tokens saved"
+    console.print(f"[dim]{line}[/dim]")
+
+def process_streaming_response(url, messages, temperature=0.4, max_tokens=2000):
+    """Process streaming response from the API"""
+    global stop_streaming
+    stop_streaming = False
     
     try:
         # Set up streaming request
-        response = requests.post(url, json=payload, stream=True, headers={'Accept': 'text/event-stream'})
+        response = post_chat(url, messages, temperature, max_tokens)
         
         assistant_message = ""
         full_response = []
+        request_stats = None
+        tool_output = {}  # call index -> output streamed so far
         
         # Show a message while waiting for the first response
         console.print("[dim]Waiting for response...[/dim]")
@@ -154,20 +203,32 @@ def process_streaming_response(url, messages, temperature=0.4, max_tokens=2000):
                                 full_response.append({"role": "assistant", "content": assistant_message})
                                 conversation_history.append({"role": "assistant", "content": assistant_message})
                             
+                    elif role == 'tool_chunk':
+                        # Output of a tool that is still running, replaced by its result
+                        index = data.get('index', 0)
+                        tool_output[index] = tool_output.get(index, '') + content
+                        tail = '\n'.join(tool_output[index].splitlines()[-20:])
+                        live.update(Panel(Text(tail), title=f"[dim]{data.get('tool', 'tool')} (running)[/dim]", border_style="dim"))
+
                     elif role == 'tool_call':
                         # Tool call result
+                        tool_output.pop(data.get('index', 0), None)
                         formatted_result = format_tool_result(content)
                         live.update(formatted_result)
                         full_response.append({"role": "tool", "content": content})
                         conversation_history.append({"role": "user", "content": content})
+
+                    elif role == 'system' and msg_type == 'stats':
+                        request_stats = content
                 
                 except json.JSONDecodeError as e:
                     # If we can't parse as JSON, let's just show the raw data
                     if chunk and len(chunk) > 0:  # Only display non-empty chunks
                         live.update(f"[red]Error parsing JSON: {e}[/red]\n[dim]Raw data: {chunk}[/dim]")
-        
 
-        
+        if request_stats:
+            print_stats(request_stats)
+
         # If we got no response at all
         if not assistant_message and not full_response:
             console.print("[yellow]No response received from the server. You might need to check API connectivity or server logs.[/yellow]")
@@ -195,11 +256,13 @@ def save_conversation(filename=None):
 
 def load_conversation(filename):
     """Load a conversation history from a file"""
-    global conversation_history
+    global conversation_history, session_id
     
     try:
         with open(filename, 'r') as f:
             conversation_history = json.load(f)
+        # The next message starts a new server-side session from the loaded history
+        session_id = None
         console.print(f"[green]Loaded conversation from {filename}[/green]")
         
         # Display the loaded conversation
@@ -290,8 +353,16 @@ def main():
     parser.add_argument("--tokens", type=int, default=8000,
                       help="Max tokens (default: 8000)")
     parser.add_argument("--load", type=str, help="Load conversation from file")
+    parser.add_argument("--stateless", action="store_true",
+                      help="Send the whole conversation with every request instead of using a server-side session")
+    parser.add_argument("--stats", action="store_true",
+                      help="Print timing statistics after each response")
     args = parser.parse_args()
 
+    global use_sessions, show_stats
+    use_sessions = not args.stateless
+    show_stats = args.stats
+
     #FIXME: DELETE ME    
     # # Set up signal handling for Ctrl+Q (need to map in terminal)
     # signal.signal(signal.SIGQUIT, signal_handler)
@@ -314,7 +385,7 @@ def main():
     if args.load:
         load_conversation(args.load)
     
-    global conversation_history
+    global conversation_history, session_id
 
     # Main interaction loop
     while True:
@@ -347,6 +418,7 @@ def main():
                     display_conversation_history()
                 elif cmd == "/clear":
                     conversation_history = []
+                    session_id = None
                     console.print("[green]Conversation history cleared[/green]")
                 elif cmd == "/temp":
                     if len(cmd_parts) > 1:
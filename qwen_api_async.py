@@ -0,0 +1,127 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, request, jsonify, Response
+from quart_cors import cors
+
+from qwen_api_lib import config
+from qwen_api_lib.metrics import registry
+from qwen_api_lib.sessions import SessionNotFound, SessionBusy
+from qwen_tools_lib.registry import tool_registry
+from qwen_tools_lib.sandbox import worker_pool, kernels
+from qwen_api_lib.agent import upstream, tool_cache, session_store, load_conversation, arecord_session, ainference_loop, format_messages
+
+# Asyncio serving mode: same endpoints and NDJSON stream format as qwen_api.py,
+# but each open stream is a coroutine instead of a worker thread.
+#
+#   python qwen_api_async.py
+#   hypercorn qwen_api_async:app --bind 0.0.0.0:5002
+
+app = cors(Quart(__name__), allow_origin="*")
+
+# Agent loops can stream for much longer than Quart's default 60 second limit
+app.config['RESPONSE_TIMEOUT'] = None
+
+
+@app.before_serving
+async def startup():
+    # Blocking tools run on this executor, so it bounds concurrent tool calls, not streams
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=config.tool_executor_workers))
+
+    # Open upstream connections before the first request arrives
+    await upstream.awarm(connections=config.upstream_warm_connections)
+
+    # Start Python workers so the first python_execute_* call does not wait for one
+    if tool_registry.enabled("python_tools"):
+        worker_pool.start()
+
+
+@app.after_serving
+async def shutdown():
+    await upstream.aclose()
+    worker_pool.close()
+    kernels.close()
+
+
+@app.route('/api/chat', methods=['POST'])
+async def query_endpoint():
+    try:
+        # Parse JSON payload from the request
+        payload = await request.get_json()
+        temperature = float(payload.get('temperature', 0.7))
+        max_output_tokens = int(payload.get('max_output_tokens', 1000))
+        parallel_tools = bool(payload.get('parallel_tool_calls', config.parallel_tool_calls))
+        include_stats = bool(payload.get('stats', False))
+        context_budget = payload.get('context_token_budget')
+        if context_budget is not None:
+            context_budget = int(context_budget)
+        messages, session_id = load_conversation(payload)
+
+        data = format_messages(messages, parallel_tools)
+        messages = data['messages']
+
+        if session_id is None:
+            print("Received messages:", messages)
+
+        async def generate_responses():
+            lines = ainference_loop(messages, temperature, max_output_tokens, parallel_tools, context_budget, include_stats, session_id)
+            async for line in arecord_session(lines, session_id, messages):
+                yield line
+
+        # Return a streaming response with the correct content type
+        return Response(generate_responses(), content_type='text/event-stream')
+
+    except SessionNotFound:
+        return {"error": "Session not found"}, 404
+    except SessionBusy as e:
+        return {"error": str(e)}, 409
+    except Exception as e:
+        # Handle errors gracefully
+        return {"error": str(e)}, 400
+
+
+@app.route('/api/sessions', methods=['POST'])
+async def create_session_endpoint():
+    # Optionally seed the session with an existing conversation
+    payload = (await request.get_json(silent=True)) or {}
+    session_id = session_store.create(payload.get('messages', []))
+    return jsonify({"session_id": session_id}), 201
+
+
+@app.route('/api/sessions/<session_id>', methods=['GET'])
+async def get_session_endpoint(session_id):
+    try:
+        return jsonify({"session_id": session_id, "messages": session_store.load(session_id)})
+    except SessionNotFound:
+        return {"error": "Session not found"}, 404
+
+
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+async def delete_session_endpoint(session_id):
+    try:
+        session_store.delete(session_id)
+        # The session's Python kernel goes with it
+        kernels.shutdown(session_id)
+        return jsonify({"session_id": session_id, "deleted": True})
+    except SessionNotFound:
+        return {"error": "Session not found"}, 404
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics_endpoint():
+    return Response(registry.render(), content_type='text/plain; version=0.0.4')
+
+
+@app.route('/api/upstream/stats', methods=['GET'])
+async def upstream_stats_endpoint():
+    return jsonify(upstream.stats())
+
+
+@app.route('/api/tools/cache/stats', methods=['GET'])
+async def tool_cache_stats_endpoint():
+    return jsonify(tool_cache.stats() if tool_cache else {"enabled": False})
+
+
+if __name__ == '__main__':
+    app.run(port=config.api_port)
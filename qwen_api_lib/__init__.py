@@ -0,0 +1 @@
+from .upstream import *
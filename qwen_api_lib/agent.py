@@ -0,0 +1,856 @@
+import asyncio
+import json
+import queue
+import time
+import qwen_tools_lib
+from concurrent.futures import ThreadPoolExecutor
+from qwen_tools_lib import runtime
+from qwen_tools_lib.code_cache import compile_cache
+from qwen_tools_lib.prefetch import page_prefetcher
+from qwen_tools_lib.registry import ToolArgumentError, tool_registry
+from qwen_tools_lib.spill import make_preview, spill_store
+
+from . import config
+from .context import ContextBudget
+from .metrics import Gauge, RequestStats, record_tool, registry
+from .prompt_cache import SystemPromptCache
+from .sessions import SessionStore
+from .tool_cache import ToolResultCache
+from .tool_calls import NativeToolCallDetector, ToolCallDetector
+from .tool_executor import TIMEOUT_GRACE_SECONDS, is_read_only, plan_batches, tool_timeout
+from .upstream import UpstreamClientManager
+
+# Shared upstream connection pools, created once per process
+upstream = UpstreamClientManager(
+    api_key=config.api_key,
+    base_url=config.base_url,
+    max_connections=config.upstream_max_connections,
+    max_keepalive_connections=config.upstream_max_keepalive,
+    keepalive_expiry=config.upstream_keepalive_expiry
+)
+
+# Results of idempotent tools, reused until the state they depend on changes
+tool_cache = None
+if config.tool_cache_enabled:
+    tool_cache = ToolResultCache(
+        max_entries=config.tool_cache_max_entries,
+        max_bytes=config.tool_cache_max_bytes,
+        web_ttl=config.tool_cache_web_ttl,
+        git_status_ttl=config.tool_cache_git_status_ttl
+    )
+
+# Cache and connection pool state, sampled when /metrics is scraped
+if tool_cache is not None:
+    registry.register(Gauge(
+        "qwen_tool_cache_entries", "Results held in the tool result cache",
+        function=lambda: {(): tool_cache.stats()["entries"]}))
+    registry.register(Gauge(
+        "qwen_tool_cache_lookups", "Tool result cache lookups since startup", ["result"],
+        function=lambda: {("hit",): tool_cache.hits, ("miss",): tool_cache.misses}))
+registry.register(Gauge(
+    "qwen_python_compile_cache_lookups", "Compiled Python source cache lookups since startup", ["result"],
+    function=lambda: {("hit",): compile_cache.hits, ("miss",): compile_cache.misses}))
+if page_prefetcher.enabled:
+    registry.register(Gauge(
+        "qwen_web_prefetch_lookups", "fetch_web_page lookups of prefetched pages since startup", ["result"],
+        function=lambda: {("hit",): page_prefetcher.hits, ("miss",): page_prefetcher.misses}))
+registry.register(Gauge(
+    "qwen_upstream_open_connections", "Open upstream connections", ["base_url", "mode"],
+    function=lambda: {
+        (base_url, mode): pool.get("open_connections", 0)
+        for mode, pools in (("sync", upstream.stats()["pools"]), ("async", upstream.stats()["async_pools"]))
+        for base_url, pool in pools.items()
+    }))
+
+# Server-side conversations, for clients that only send each new message
+session_store = SessionStore(config.session_dir)
+
+# Tool calls run here, so the loop can stop waiting for one that overruns its
+# deadline; calls detected mid-stream start without waiting for the stream to end
+tool_pool = ThreadPoolExecutor(max_workers=config.tool_pool_size)
+
+
+# Sent while a tool runs. Clients skip blank lines; writing them lets the server
+# notice a client that has disconnected, so the tool can be cancelled
+KEEPALIVE_LINE = "\n"
+KEEPALIVE_INTERVAL = 1.0
+
+# Output streamed per tool call as tool_chunk events; the model still gets the full result
+MAX_STREAMED_TOOL_OUTPUT = 256 * 1024
+
+INVALID_TOOL_CALL_MESSAGE = "No valid tool call found. Please make sure tool request is valid JSON, and escape necessary characters. Try again with better-formatted JSON"
+
+
+def completion_args(messages, temperature, max_tokens, parallel_tools=False):
+    """
+    Build the upstream chat completion arguments for one turn of the agent loop.
+    """
+    args = {
+        "model": config.model_name,
+        "messages": messages,
+        "stream": True,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if config.native_tool_calls:
+        args["tools"] = tool_registry.schema()
+        args["parallel_tool_calls"] = parallel_tools
+    # With parallel tool calls the model may emit several tool blocks, so the
+    # response must not stop at the first one
+    elif not parallel_tools:
+        args["stop"] = ["[[qwen-tool-end]]"]
+    return args
+
+
+class AssistantTurn:
+    """
+    One turn of the agent loop: a streamed assistant response and its tool call.
+
+    The same turn logic is driven by the Flask generator (inference_loop) and by the
+    asyncio server (ainference_loop); only the upstream I/O differs between them.
+    With TOOL_CALL_MODE=native, calls come from the response's tool_calls instead of
+    its text, and results go back as "tool" messages.
+    """
+
+    def __init__(self, parallel_tools=False, stats=None, session_id=None):
+        """
+        Args:
+            parallel_tools (bool): Accept several tool calls in one response and run
+                independent ones concurrently, instead of rejecting the response.
+            stats (RequestStats, optional): Timers for the request this turn belongs to.
+            session_id (str, optional): The session the request belongs to, so tools
+                can keep per-session state such as a Python kernel.
+        """
+        self.native_tools = config.native_tool_calls
+        self.detector = NativeToolCallDetector() if self.native_tools else ToolCallDetector()
+        self.parallel_tools = parallel_tools
+        self.stats = stats
+        self.session_id = session_id
+        self.started = {}  # call index -> Future of a started tool call
+        self.invocations = {}  # call index -> ToolInvocation with its deadline
+        self.output = queue.Queue()  # (call index, text) from running tools; text None when a call ends
+        self._backlog = []  # output taken off the queue while waiting, not yet sent
+        self._streamed = {}  # call index -> characters streamed so far
+        self._mutating_call_seen = False
+
+    @property
+    def assistant_response(self):
+        return self.detector.text
+
+    def feed(self, chunk):
+        """
+        Process one streamed upstream chunk.
+
+        Args:
+            chunk: A chat completion chunk from the upstream stream.
+
+        Returns:
+            list: NDJSON lines to stream to the client.
+        """
+        if not chunk.choices:
+            return []
+        delta = chunk.choices[0].delta
+
+        if self.native_tools and delta.tool_calls:
+            if self.stats is not None:
+                self.stats.upstream_chunk("".join((call.function and call.function.arguments) or "" for call in delta.tool_calls))
+            for call in self.detector.feed_tool_calls(delta.tool_calls):
+                self.dispatch(call)
+
+        if delta.content is None:
+            return []
+
+        # Get the text chunk
+        content = delta.content
+        if self.stats is not None:
+            self.stats.upstream_chunk(content)
+
+        # Accumulate the full response and watch for tool calls as they complete
+        for call in self.detector.feed(content):
+            self.dispatch(call)
+
+        # Stream the chunk to the frontend
+        return [json.dumps({'role': 'assistant', 'content': content, 'type': 'chunk'}) + "\n"]
+
+    def dispatch(self, call):
+        """
+        Start a tool call as soon as its JSON is complete.
+
+        In single-call mode only the first call of a turn is started early, and only
+        if it is read-only: a response with several tool calls is rejected in finish(),
+        so a call that may change state waits until finish() has seen the whole
+        response. In parallel mode, read-only calls are started early until the
+        first call that may change state.
+        """
+        if self.parallel_tools:
+            if not is_read_only(call):
+                self._mutating_call_seen = True
+            if self._mutating_call_seen or not call.valid:
+                return
+        elif call.index != 0 or not call.valid or self.detector.marker_count != 1 or not is_read_only(call):
+            return
+
+        self.submit(call)
+
+    def submit(self, call):
+        """
+        Start a tool call on the tool pool, under its own deadline.
+
+        Returns:
+            Future: The running call.
+        """
+        tool_name = call.data["name"]
+        tool_input = call.data.get("input", {})
+        print(f"Executing tool: {tool_name} with input: {tool_input}")
+        task = execute_tool_safely if self.parallel_tools else execute_tool
+        index = call.index
+        invocation = runtime.ToolInvocation(
+            tool_timeout(tool_name),
+            on_output=lambda text: self.output.put((index, text)),
+            session_id=self.session_id
+        )
+        self.invocations[index] = invocation
+        future = tool_pool.submit(task, tool_name, tool_input, self.stats, invocation)
+        # Wakes watch() as soon as the call ends
+        future.add_done_callback(lambda _: self.output.put((index, None)))
+        self.started[index] = future
+        return future
+
+    def overdue(self, call):
+        invocation = self.invocations[call.index]
+        return invocation.cancelled or invocation.expired(TIMEOUT_GRACE_SECONDS)
+
+    def abandon(self, call):
+        """
+        Stop waiting for a call that is past its deadline, killing its subprocesses.
+
+        Returns:
+            str: The error reported to the model instead of the result.
+        """
+        invocation = self.invocations[call.index]
+        was_cancelled = invocation.cancelled
+        invocation.cancel()
+        self.started[call.index].cancel()
+        if was_cancelled:
+            return "Error: Tool call cancelled"
+        return f"Error: Tool '{call.data['name']}' did not finish within {invocation.timeout:g} seconds"
+
+    def watch(self, calls):
+        """
+        Wait until at least one of the started calls has ended, streaming their output.
+
+        This is a generator of NDJSON lines: tool_chunk events with output the tools
+        emit while they run, or keep-alive lines while there is none. Calls past their
+        deadline are abandoned.
+
+        Args:
+            calls (list): ParsedToolCall objects that have been submitted.
+
+        Returns:
+            list: (call, result) pairs for the calls that ended.
+        """
+        while True:
+            # Checked before draining, so all output of an ended call is sent before its result
+            ended = [call for call in calls if self.started[call.index].done()]
+            overdue = [call for call in calls if call not in ended and self.overdue(call)]
+            lines = self.drain_output()
+            yield from lines
+            if ended or overdue:
+                return [(call, self.started[call.index].result()) for call in ended] + \
+                       [(call, self.abandon(call)) for call in overdue]
+
+            try:
+                self._backlog.append(self.output.get(timeout=KEEPALIVE_INTERVAL))
+            except queue.Empty:
+                yield KEEPALIVE_LINE
+
+    def drain_output(self):
+        """
+        Turn the output queued by running tools into tool_chunk events, one per call.
+        """
+        items, self._backlog = self._backlog, []
+        while True:
+            try:
+                items.append(self.output.get_nowait())
+            except queue.Empty:
+                break
+
+        pending = {}
+        for index, text in items:
+            if text:
+                pending[index] = pending.get(index, "") + text
+
+        lines = []
+        for index, text in pending.items():
+            streamed = self._streamed.get(index, 0)
+            if streamed >= MAX_STREAMED_TOOL_OUTPUT:
+                continue
+            if streamed + len(text) >= MAX_STREAMED_TOOL_OUTPUT:
+                text = text[:MAX_STREAMED_TOOL_OUTPUT - streamed] + "\n[... further output is not streamed ...]\n"
+            self._streamed[index] = streamed + len(text)
+            tool_name = self.detector.calls[index].data["name"]
+            lines.append(json.dumps({'role': 'tool_chunk', 'content': text, 'tool': tool_name, 'index': index}) + "\n")
+        return lines
+
+    def cancel(self):
+        """
+        Cancel every tool call of the turn, for a client that has gone away.
+        """
+        for index, invocation in self.invocations.items():
+            invocation.cancel()
+            self.started[index].cancel()
+
+    def finish(self, messages):
+        """
+        Complete the turn once the stream has ended, running any requested tool.
+
+        This is a generator of NDJSON lines. Tool execution happens inside it, so it
+        blocks and must be driven from a worker thread by async callers.
+
+        Args:
+            messages (list): The conversation, updated in place.
+
+        Returns:
+            bool: True if a tool result was added and the loop should continue.
+        """
+        if self.native_tools:
+            # Calls still open when the stream ended are complete now
+            for call in self.detector.close():
+                self.dispatch(call)
+
+        assistant_response = self.assistant_response
+
+        # After streaming is complete, add the full response to messages
+        assistant_message = {"role": "assistant", "content": assistant_response}
+        if self.native_tools and self.detector.calls:
+            assistant_message["tool_calls"] = self.detector.tool_calls()
+        messages.append(assistant_message)
+
+        # Send a completion signal
+        yield json.dumps({'role': 'assistant', 'content': '', 'type': 'done'}) + "\n"
+
+        occurrences = self.detector.marker_count
+        if occurrences > 0 and self.parallel_tools:
+            yield from self.run_parallel(messages)
+            return True
+        elif occurrences > 1:
+            #Multiple tool calls are not allowed
+            ToolErrorMsg="Tool Call Error: Multiple tool calls found. Please only use one tool at a time."
+            # A read-only first call may have been started early; its result is not used
+            self.cancel()
+            yield json.dumps({'role': 'tool_call', 'content': ToolErrorMsg}) + "\n"
+
+            if self.native_tools:
+                # Every native call needs an answer
+                messages.extend(self.tool_message(call, ToolErrorMsg) for call in self.detector.calls)
+            else:
+                messages.append({"role": "user", "content": ToolErrorMsg})
+            print(ToolErrorMsg)
+            return True
+        elif occurrences == 1:
+            call = self.detector.calls[0] if self.detector.calls else None
+            if call is None or not call.valid:
+                print(f"No valid tool call found: {call.error if call else 'incomplete JSON object'}")
+                tool_message = f"Tool result: {self.invalid_message(call)}"
+                if self.native_tools:
+                    messages.append(self.tool_message(call, self.invalid_message(call)))
+                else:
+                    messages.append({"role": "user", "content": tool_message})
+                yield json.dumps({'role': 'tool_call', 'content': tool_message}) + "\n"
+            else:
+                if 0 not in self.started:
+                    self.submit(call)
+                [(call, tool_result)] = yield from self.watch([call])
+                tool_result = compact_tool_result(call.data["name"], tool_result)
+
+                # Add the tool result to the conversation: a "user" message, or a "tool" message answering a native call
+                tool_message = f"Tool result: ```{tool_result}```"
+                if self.native_tools:
+                    messages.append(self.tool_message(call, tool_result))
+                else:
+                    messages.append({"role": "user", "content": tool_message})
+                print(f"Tool executed. Result: {tool_result}")
+
+                # Stream the tool result back to the frontend
+                yield json.dumps({'role': 'tool_call', 'content': tool_message}) + "\n"
+
+            return True
+        else:
+            # If no tool call, terminate the loop
+            return False
+
+    def invalid_message(self, call):
+        """
+        The result reported to the model for a call that could not be parsed.
+        """
+        if self.native_tools:
+            return f"Error: Invalid tool call: {call.error}. Call the function again with a JSON object of arguments."
+        return INVALID_TOOL_CALL_MESSAGE
+
+    @staticmethod
+    def tool_message(call, content):
+        """
+        A "tool" message answering a native tool call.
+        """
+        return {"role": "tool", "tool_call_id": call.call_id, "content": content if isinstance(content, str) else str(content)}
+
+    def run_parallel(self, messages):
+        """
+        Run every tool call of the turn, concurrently where they are independent.
+
+        A tool_call event is streamed for each call as it finishes, and the model
+        gets all results, in call order, as one combined message (or, with native
+        tool calls, as one "tool" message per call).
+        """
+        calls = self.detector.calls
+        results = {}
+
+        for batch in plan_batches(calls):
+            submitted = []
+            for call in batch:
+                if not call.valid:
+                    print(f"No valid tool call found: {call.error}")
+                    results[call.index] = self.invalid_message(call)
+                    yield json.dumps({'role': 'tool_call', 'content': f"Tool result: {results[call.index]}", 'index': call.index}) + "\n"
+                    continue
+
+                if call.index not in self.started:
+                    self.submit(call)
+                submitted.append(call)
+
+            pending = submitted
+            while pending:
+                for call, tool_result in (yield from self.watch(pending)):
+                    pending.remove(call)
+                    tool_result = compact_tool_result(call.data["name"], tool_result)
+                    results[call.index] = tool_result
+                    print(f"Tool executed. Result: {tool_result}")
+                    yield json.dumps({'role': 'tool_call', 'content': f"Tool result: ```{tool_result}```", 'tool': call.data["name"], 'index': call.index}) + "\n"
+
+        # A tool block whose JSON never completed
+        if self.detector.in_progress:
+            results[len(calls)] = INVALID_TOOL_CALL_MESSAGE
+            yield json.dumps({'role': 'tool_call', 'content': f"Tool result: {INVALID_TOOL_CALL_MESSAGE}", 'index': len(calls)}) + "\n"
+
+        if self.native_tools:
+            # One message per call, answering it by id
+            messages.extend(self.tool_message(calls[index], results[index]) for index in sorted(results))
+            return
+
+        total = len(results)
+        sections = []
+        for index in sorted(results):
+            name = calls[index].data["name"] if index < len(calls) and calls[index].valid else "invalid"
+            sections.append(f"Tool result ({index + 1}/{total}, {name}): ```{results[index]}```")
+        messages.append({"role": "user", "content": "\n\n".join(sections)})
+
+
+def inference_loop(messages, temperature=0.7, max_tokens=1000, parallel_tools=False, context_budget=None, include_stats=False, session_id=None):
+    client = upstream.get_client()
+    budget = ContextBudget(
+        config.context_token_budget if context_budget is None else context_budget,
+        keep_recent=config.context_keep_recent
+    )
+    stats = RequestStats("sync")
+    turn = None
+    try:
+        while True:
+            stats.upstream_started()
+            response = client.chat.completions.create(
+                **completion_args(budget.fit(messages), temperature, max_tokens, parallel_tools)
+            )
+
+            print(response)
+
+            turn = AssistantTurn(parallel_tools, stats, session_id)
+
+            # Iterate through the streaming response. Leaving the block closes the
+            # upstream stream, also when the client disconnects part-way through.
+            with response:
+                for chunk in response:
+                    yield from turn.feed(chunk)
+            stats.upstream_finished()
+
+            if not (yield from turn.finish(messages)):
+                break
+    finally:
+        # Stops tool calls still running for a client that has gone away
+        if turn is not None:
+            turn.cancel()
+        stats.finish(budget.tokens_saved)
+        report_context_savings(budget)
+
+    if include_stats:
+        yield stats_event(stats)
+
+
+async def ainference_loop(messages, temperature=0.7, max_tokens=1000, parallel_tools=False, context_budget=None, include_stats=False, session_id=None):
+    """
+    Asyncio version of inference_loop.
+
+    Upstream responses are streamed without holding a thread, and the blocking part
+    of each turn (tool execution) runs in the event loop's default executor.
+    """
+    client = upstream.get_async_client()
+    budget = ContextBudget(
+        config.context_token_budget if context_budget is None else context_budget,
+        keep_recent=config.context_keep_recent
+    )
+    stats = RequestStats("async")
+    turn = None
+    try:
+        while True:
+            stats.upstream_started()
+            response = await client.chat.completions.create(
+                **completion_args(budget.fit(messages), temperature, max_tokens, parallel_tools)
+            )
+
+            turn = AssistantTurn(parallel_tools, stats, session_id)
+
+            async with response:
+                async for chunk in response:
+                    for line in turn.feed(chunk):
+                        yield line
+            stats.upstream_finished()
+
+            outcome = {}
+            async for line in iterate_in_executor(turn.finish(messages), outcome):
+                yield line
+
+            if not outcome.get("value"):
+                break
+    finally:
+        # A disconnect cancels this task while a tool runs in the executor; the
+        # tool itself has to be stopped separately
+        if turn is not None:
+            turn.cancel()
+        stats.finish(budget.tokens_saved)
+        report_context_savings(budget)
+
+    if include_stats:
+        yield stats_event(stats)
+
+
+def stats_event(stats):
+    """
+    Build the optional trailing event with a request's timing breakdown.
+    """
+    return json.dumps({'role': 'system', 'type': 'stats', 'content': stats.to_dict()}) + "\n"
+
+
+def report_context_savings(budget):
+    if budget.tokens_saved:
+        print(f"Context budget saved ~{budget.tokens_saved} prompt tokens over {budget.upstream_calls} upstream calls")
+
+
+async def iterate_in_executor(generator, outcome=None):
+    """
+    Drive a blocking generator from async code, one step per executor job.
+
+    Args:
+        generator: The generator to drive.
+        outcome (dict, optional): Receives the generator's return value under "value".
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        done, value = await loop.run_in_executor(None, _next_step, generator)
+        if done:
+            if outcome is not None:
+                outcome["value"] = value
+            return
+        yield value
+
+
+def _next_step(generator):
+    try:
+        return False, next(generator)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def load_conversation(payload):
+    """
+    Resolve the conversation for a chat request.
+
+    Stateless requests carry the whole conversation in "messages". Session
+    requests carry a "session_id" and only the new user "message" (or no message,
+    to answer the session's existing history again). A session is marked busy
+    until record_session() finishes with it.
+
+    Args:
+        payload (dict): The request body.
+
+    Returns:
+        tuple: (messages, session_id), where session_id is None for stateless requests.
+
+    Raises:
+        SessionNotFound: If the session does not exist.
+        SessionBusy: If the session already has a response in progress.
+    """
+    session_id = payload.get('session_id')
+    if not session_id:
+        return payload.get('messages', []), None
+
+    messages = session_store.load(session_id)
+    session_store.acquire(session_id)
+    try:
+        new_message = payload.get('message')
+        if new_message is not None:
+            user_message = {"role": "user", "content": new_message}
+            session_store.append(session_id, [user_message])
+            messages.append(user_message)
+    except Exception:
+        session_store.release(session_id)
+        raise
+
+    print(f"Session {session_id}: {len(messages)} messages, new message: {new_message!r}")
+    return messages, session_id
+
+
+def record_session(lines, session_id, messages):
+    """
+    Pass a response stream through, appending each new message to the session.
+
+    Args:
+        lines: The inference loop generator.
+        session_id (str): The session id, or None for stateless requests.
+        messages (list): The conversation being extended by the loop.
+    """
+    if session_id is None:
+        yield from lines
+        return
+
+    saved = len(messages)
+    try:
+        for line in lines:
+            if len(messages) > saved:
+                session_store.append(session_id, messages[saved:])
+                saved = len(messages)
+            yield line
+    finally:
+        session_store.append(session_id, messages[saved:])
+        session_store.release(session_id)
+
+
+async def arecord_session(lines, session_id, messages):
+    """
+    Async version of record_session.
+    """
+    if session_id is None:
+        async for line in lines:
+            yield line
+        return
+
+    saved = len(messages)
+    try:
+        async for line in lines:
+            if len(messages) > saved:
+                session_store.append(session_id, messages[saved:])
+                saved = len(messages)
+            yield line
+    finally:
+        session_store.append(session_id, messages[saved:])
+        session_store.release(session_id)
+
+
+PARALLEL_TOOLS_FORMAT = """
+You may make several tool calls in one response when they do not depend on each other's results.
+Put each call in its own [[qwen-tool-start]] ... [[qwen-tool-end]] block, one after another, and end your response after the last one.
+Independent calls run at the same time, and you will receive all of their results together, in the order you made the calls.
+"""
+
+
+NATIVE_PARALLEL_TOOLS_FORMAT = """
+You may call several tools at once when the calls do not depend on each other's results.
+"""
+
+
+def build_system_prompt(parallel_tools=False, native_tools=False):
+    """
+    Build the system prompt from the tool catalogue and tool call format.
+
+    With native tool calls the tools are passed to the upstream as tools= instead,
+    so the prompt does not describe them.
+    """
+    if native_tools:
+        tools_format = NATIVE_PARALLEL_TOOLS_FORMAT if parallel_tools else ""
+        return f"""You are Qwen-Max, an advanced AI model. You will assist the user with tasks, using tools available to you.
+{tools_format}
+"""
+
+    tools_available = qwen_tools_lib.list_tools()
+    tools_format = qwen_tools_lib.get_tools_format()
+    if parallel_tools:
+        tools_format += PARALLEL_TOOLS_FORMAT
+    system_prompt = f"""You are Qwen-Max, an advanced AI model. You will assist the user with tasks, using tools available to you.
+
+You have the following tools available:
+{tools_available}
+
+{tools_format}
+
+"""
+    return system_prompt
+
+
+# The system prompt is only rebuilt when the tool registry changes
+system_prompt_cache = SystemPromptCache(lambda: build_system_prompt(native_tools=config.native_tool_calls))
+parallel_system_prompt_cache = SystemPromptCache(lambda: build_system_prompt(parallel_tools=True, native_tools=config.native_tool_calls))
+
+
+def format_messages(messages, parallel_tools=False):
+    model = ''
+    endpoint = ''
+
+    prompt_cache = parallel_system_prompt_cache if parallel_tools else system_prompt_cache
+    system_message = {"role": "system", "content": prompt_cache.get().text}
+    messages.insert(0, system_message)
+
+    return {'messages': messages, 'model': model, 'endpoint': endpoint } 
+
+def parse_tool_call(response):
+    """
+    Parses the tool call information from an LLM response.
+    
+    Args:
+        response (str): The LLM's response containing the tool call.
+        
+    Returns:
+        dict: A dictionary containing the tool name and input parameters.
+              Example: {"name": "tool_name", "input": {"param1": "value1", "param2": "value2"}}
+              
+    Raises:
+        ValueError: If the tool call format is invalid or cannot be parsed.
+    """
+    detector = ToolCallDetector()
+    calls = detector.feed(response)
+
+    try:
+        if detector.marker_count == 0:
+            raise ValueError("Tool call markers not found in the response.")
+
+        if not calls:
+            raise ValueError("No complete JSON object found after the tool call marker.")
+
+        # Parse errors (invalid JSON, missing 'name') are reported by the detector
+        if calls[0].error:
+            raise calls[0].error
+
+        return calls[0].data
+
+    except json.JSONDecodeError as e:
+        print(f"Failed to parse tool call JSON: {e}. Please make sure the tool call is valid JSON")
+        raise
+    
+    except ValueError as e:
+        print(f"Value Error: {e}.")
+        raise
+
+def compact_tool_result(tool_name, tool_result):
+    """
+    Replace a tool result too large for the prompt with a preview and a handle.
+
+    The full result is kept in the spill store, where the model can page through it
+    with read_tool_result, so it is not resent upstream on every later turn.
+
+    Args:
+        tool_name (str): The tool that produced the result.
+        tool_result: The tool's result.
+
+    Returns:
+        The result itself if it is small enough, otherwise its preview.
+    """
+    limit = config.tool_result_max_chars
+    # Pages of a stored result are already bounded, and without read_tool_result
+    # the model could not read a stored result back
+    if not limit or tool_name == "read_tool_result" or not tool_registry.enabled("result_tools"):
+        return tool_result
+    text = tool_result if isinstance(tool_result, str) else str(tool_result)
+    if len(text) <= limit:
+        return tool_result
+    try:
+        handle = spill_store.put(text)
+    except OSError as e:
+        print(f"Could not store large tool result: {e}")
+        return tool_result
+    print(f"Stored {len(text)} character result of {tool_name} as {handle}")
+    return make_preview(text, handle, config.tool_result_preview_chars)
+
+
+def execute_tool(tool_name, tool_input, stats=None, invocation=None):
+    """
+    Executes the specified tool with the given input parameters.
+
+    Args:
+        tool_name (str): The name of the tool to execute.
+        tool_input (dict): A dictionary containing the input parameters for the tool.
+        stats (RequestStats, optional): Per-request timers to record the run in.
+        invocation (ToolInvocation, optional): Deadline and cancellation state for
+            the call. Defaults to a new one with the tool's configured timeout.
+
+    Returns:
+        str: The result of the tool execution. An unknown tool or arguments that do
+            not fit the tool give an error message, so the model can correct the call.
+
+    Raises:
+        ValueError: If the tool function raises an error.
+    """
+    if invocation is None:
+        invocation = runtime.ToolInvocation(tool_timeout(tool_name))
+
+    started = time.perf_counter()
+    status = "error"
+    try:
+        with runtime.activate(invocation):
+            result = _run_tool(tool_name, tool_input)
+        status = "ok"
+        return result
+    except ToolArgumentError as e:
+        status = "invalid"
+        print(f"Rejected tool call: {e}")
+        return f"Error: {e}"
+    except ValueError as e:
+        if isinstance(e.__cause__, runtime.ToolTimeout):
+            status = "timeout"
+        elif isinstance(e.__cause__, runtime.ToolCancelled):
+            status = "cancelled"
+        raise
+    finally:
+        # Unknown names come from the model, so keep them out of metric labels
+        metric_name = tool_name if tool_registry.get(tool_name) is not None else "unknown"
+        record_tool(metric_name, time.perf_counter() - started, status, stats)
+
+
+def _run_tool(tool_name, tool_input):
+    """
+    Look up a tool in the registry, check its arguments and run it, going through
+    the result cache.
+
+    Raises:
+        ToolArgumentError: If there is no such tool or the arguments do not fit it.
+        ValueError: If the tool raises an error.
+    """
+    tool, arguments = tool_registry.bind(tool_name, tool_input)
+
+    try:
+        # Execute the tool function with the checked arguments
+        run = lambda: tool.function(**arguments)
+
+        if tool_cache is None:
+            return run()
+        return tool_cache.call(tool_name, arguments, run)
+    except Exception as e:
+        raise ValueError(f"Error executing tool '{tool_name}': {e}") from e
+
+
+def execute_tool_safely(tool_name, tool_input, stats=None, invocation=None):
+    """
+    Execute a tool, returning errors as the result instead of raising them.
+
+    Used when several tools run together, so one failing call does not abort
+    the others.
+    """
+    try:
+        return execute_tool(tool_name, tool_input, stats, invocation)
+    except ValueError as e:
+        return f"Error: {e}"
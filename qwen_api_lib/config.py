@@ -0,0 +1,57 @@
+import os
+from dotenv import load_dotenv
+
+# Load API Key
+load_dotenv()
+
+api_key    = os.getenv('USE_API_KEY')
+base_url   = os.getenv('USE_BASE_URL')
+model_name = os.getenv('MODEL_NAME')
+
+api_port = int(os.getenv('API_PORT', 5002))
+
+# Upstream connection pools
+upstream_max_connections  = int(os.getenv('UPSTREAM_MAX_CONNECTIONS', 100))
+upstream_max_keepalive    = int(os.getenv('UPSTREAM_MAX_KEEPALIVE', 20))
+upstream_keepalive_expiry = float(os.getenv('UPSTREAM_KEEPALIVE_EXPIRY', 60))
+upstream_warm_connections = int(os.getenv('UPSTREAM_WARM_CONNECTIONS', 2))
+
+# Threads used by the async server to run blocking tools
+tool_executor_workers = int(os.getenv('TOOL_EXECUTOR_WORKERS', 64))
+
+# Threads that run tool calls, starting them while the assistant response is still streaming
+tool_pool_size = int(os.getenv('TOOL_POOL_SIZE', 32))
+
+# Seconds a tool call may run; TOOL_TIMEOUTS overrides single tools, e.g. "git_clone=600,fetch_web_page=20"
+tool_timeout  = float(os.getenv('TOOL_TIMEOUT', 60))
+tool_timeouts = {
+    name.strip(): float(seconds)
+    for name, seconds in (item.split('=', 1) for item in os.getenv('TOOL_TIMEOUTS', '').split(',') if '=' in item)
+}
+
+# How the model calls tools: "text" describes the tools in the system prompt and parses
+# [[qwen-tool-start]] blocks from the response; "native" passes them as the tools= argument
+# and reads the tool_calls of the response, for endpoints that support function calling
+native_tool_calls = os.getenv('TOOL_CALL_MODE', 'text').lower() == 'native'
+
+# Let the model make several tool calls per turn (requests can override with "parallel_tool_calls")
+parallel_tool_calls = os.getenv('PARALLEL_TOOL_CALLS', 'false').lower() in ('1', 'true', 'yes')
+
+# Cache for results of idempotent tools (read_file, git_log, fetch_web_page, ...)
+tool_cache_enabled        = os.getenv('TOOL_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+tool_cache_max_entries    = int(os.getenv('TOOL_CACHE_MAX_ENTRIES', 256))
+tool_cache_max_bytes      = int(os.getenv('TOOL_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+tool_cache_web_ttl        = float(os.getenv('TOOL_CACHE_WEB_TTL', 300))
+tool_cache_git_status_ttl = float(os.getenv('TOOL_CACHE_GIT_STATUS_TTL', 5))
+
+# Tool results longer than this many characters are stored server-side, and the model
+# gets a preview of this many characters and a handle to page through the rest (0 disables)
+tool_result_max_chars     = int(os.getenv('TOOL_RESULT_MAX_CHARS', 20000))
+tool_result_preview_chars = int(os.getenv('TOOL_RESULT_PREVIEW_CHARS', 2000))
+
+# Prompt token budget for each upstream call (requests can override with "context_token_budget"; 0 disables)
+context_token_budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', 24000))
+context_keep_recent  = int(os.getenv('CONTEXT_KEEP_RECENT', 6))
+
+# Directory for server-side conversation sessions
+session_dir = os.getenv('SESSION_DIR', '.sessions')
@@ -0,0 +1,127 @@
+from .tokens import estimate_tokens, estimate_message_tokens
+
+
+def is_tool_result(message):
+    """
+    Check whether a chat message carries tool output back to the model.
+    """
+    content = message.get("content")
+    if message.get("role") == "tool":
+        return isinstance(content, str)
+    return (
+        message.get("role") == "user"
+        and isinstance(content, str)
+        and content.startswith("Tool result")
+    )
+
+
+class ContextBudget:
+    """
+    Keeps the prompt sent upstream within a token budget.
+
+    One instance follows a conversation through the agent loop. It keeps a
+    running token estimate per message and, before each upstream call, returns
+    a copy of the conversation that fits the budget: old tool results are
+    replaced with a short preview first, then the oldest messages are dropped.
+    The system prompt and the most recent messages are always kept. The
+    conversation itself is never modified.
+    """
+
+    def __init__(self, budget_tokens, keep_recent=6, preview_chars=300):
+        """
+        Args:
+            budget_tokens (int): Maximum estimated prompt tokens. 0 disables the budget.
+            keep_recent (int): Number of most recent messages that are never trimmed.
+            preview_chars (int): Characters kept from each end of an elided tool result.
+        """
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.preview_chars = preview_chars
+        self.tokens_saved = 0
+        self.upstream_calls = 0
+        self._estimates = []   # token estimate per message, in conversation order
+        self._elided = {}      # message index -> elided copy, reused so prefixes stay stable
+
+    def estimate(self, messages):
+        """
+        Get the estimated prompt size of a conversation.
+
+        Only messages added since the last call are measured.
+
+        Args:
+            messages (list): The conversation.
+
+        Returns:
+            int: Estimated token count.
+        """
+        if len(self._estimates) > len(messages):
+            self._estimates = []
+            self._elided = {}
+        for message in messages[len(self._estimates):]:
+            self._estimates.append(estimate_message_tokens(message))
+        return sum(self._estimates)
+
+    def fit(self, messages):
+        """
+        Get the conversation to send upstream, trimmed to the budget if needed.
+
+        Args:
+            messages (list): The conversation.
+
+        Returns:
+            list: The conversation itself if it fits, otherwise a trimmed copy.
+        """
+        total = self.estimate(messages)
+        self.upstream_calls += 1
+        if not self.budget_tokens or total <= self.budget_tokens:
+            return messages
+
+        first = 1 if messages and messages[0].get("role") == "system" else 0
+        recent = max(first, len(messages) - self.keep_recent)
+        fitted = list(messages)
+        estimates = list(self._estimates)
+
+        # Elide old tool results, oldest first
+        for index in range(first, recent):
+            if total <= self.budget_tokens:
+                break
+            if not is_tool_result(messages[index]):
+                continue
+            elided = self._elide(index, messages[index])
+            saved = estimates[index] - estimate_message_tokens(elided)
+            if saved > 0:
+                fitted[index] = elided
+                estimates[index] -= saved
+                total -= saved
+
+        # Then drop the oldest messages outright. The results of a dropped native tool
+        # call go with it, since the upstream rejects a tool message without its call.
+        dropped = 0
+        for index in range(first, len(messages)):
+            orphaned = dropped and messages[index].get("role") == "tool"
+            if not orphaned and (index >= recent or total <= self.budget_tokens):
+                break
+            total -= estimates[index]
+            dropped += 1
+        if dropped:
+            fitted = fitted[:first] + fitted[first + dropped:]
+
+        saved = sum(self._estimates) - total
+        self.tokens_saved += saved
+        print(f"Context budget: ~{total} of {self.budget_tokens} tokens after saving ~{saved} ({dropped} old messages dropped)")
+        return fitted
+
+    def _elide(self, index, message):
+        elided = self._elided.get(index)
+        if elided is None:
+            content = message["content"]
+            if len(content) <= self.preview_chars * 2:
+                elided = message
+            else:
+                head = content[:self.preview_chars]
+                tail = content[-self.preview_chars:]
+                omitted = estimate_tokens(content[self.preview_chars:-self.preview_chars])
+                elided = dict(message)
+                elided["content"] = f"{head}\n[... ~{omitted} tokens of old tool output elided ...]\n{tail}"
+            self._elided[index] = elided
+        return elided
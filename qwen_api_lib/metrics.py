@@ -0,0 +1,249 @@
+import threading
+import time
+
+from .tokens import CHARS_PER_TOKEN
+
+# Default histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """A monotonically increasing Prometheus counter."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge:
+    """A Prometheus gauge, set directly or computed when metrics are rendered."""
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        """
+        Args:
+            function (callable, optional): Returns {label values tuple: value} at render time.
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.function is not None:
+            try:
+                values = self.function()
+            except Exception:
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """A Prometheus histogram with cumulative buckets."""
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        labelnames = self.labelnames + ("le",)
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(labelnames, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(labelnames, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """A set of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter(
+    "qwen_chat_requests_total", "Chat requests served", ["mode"]))
+requests_in_progress = registry.register(Gauge(
+    "qwen_chat_requests_in_progress", "Chat responses currently streaming"))
+request_duration = registry.register(Histogram(
+    "qwen_chat_request_duration_seconds", "Total wall time of a chat request"))
+loop_iterations = registry.register(Histogram(
+    "qwen_chat_loop_iterations", "Upstream calls made by one chat request",
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34)))
+upstream_ttft = registry.register(Histogram(
+    "qwen_upstream_time_to_first_token_seconds", "Time from an upstream request to its first content chunk"))
+upstream_duration = registry.register(Histogram(
+    "qwen_upstream_stream_duration_seconds", "Time from an upstream request to the end of its stream"))
+upstream_tokens_per_second = registry.register(Histogram(
+    "qwen_upstream_tokens_per_second", "Estimated output tokens per second of an upstream stream",
+    buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)))
+tool_duration = registry.register(Histogram(
+    "qwen_tool_duration_seconds", "Tool execution time", labelnames=["tool"]))
+tool_calls_total = registry.register(Counter(
+    "qwen_tool_calls_total", "Tool calls executed", ["tool", "status"]))
+context_tokens_saved = registry.register(Counter(
+    "qwen_context_tokens_saved_total", "Estimated prompt tokens saved by the context budget"))
+
+
+class RequestStats:
+    """
+    Timers and counters for one chat request.
+
+    Every measurement is also recorded in the process-wide metrics, and
+    to_dict() gives the per-request breakdown for the trailing stats event.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.iterations = 0
+        self.turns = []
+        self.tools = []
+        self.tokens_saved = 0
+        self.wall_time = None
+        self._lock = threading.Lock()
+        self._turn = None
+        requests_total.inc(mode=mode)
+        requests_in_progress.inc()
+
+    def upstream_started(self):
+        self.iterations += 1
+        self._turn = {"started": time.perf_counter(), "ttft": None, "duration": None, "output_chars": 0}
+        self.turns.append(self._turn)
+
+    def upstream_chunk(self, content):
+        turn = self._turn
+        if turn["ttft"] is None:
+            turn["ttft"] = time.perf_counter() - turn["started"]
+            upstream_ttft.observe(turn["ttft"])
+        turn["output_chars"] += len(content)
+
+    def upstream_finished(self):
+        turn = self._turn
+        turn["duration"] = time.perf_counter() - turn["started"]
+        upstream_duration.observe(turn["duration"])
+        if turn["ttft"] is not None and turn["duration"] > turn["ttft"]:
+            tokens = turn["output_chars"] / CHARS_PER_TOKEN
+            turn["tokens_per_second"] = tokens / (turn["duration"] - turn["ttft"])
+            upstream_tokens_per_second.observe(turn["tokens_per_second"])
+
+    def tool_finished(self, tool_name, seconds, status):
+        with self._lock:
+            self.tools.append({"tool": tool_name, "seconds": round(seconds, 6), "status": status})
+
+    def finish(self, tokens_saved=0):
+        if self.wall_time is not None:
+            return
+        self.wall_time = time.perf_counter() - self.started
+        self.tokens_saved = tokens_saved
+        request_duration.observe(self.wall_time)
+        loop_iterations.observe(self.iterations)
+        if tokens_saved:
+            context_tokens_saved.inc(tokens_saved)
+        requests_in_progress.dec()
+
+    def to_dict(self):
+        return {
+            "wall_time": round(self.wall_time if self.wall_time is not None else time.perf_counter() - self.started, 6),
+            "iterations": self.iterations,
+            "time_to_first_token": round(self.turns[0]["ttft"], 6) if self.turns and self.turns[0]["ttft"] is not None else None,
+            "upstream": [
+                {
+                    "time_to_first_token": round(turn["ttft"], 6) if turn["ttft"] is not None else None,
+                    "duration": round(turn["duration"], 6) if turn["duration"] is not None else None,
+                    "tokens_per_second": round(turn["tokens_per_second"], 2) if "tokens_per_second" in turn else None
+                }
+                for turn in self.turns
+            ],
+            "tools": list(self.tools),
+            "context_tokens_saved": self.tokens_saved
+        }
+
+
+def record_tool(tool_name, seconds, status, stats=None):
+    """
+    Record one tool execution in the process-wide metrics and, if given, a request's stats.
+    """
+    tool_duration.observe(seconds, tool=tool_name)
+    tool_calls_total.inc(tool=tool_name, status=status)
+    if stats is not None:
+        stats.tool_finished(tool_name, seconds, status)
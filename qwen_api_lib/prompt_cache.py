@@ -0,0 +1,76 @@
+import hashlib
+import threading
+
+import qwen_tools_lib
+
+from .tokens import estimate_tokens
+
+
+class SystemPrompt:
+    """
+    An immutable, prebuilt system prompt.
+
+    Attributes:
+        text (str): The prompt text. The same string object is reused for every
+            request, so the prompt prefix is byte-identical across requests.
+        version (int): Tool registry version the prompt was built from.
+        token_estimate (int): Estimated token count of the prompt.
+        digest (str): SHA-256 of the prompt text, for comparing prefixes.
+    """
+
+    __slots__ = ("text", "version", "token_estimate", "digest")
+
+    def __init__(self, text, version):
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "token_estimate", estimate_tokens(text))
+        object.__setattr__(self, "digest", hashlib.sha256(text.encode("utf-8")).hexdigest())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SystemPrompt is immutable")
+
+
+class SystemPromptCache:
+    """
+    Builds the system prompt once per tool registry version.
+
+    The tool catalogue and format instructions only change when the tool registry
+    does, so the prompt is rebuilt only when qwen_tools_lib.get_tools_version()
+    changes instead of on every request.
+    """
+
+    def __init__(self, builder):
+        """
+        Args:
+            builder (callable): Function that returns the system prompt text.
+        """
+        self._builder = builder
+        self._lock = threading.Lock()
+        self._prompt = None
+        self.builds = 0
+
+    def get(self):
+        """
+        Get the system prompt for the current tool registry, building it if needed.
+
+        Returns:
+            SystemPrompt: The cached prompt.
+        """
+        version = qwen_tools_lib.get_tools_version()
+        prompt = self._prompt
+        if prompt is not None and prompt.version == version:
+            return prompt
+
+        with self._lock:
+            prompt = self._prompt
+            if prompt is None or prompt.version != version:
+                prompt = SystemPrompt(self._builder(), version)
+                self._prompt = prompt
+                self.builds += 1
+                print(f"Built system prompt for tools v{version}: ~{prompt.token_estimate} tokens")
+            return prompt
+
+    @property
+    def prefix(self):
+        """The current system prompt text."""
+        return self.get().text
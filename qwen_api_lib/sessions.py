@@ -0,0 +1,157 @@
+import json
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class SessionBusy(RuntimeError):
+    pass
+
+
+class SessionStore:
+    """
+    Append-only, file-backed store of server-side conversations.
+
+    Each session is a JSON Lines file with one chat message per line, so adding
+    a turn is a single append and sessions survive process restarts. Loaded
+    conversations are also kept in memory so later turns do not re-read the file.
+    """
+
+    def __init__(self, directory, max_loaded=256):
+        """
+        Args:
+            directory (str): Directory the session files are kept in.
+            max_loaded (int): Maximum number of conversations kept in memory.
+        """
+        self.directory = directory
+        self.max_loaded = max_loaded
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()  # session id -> list of messages, least recently used first
+        self._active = set()  # session ids with a chat in progress
+        os.makedirs(directory, exist_ok=True)
+
+    def create(self, messages=None):
+        """
+        Create a new session.
+
+        Args:
+            messages (list, optional): Conversation to seed the session with.
+
+        Returns:
+            str: The new session id.
+        """
+        session_id = uuid.uuid4().hex
+        with open(self._path(session_id), "x", encoding="utf-8") as f:
+            for message in messages or []:
+                f.write(json.dumps(message) + "\n")
+        with self._lock:
+            self._remember(session_id, list(messages or []))
+        return session_id
+
+    def load(self, session_id):
+        """
+        Get the conversation of a session.
+
+        Args:
+            session_id (str): The session id.
+
+        Returns:
+            list: A copy of the session's messages.
+
+        Raises:
+            SessionNotFound: If the session does not exist.
+        """
+        with self._lock:
+            return list(self._get(session_id))
+
+    def append(self, session_id, messages):
+        """
+        Add messages to the end of a session.
+
+        Args:
+            session_id (str): The session id.
+            messages (list): Messages to add.
+        """
+        if not messages:
+            return
+        lines = "".join(json.dumps(message) + "\n" for message in messages)
+        with self._lock:
+            loaded = self._get(session_id)
+            with open(self._path(session_id), "a", encoding="utf-8") as f:
+                f.write(lines)
+            loaded.extend(messages)
+
+    def delete(self, session_id):
+        """
+        Delete a session.
+
+        Args:
+            session_id (str): The session id.
+
+        Raises:
+            SessionNotFound: If the session does not exist.
+        """
+        with self._lock:
+            self._loaded.pop(session_id, None)
+            try:
+                os.remove(self._path(session_id))
+            except FileNotFoundError:
+                raise SessionNotFound(session_id)
+
+    def acquire(self, session_id):
+        """
+        Mark a session as having a chat in progress.
+
+        Raises:
+            SessionBusy: If another chat on the session is still running.
+        """
+        with self._lock:
+            if session_id in self._active:
+                raise SessionBusy(f"Session {session_id} already has a response in progress")
+            self._active.add(session_id)
+
+    def release(self, session_id):
+        """Mark a session's chat as finished."""
+        with self._lock:
+            self._active.discard(session_id)
+
+    def _get(self, session_id):
+        messages = self._loaded.get(session_id)
+        if messages is None:
+            messages = self._read(session_id)
+            self._remember(session_id, messages)
+        else:
+            self._loaded.move_to_end(session_id)
+        return messages
+
+    def _remember(self, session_id, messages):
+        self._loaded[session_id] = messages
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+
+    def _path(self, session_id):
+        if not _SESSION_ID.match(session_id or ""):
+            raise SessionNotFound(session_id)
+        return os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def _read(self, session_id):
+        messages = []
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        messages.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Skip a partial line left by an interrupted write
+                        continue
+        except FileNotFoundError:
+            raise SessionNotFound(session_id)
+        return messages
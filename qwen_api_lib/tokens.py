@@ -0,0 +1,40 @@
+# Rough token estimates for prompt budgeting. Qwen and GPT-style BPE tokenizers
+# average about four characters of English text or code per token; the estimate
+# only needs to be consistent, not exact.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: Estimated token count.
+    """
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message):
+    """
+    Estimate the number of tokens a chat message adds to a prompt.
+
+    Args:
+        message (dict): A chat message with "role" and "content", and "tool_calls"
+            for an assistant message with native tool calls.
+
+    Returns:
+        int: Estimated token count, including a small per-message overhead.
+    """
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = str(content)
+    tokens = estimate_tokens(content) + 4
+    for call in message.get("tool_calls") or ():
+        function = call.get("function", {})
+        tokens += estimate_tokens(function.get("name", "")) + estimate_tokens(function.get("arguments", "")) + 4
+    return tokens
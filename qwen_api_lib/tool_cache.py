@@ -0,0 +1,299 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .tool_executor import READ_ONLY_TOOLS
+
+# Caching policy per idempotent tool:
+#   file - keyed on the path's mtime and size
+#   git  - keyed on the repository's HEAD and index state
+#   web  - expires after a TTL
+CACHE_POLICIES = {
+    "read_file": "file",
+    "list_directory": "file",
+    "git_log": "git",
+    "git_show": "git",
+    "git_status": "git",
+    "brave_web_search": "web",
+    "fetch_web_page": "web",
+}
+
+# Tool arguments that name a path a tool may change
+PATH_ARGUMENTS = ("path", "source", "destination", "target_path")
+
+# Tools that change only the paths in their arguments. apply_patch names its files
+# inside the patch, so, like git and code execution tools, it invalidates every entry.
+FILESYSTEM_WRITE_TOOLS = frozenset([
+    "write_file",
+    "append_file",
+    "edit_file",
+    "multi_edit_file",
+    "copy_file",
+    "remove_file",
+    "create_directory",
+    "remove_directory",
+    "copy_directory",
+])
+
+
+class ToolResultCache:
+    """
+    Size-bounded LRU cache of results from idempotent tools.
+
+    Entries are keyed on the tool name, its arguments and a fingerprint of the
+    state the result depends on (see CACHE_POLICIES), so a changed file or a new
+    commit never serves a stale result. Tools that change state invalidate the
+    entries they may affect.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, web_ttl=300, git_status_ttl=5):
+        """
+        Args:
+            max_entries (int): Maximum number of cached results.
+            max_bytes (int): Maximum total size of cached results, in characters.
+            web_ttl (float): Seconds a web tool result stays valid.
+            git_status_ttl (float): Seconds a git_status result stays valid. Working
+                tree edits made outside the tools do not change HEAD or the index,
+                so status results also expire after this short TTL.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.web_ttl = web_ttl
+        self.git_status_ttl = git_status_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> entry dict
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def call(self, tool_name, tool_input, run):
+        """
+        Get a tool result from the cache, or run the tool and cache its result.
+
+        Args:
+            tool_name (str): The tool being called.
+            tool_input (dict): The tool's arguments.
+            run (callable): Runs the tool and returns its result.
+
+        Returns:
+            The tool result.
+        """
+        policy = CACHE_POLICIES.get(tool_name)
+        if policy is None:
+            try:
+                return run()
+            finally:
+                self.invalidate_for(tool_name, tool_input)
+
+        tool_input = tool_input or {}
+        key, scope = self._make_key(policy, tool_name, tool_input)
+        if key is None:
+            # The state the result depends on cannot be fingerprinted
+            return run()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry["expires"] is None or entry["expires"] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["result"]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+
+        result = run()
+        if _is_cacheable(result):
+            self._store(key, scope, policy, tool_name, result)
+        return result
+
+    def invalidate_for(self, tool_name, tool_input):
+        """
+        Drop the cached results a tool call may have made stale.
+
+        Args:
+            tool_name (str): The tool that was called.
+            tool_input (dict): The tool's arguments.
+        """
+        if tool_name in READ_ONLY_TOOLS:
+            return
+
+        if tool_name in FILESYSTEM_WRITE_TOOLS:
+            paths = [
+                os.path.abspath(tool_input[name])
+                for name in PATH_ARGUMENTS
+                if isinstance(tool_input, dict) and isinstance(tool_input.get(name), str)
+            ]
+            self._invalidate(lambda entry: entry["tool"] == "git_status" or (
+                entry["policy"] == "file" and any(_affects(path, entry["scope"]) for path in paths)
+            ))
+        else:
+            # Git commands and code execution may change any file or repository
+            self._invalidate(lambda entry: entry["policy"] != "web")
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Entry and size counts, hits, misses and invalidations.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations
+            }
+
+    def _make_key(self, policy, tool_name, tool_input):
+        arguments = json.dumps(tool_input, sort_keys=True, default=str)
+
+        if policy == "file":
+            if tool_input.get("depth", 1) > 1:
+                # A recursive listing depends on every subdirectory, which the
+                # top directory's mtime does not cover
+                return None, None
+            path = os.path.abspath(tool_input.get("path") or ".")
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None, None
+            return (tool_name, arguments, stat.st_mtime_ns, stat.st_size), path
+
+        if policy == "git":
+            repo_path = os.path.abspath(tool_input.get("path") or ".")
+            fingerprint = _git_fingerprint(repo_path)
+            if fingerprint is None:
+                return None, None
+            return (tool_name, arguments, fingerprint), repo_path
+
+        return (tool_name, arguments), None
+
+    def _store(self, key, scope, policy, tool_name, result):
+        size = len(result) if isinstance(result, str) else len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            return
+
+        ttl = None
+        if policy == "web":
+            ttl = self.web_ttl
+        elif tool_name == "git_status":
+            ttl = self.git_status_ttl
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "result": result,
+                "size": size,
+                "scope": scope,
+                "policy": policy,
+                "tool": tool_name,
+                "expires": time.monotonic() + ttl if ttl is not None else None
+            }
+            self._bytes += size
+
+            # Evict least recently used entries
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+
+    def _invalidate(self, predicate):
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if predicate(entry)]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+
+def _is_cacheable(result):
+    # Failed lookups are often transient (network errors, missing repositories)
+    if isinstance(result, dict):
+        return "error" not in result
+    if isinstance(result, str):
+        return not result.startswith("Error")
+    return result is not None
+
+
+def _affects(changed_path, cached_path):
+    # A change to a path affects cached results for the path itself, anything
+    # below it, and the listing of the directory that contains it
+    return (
+        cached_path == changed_path
+        or cached_path.startswith(changed_path + os.sep)
+        or cached_path == os.path.dirname(changed_path)
+    )
+
+
+def _git_fingerprint(path):
+    """
+    Fingerprint the HEAD and index state of the repository containing path,
+    without running git.
+    """
+    git_dir = _find_git_dir(path)
+    if git_dir is None:
+        return None
+
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r") as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+
+    state = [git_dir, head]
+    if head.startswith("ref: "):
+        ref_path = os.path.join(git_dir, head[5:])
+        try:
+            with open(ref_path, "r") as f:
+                state.append(f.read().strip())
+        except OSError:
+            # Packed ref; fingerprint the packed-refs file instead
+            state.append(None)
+
+    for name in ("index", "packed-refs"):
+        try:
+            stat = os.stat(os.path.join(git_dir, name))
+            state.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            state.append(None)
+
+    return tuple(state)
+
+
+def _find_git_dir(path):
+    current = path if os.path.isdir(path) else os.path.dirname(path)
+    while True:
+        candidate = os.path.join(current, ".git")
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            # Worktrees and submodules point at their git directory
+            try:
+                with open(candidate, "r") as f:
+                    content = f.read().strip()
+            except OSError:
+                return None
+            if content.startswith("gitdir: "):
+                return os.path.normpath(os.path.join(current, content[8:]))
+            return None
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
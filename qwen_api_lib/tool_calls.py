@@ -0,0 +1,278 @@
+import json
+import re
+
+TOOL_START_MARKER = "[[qwen-tool-start]]"
+
+# Characters that matter while scanning a JSON object; everything else is skipped
+_JSON_SIGNIFICANT = re.compile(r'[{}"\\]')
+
+
+class ParsedToolCall:
+    """
+    A tool call block found in an assistant response.
+
+    Attributes:
+        index (int): Position of the call in the response, starting at 0.
+        raw (str): The JSON text of the call.
+        data (dict): The parsed call, e.g. {"name": "tool_name", "input": {...}}, or None if invalid.
+        error (Exception): Why the call could not be parsed, or None if valid.
+        call_id (str): The upstream's id for a native tool call, or None for text calls.
+    """
+
+    def __init__(self, index, raw, data=None, error=None, call_id=None):
+        self.index = index
+        self.raw = raw
+        self.data = data
+        self.error = error
+        self.call_id = call_id
+
+    @property
+    def valid(self):
+        return self.error is None
+
+
+class ToolCallDetector:
+    """
+    Incremental tool call parser for streamed assistant responses.
+
+    Feed it each text delta as it arrives. It looks for the tool start marker, then
+    tracks the JSON object that follows with a string-aware brace counter, and
+    reports a call as soon as its closing brace arrives. Every character is
+    examined once, so the cost is linear in the size of the response.
+    """
+
+    # Parser states
+    SEARCH_MARKER = 0
+    SEARCH_OBJECT = 1
+    IN_OBJECT = 2
+
+    def __init__(self):
+        self.marker_count = 0
+        self.calls = []
+        self._parts = []
+        self._state = self.SEARCH_MARKER
+        self._marker_tail = ""
+        self._object_parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def text(self):
+        """The full response received so far."""
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    @property
+    def in_progress(self):
+        """True while a tool call block has started but is not yet complete."""
+        return self._state != self.SEARCH_MARKER
+
+    def feed(self, delta):
+        """
+        Process the next piece of the response.
+
+        Args:
+            delta (str): The newly received text.
+
+        Returns:
+            list: ParsedToolCall objects completed by this delta, in order.
+        """
+        self._parts.append(delta)
+        completed = []
+
+        while delta:
+            if self._state == self.SEARCH_MARKER:
+                delta = self._search_marker(delta)
+            elif self._state == self.SEARCH_OBJECT:
+                delta = self._search_object(delta)
+            else:
+                delta = self._scan_object(delta, completed)
+
+        return completed
+
+    def _search_marker(self, delta):
+        # Keep the end of the previous delta so markers split across deltas are found
+        window = self._marker_tail + delta
+        pos = window.find(TOOL_START_MARKER)
+        if pos == -1:
+            self._marker_tail = window[-(len(TOOL_START_MARKER) - 1):]
+            return ""
+
+        self.marker_count += 1
+        self._marker_tail = ""
+        self._state = self.SEARCH_OBJECT
+        return window[pos + len(TOOL_START_MARKER):]
+
+    def _search_object(self, delta):
+        pos = delta.find("{")
+        if pos == -1:
+            return ""
+
+        self._state = self.IN_OBJECT
+        self._depth = 1
+        self._in_string = False
+        self._escaped = False
+        self._object_parts = ["{"]
+        return delta[pos + 1:]
+
+    def _scan_object(self, delta, completed):
+        start = 0
+        if self._escaped:
+            # The previous delta ended on a backslash inside a string
+            self._escaped = False
+            start = 1
+
+        skip = -1
+        for match in _JSON_SIGNIFICANT.finditer(delta, start):
+            pos = match.start()
+            if pos == skip:
+                # Escaped character inside a string
+                continue
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    skip = pos + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._object_parts.append(delta[:pos + 1])
+                    completed.append(self._complete_call())
+                    return delta[pos + 1:]
+
+        self._escaped = skip == len(delta)
+        self._object_parts.append(delta)
+        return ""
+
+    def _complete_call(self):
+        raw = "".join(self._object_parts)
+        self._object_parts = []
+        self._state = self.SEARCH_MARKER
+
+        call = ParsedToolCall(len(self.calls), raw)
+        try:
+            data = json.loads(raw)
+            if not isinstance(data, dict) or "name" not in data:
+                raise ValueError("Tool call must include a 'name' field.")
+            call.data = data
+        except (json.JSONDecodeError, ValueError) as e:
+            call.error = e
+
+        self.calls.append(call)
+        return call
+
+
+class NativeToolCallDetector:
+    """
+    Collects tool calls streamed as OpenAI tool_calls deltas.
+
+    With native function calling the upstream sends each call's name once and its
+    arguments as JSON fragments, keyed by the call's index. A call is complete when
+    a call with a higher index starts, or when the stream ends (close()). The
+    attributes match ToolCallDetector, so a turn handles both kinds of call alike.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self._names = []  # function name of each call, also of invalid ones
+        self._parts = []
+        self._pending = {}  # upstream index -> {"id", "name", "arguments"} of calls not yet complete
+
+    @property
+    def text(self):
+        """The text content of the response received so far."""
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    @property
+    def marker_count(self):
+        """Number of tool calls started so far, complete or not."""
+        return len(self.calls) + len(self._pending)
+
+    @property
+    def in_progress(self):
+        # Calls still open when the stream ends are completed by close()
+        return False
+
+    def feed(self, delta):
+        """
+        Process the next piece of the response's text content.
+
+        Returns:
+            list: Always empty; native calls do not appear in the text.
+        """
+        self._parts.append(delta)
+        return []
+
+    def feed_tool_calls(self, deltas):
+        """
+        Process the tool_calls of one streamed chunk.
+
+        Args:
+            deltas (list): The chunk's delta.tool_calls.
+
+        Returns:
+            list: ParsedToolCall objects completed by this chunk, in order.
+        """
+        completed = []
+        for delta in deltas:
+            index = delta.index if delta.index is not None else max(self._pending, default=-1)
+            if index not in self._pending:
+                # A new call starts, so every call before it is complete
+                for earlier in sorted(i for i in self._pending if i < index):
+                    completed.append(self._complete_call(earlier))
+                self._pending[index] = {"id": None, "name": "", "arguments": []}
+            pending = self._pending[index]
+            if delta.id:
+                pending["id"] = delta.id
+            function = delta.function
+            if function is not None:
+                if function.name:
+                    pending["name"] += function.name
+                if function.arguments:
+                    pending["arguments"].append(function.arguments)
+        return completed
+
+    def close(self):
+        """
+        Complete the calls still open at the end of the stream.
+
+        Returns:
+            list: The completed ParsedToolCall objects, in order.
+        """
+        return [self._complete_call(index) for index in sorted(self._pending)]
+
+    def tool_calls(self):
+        """The calls in the form of an assistant message's tool_calls."""
+        return [
+            {"id": call.call_id, "type": "function", "function": {"name": name, "arguments": call.raw}}
+            for call, name in zip(self.calls, self._names)
+        ]
+
+    def _complete_call(self, upstream_index):
+        pending = self._pending.pop(upstream_index)
+        index = len(self.calls)
+        # Calls without parameters may stream no arguments at all
+        raw = "".join(pending["arguments"]).strip() or "{}"
+        call = ParsedToolCall(index, raw, call_id=pending["id"] or f"call_{index}")
+        try:
+            if not pending["name"]:
+                raise ValueError("Tool call must include a function name.")
+            arguments = json.loads(raw)
+            if not isinstance(arguments, dict):
+                raise ValueError("Tool call arguments must be a JSON object.")
+            call.data = {"name": pending["name"], "input": arguments}
+        except (json.JSONDecodeError, ValueError) as e:
+            call.error = e
+
+        self.calls.append(call)
+        self._names.append(pending["name"])
+        return call
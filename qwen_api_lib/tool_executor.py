@@ -0,0 +1,93 @@
+from . import config
+
+# Per-tool deadlines where the general TOOL_TIMEOUT does not fit
+DEFAULT_TOOL_TIMEOUTS = {
+    "git_clone": 600,
+    "git_push": 120,
+    "copy_directory": 600,
+    "brave_web_search": 15,
+    "fetch_web_page": 30,
+}
+
+# Extra time given to a tool that does not check its own deadline before its
+# result is abandoned
+TIMEOUT_GRACE_SECONDS = 2.0
+
+# Tools that only read state. Consecutive read-only calls from one assistant turn
+# are independent of each other and can run concurrently; any other tool may
+# change what later calls see, so it runs on its own, in call order.
+READ_ONLY_TOOLS = frozenset([
+    "get_cwd",
+    "read_file",
+    "list_directory",
+    "search_files",
+    "git_log",
+    "git_show",
+    "git_status",
+    "git_diff",
+    "brave_web_search",
+    "fetch_web_page",
+    "python_check_syntax",
+    "read_tool_result",
+])
+
+
+def is_read_only(call):
+    """
+    Check whether a parsed tool call can run concurrently with its neighbours.
+
+    Invalid calls are never executed, so they count as read-only.
+
+    Args:
+        call (ParsedToolCall): The tool call.
+
+    Returns:
+        bool: True if the call does not change any state.
+    """
+    return not call.valid or call.data["name"] in READ_ONLY_TOOLS
+
+
+def plan_batches(calls):
+    """
+    Split the tool calls of one turn into batches that can each run concurrently.
+
+    Runs of consecutive read-only calls form one batch; every other call is a
+    batch of its own. Running the batches in order preserves the effect of
+    running every call sequentially.
+
+    Args:
+        calls (list): ParsedToolCall objects in call order.
+
+    Returns:
+        list: Lists of ParsedToolCall objects.
+    """
+    batches = []
+    current = []
+    for call in calls:
+        if is_read_only(call):
+            current.append(call)
+        else:
+            if current:
+                batches.append(current)
+                current = []
+            batches.append([call])
+    if current:
+        batches.append(current)
+    return batches
+
+
+def tool_timeout(tool_name):
+    """
+    Deadline in seconds for one call of a tool.
+
+    Args:
+        tool_name (str): The tool name.
+
+    Returns:
+        float: TOOL_TIMEOUTS override, else the built-in default for the tool, else TOOL_TIMEOUT.
+    """
+    if not isinstance(tool_name, str):
+        return config.tool_timeout
+    if tool_name in config.tool_timeouts:
+        return config.tool_timeouts[tool_name]
+    return DEFAULT_TOOL_TIMEOUTS.get(tool_name, config.tool_timeout)
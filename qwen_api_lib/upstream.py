@@ -0,0 +1,250 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+
+class UpstreamClientManager:
+    """
+    Long-lived manager for upstream OpenAI-compatible clients.
+
+    One keep-alive HTTP connection pool is kept per base_url and shared by every
+    request (and every turn of the agent loop), so only the first request to an
+    endpoint pays for TCP/TLS connection setup.
+    """
+
+    def __init__(self, api_key=None, base_url=None, max_connections=100,
+                 max_keepalive_connections=20, keepalive_expiry=60.0):
+        """
+        Args:
+            api_key (str, optional): Default API key for upstream clients.
+            base_url (str, optional): Default upstream base URL.
+            max_connections (int): Maximum concurrent connections per base_url.
+            max_keepalive_connections (int): Maximum idle connections kept open per base_url.
+            keepalive_expiry (float): Seconds an idle connection is kept before being closed.
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._lock = threading.Lock()
+        self._pools = {}    # base_url -> pool info (http client + counters)
+        self._clients = {}  # (base_url, api_key) -> OpenAI client
+        self._async_pools = {}    # base_url -> pool info for the asyncio server
+        self._async_clients = {}  # (base_url, api_key) -> AsyncOpenAI client
+
+    def _get_pool(self, base_url, is_async=False):
+        pools = self._async_pools if is_async else self._pools
+        pool = pools.get(base_url)
+        if pool is None:
+            http_client_class = DefaultAsyncHttpxClient if is_async else DefaultHttpxClient
+            pool = {
+                "http_client": http_client_class(limits=self.limits),
+                "created_at": time.time(),
+                "acquired": 0,
+                "warmed": 0,
+                "warm_errors": 0,
+            }
+            pools[base_url] = pool
+        return pool
+
+    def get_client(self, base_url=None, api_key=None):
+        """
+        Get the shared OpenAI client for an upstream endpoint, creating it on first use.
+
+        Args:
+            base_url (str, optional): Upstream base URL. Defaults to the manager's base_url.
+            api_key (str, optional): API key. Defaults to the manager's api_key.
+
+        Returns:
+            OpenAI: A client backed by the pooled HTTP connections for base_url.
+        """
+        base_url = base_url or self.base_url
+        api_key = api_key or self.api_key
+
+        with self._lock:
+            pool = self._get_pool(base_url)
+            pool["acquired"] += 1
+
+            client = self._clients.get((base_url, api_key))
+            if client is None:
+                client = OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=pool["http_client"]
+                )
+                self._clients[(base_url, api_key)] = client
+            return client
+
+    def get_async_client(self, base_url=None, api_key=None):
+        """
+        Get the shared AsyncOpenAI client for an upstream endpoint, creating it on first use.
+
+        Async connection pools are bound to the event loop that first uses them, so
+        this must only be called from the server's event loop.
+
+        Args:
+            base_url (str, optional): Upstream base URL. Defaults to the manager's base_url.
+            api_key (str, optional): API key. Defaults to the manager's api_key.
+
+        Returns:
+            AsyncOpenAI: A client backed by the pooled HTTP connections for base_url.
+        """
+        base_url = base_url or self.base_url
+        api_key = api_key or self.api_key
+
+        with self._lock:
+            pool = self._get_pool(base_url, is_async=True)
+            pool["acquired"] += 1
+
+            client = self._async_clients.get((base_url, api_key))
+            if client is None:
+                client = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    http_client=pool["http_client"]
+                )
+                self._async_clients[(base_url, api_key)] = client
+            return client
+
+    def warm(self, connections=2, base_url=None, background=True):
+        """
+        Open connections to an upstream endpoint ahead of the first real request.
+
+        Each connection is opened by a concurrent lightweight GET of the models
+        listing. The response status does not matter; any completed request leaves
+        a live keep-alive connection in the pool.
+
+        Args:
+            connections (int): Number of connections to open.
+            base_url (str, optional): Upstream base URL. Defaults to the manager's base_url.
+            background (bool): If True, return immediately and warm in a daemon thread.
+
+        Returns:
+            list: The warming threads (already joined if background is False).
+        """
+        base_url = base_url or self.base_url
+        if not base_url or connections <= 0:
+            return []
+
+        client = self.get_client(base_url)
+        with self._lock:
+            pool = self._get_pool(base_url)
+        url = str(client.base_url).rstrip("/") + "/models"
+        headers = {"Authorization": f"Bearer {client.api_key}"}
+
+        def open_connection():
+            try:
+                pool["http_client"].get(url, headers=headers, timeout=10.0)
+                with self._lock:
+                    pool["warmed"] += 1
+            except Exception as e:
+                with self._lock:
+                    pool["warm_errors"] += 1
+                print(f"Upstream warm-up to {base_url} failed: {e}")
+
+        threads = [threading.Thread(target=open_connection, daemon=True) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        if not background:
+            for thread in threads:
+                thread.join()
+        return threads
+
+    async def awarm(self, connections=2, base_url=None):
+        """
+        Open async connections to an upstream endpoint ahead of the first real request.
+
+        Args:
+            connections (int): Number of connections to open.
+            base_url (str, optional): Upstream base URL. Defaults to the manager's base_url.
+        """
+        base_url = base_url or self.base_url
+        if not base_url or connections <= 0:
+            return
+
+        client = self.get_async_client(base_url)
+        with self._lock:
+            pool = self._get_pool(base_url, is_async=True)
+        url = str(client.base_url).rstrip("/") + "/models"
+        headers = {"Authorization": f"Bearer {client.api_key}"}
+
+        async def open_connection():
+            try:
+                await pool["http_client"].get(url, headers=headers, timeout=10.0)
+                with self._lock:
+                    pool["warmed"] += 1
+            except Exception as e:
+                with self._lock:
+                    pool["warm_errors"] += 1
+                print(f"Upstream warm-up to {base_url} failed: {e}")
+
+        await asyncio.gather(*(open_connection() for _ in range(connections)))
+
+    def stats(self):
+        """
+        Get statistics for every upstream connection pool.
+
+        Returns:
+            dict: Pool limits plus per-base_url counters and live connection counts.
+        """
+        with self._lock:
+            pools = {
+                base_url: _pool_stats(pool) for base_url, pool in self._pools.items()
+            }
+            async_pools = {
+                base_url: _pool_stats(pool) for base_url, pool in self._async_pools.items()
+            }
+
+        return {
+            "limits": {
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+                "keepalive_expiry": self.limits.keepalive_expiry
+            },
+            "pools": pools,
+            "async_pools": async_pools
+        }
+
+    def close(self):
+        """Close every synchronous pooled connection."""
+        with self._lock:
+            for pool in self._pools.values():
+                pool["http_client"].close()
+            self._pools.clear()
+            self._clients.clear()
+
+    async def aclose(self):
+        """Close every async pooled connection."""
+        with self._lock:
+            pools = list(self._async_pools.values())
+            self._async_pools.clear()
+            self._async_clients.clear()
+        for pool in pools:
+            await pool["http_client"].aclose()
+
+
+def _pool_stats(pool):
+    return {
+        "age_seconds": round(time.time() - pool["created_at"], 3),
+        "clients_acquired": pool["acquired"],
+        "warmed_connections": pool["warmed"],
+        "warm_errors": pool["warm_errors"],
+        **_connection_counts(pool["http_client"])
+    }
+
+
+def _connection_counts(http_client):
+    # httpx does not expose pool state publicly, so read it from the transport's
+    # httpcore pool when available and report nothing otherwise.
+    try:
+        connections = http_client._transport._pool.connections
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {"open_connections": len(connections), "idle_connections": idle}
+    except Exception:
+        return {}
@@ -1,5 +1,13 @@
-from .filesystem import *
-from .git import *
-from .web import *
 from .qwen_tools import *
-from .python import *
\ No newline at end of file
+
+
+def __getattr__(name):
+    # Tool functions are resolved through the registry, so a tool group's module (and
+    # its dependencies) is imported only when one of its tools is first used
+    from .registry import CATEGORY_MODULES, get_tools_dict
+    for category, tools in get_tools_dict().items():
+        if name in tools:
+            import importlib
+            module = importlib.import_module(f"{__name__}.{CATEGORY_MODULES[category]}")
+            return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
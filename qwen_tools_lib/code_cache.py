@@ -0,0 +1,184 @@
+import ast
+import base64
+import hashlib
+import marshal
+import os
+import threading
+from collections import OrderedDict
+
+
+class CompiledSource:
+    """
+    Outcome of parsing and compiling one source text.
+
+    Attributes:
+        syntax_error (tuple): (message, line number, column) if the source does not parse, else None.
+        error_line (str): The source line the syntax error points at.
+        code (str): The compiled code object, marshalled and base64-encoded so a worker
+            process can load it from its JSON job. None if the source does not compile.
+        size (int): Approximate memory held by the entry, in bytes.
+    """
+
+    __slots__ = ("syntax_error", "error_line", "code", "size")
+
+    def __init__(self, source, filename):
+        self.syntax_error = None
+        self.error_line = None
+        self.code = None
+        try:
+            tree = ast.parse(source, filename)
+        except SyntaxError as e:
+            # Keep only the details, not the exception, whose traceback holds on to the source
+            self.syntax_error = (str(e), e.lineno, e.offset)
+            lines = source.split('\n')
+            self.error_line = lines[e.lineno - 1] if e.lineno and e.lineno <= len(lines) else "Line not available"
+        else:
+            try:
+                # dont_inherit keeps this module's __future__ flags out of the job's code
+                code = compile(tree, filename, "exec", dont_inherit=True)
+                self.code = base64.b64encode(marshal.dumps(code)).decode("ascii")
+            except (SyntaxError, ValueError):
+                # Errors only the compiler detects, such as 'return' outside a function;
+                # the worker compiles the source itself and reports them
+                pass
+        self.size = 200 + len(self.code or "") + len(self.error_line or "")
+
+
+class CompileCache:
+    """
+    Size-bounded LRU cache of parsed and compiled Python sources.
+
+    Entries are keyed on a hash of the source and its filename, so an edited file is
+    recompiled and an unchanged one never is. Files are also remembered by mtime and
+    size, so checking or running an unchanged file does not read it again.
+
+    Abstract syntax trees are not kept: they take about 30 bytes per character of
+    source, and the tools only need the parse outcome and the code object.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            max_entries (int): Maximum number of cached sources.
+            max_bytes (int): Maximum total size of cached entries, in bytes.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (source hash, filename) -> CompiledSource
+        self._files = OrderedDict()  # (absolute path, filename) -> ((mtime, size), entry key)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_environment(cls):
+        return cls(
+            max_entries=int(os.environ.get('PYTHON_COMPILE_CACHE_ENTRIES', 256)),
+            max_bytes=int(os.environ.get('PYTHON_COMPILE_CACHE_MB', 64)) * 1024 * 1024,
+        )
+
+    def lookup(self, source, filename="<string>"):
+        """
+        Parse and compile source, or get the result of doing so earlier.
+
+        Args:
+            source (str): Python source code.
+            filename (str): Filename the code object reports in tracebacks.
+
+        Returns:
+            CompiledSource: The parse and compile outcome.
+        """
+        key = (hashlib.sha256(source.encode('utf-8', 'surrogatepass')).digest(), filename)
+        return self._get(key, source, filename)
+
+    def lookup_file(self, path):
+        """
+        Parse and compile a file, without reading it if it has not changed since last time.
+
+        Args:
+            path (str): Path to the Python file; also the code object's filename.
+
+        Returns:
+            CompiledSource: The parse and compile outcome.
+
+        Raises:
+            OSError: If the file cannot be read.
+        """
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        file_key = (os.path.abspath(path), path)
+        with self._lock:
+            known = self._files.get(file_key)
+            if known is not None and known[0] == signature:
+                entry = self._entries.get(known[1])
+                if entry is not None:
+                    self._files.move_to_end(file_key)
+                    self._entries.move_to_end(known[1])
+                    self.hits += 1
+                    return entry
+
+        with open(path, 'r') as f:
+            source = f.read()
+        key = (hashlib.sha256(source.encode('utf-8', 'surrogatepass')).digest(), path)
+        entry = self._get(key, source, path)
+        with self._lock:
+            self._files[file_key] = (signature, key)
+            self._files.move_to_end(file_key)
+            while len(self._files) > self.max_entries:
+                self._files.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drop every cached source."""
+        with self._lock:
+            self._entries.clear()
+            self._files.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Entry and size counts, hits and misses.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _get(self, key, source, filename):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Compile outside the lock; two threads compiling the same source is harmless
+        entry = CompiledSource(source, filename)
+        if entry.size > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._bytes += entry.size
+            # Evict least recently used entries
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+        return entry
+
+
+# Shared by the Python tools
+compile_cache = CompileCache.from_environment()
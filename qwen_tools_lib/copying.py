@@ -0,0 +1,295 @@
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from . import runtime
+
+# ioctl that makes a file share another's blocks (a reflink), on Btrfs, XFS and others
+FICLONE = 0x40049409
+
+# Bytes moved per copy_file_range() or sendfile() call
+CHUNK_BYTES = 64 * 1024 * 1024
+
+# errno values that mean a copy method is not available for this pair of files,
+# so the next method should be tried
+_UNSUPPORTED = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+    errno.EBADF, errno.EPERM, errno.ETXTBSY,
+}
+
+
+def copy_data(source_fd, destination_fd, size):
+    """
+    Copy a file's data between two open files with the fastest method that works.
+
+    Tries, in order: a reflink, which shares the blocks and copies nothing;
+    copy_file_range(), which copies inside the kernel and lets the filesystem do a
+    server-side or block-level copy; sendfile(); and a plain read/write loop.
+
+    Args:
+        source_fd (int): The source file, open for reading, at offset 0.
+        destination_fd (int): The destination file, open for writing and empty.
+        size (int): The source file's size.
+
+    Returns:
+        str: The method used: "reflink", "copy_file_range", "sendfile" or "read/write".
+    """
+    if size == 0:
+        return "read/write"
+
+    if fcntl is not None and hasattr(fcntl, 'ioctl'):
+        try:
+            fcntl.ioctl(destination_fd, FICLONE, source_fd)
+            return "reflink"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+
+    if hasattr(os, 'copy_file_range'):
+        copied = 0
+        try:
+            while copied < size:
+                sent = os.copy_file_range(source_fd, destination_fd, min(CHUNK_BYTES, size - copied))
+                if sent == 0:
+                    break
+                copied += sent
+            return "copy_file_range"
+        except OSError as e:
+            # Only fall back before any data was written; later errors are real
+            if copied or e.errno not in _UNSUPPORTED:
+                raise
+
+    if hasattr(os, 'sendfile'):
+        copied = 0
+        try:
+            while copied < size:
+                sent = os.sendfile(destination_fd, source_fd, copied, min(CHUNK_BYTES, size - copied))
+                if sent == 0:
+                    break
+                copied += sent
+            return "sendfile"
+        except OSError as e:
+            if copied or e.errno not in _UNSUPPORTED:
+                raise
+
+    while True:
+        block = os.read(source_fd, 1024 * 1024)
+        if not block:
+            break
+        view = memoryview(block)
+        while view:
+            view = view[os.write(destination_fd, view):]
+    return "read/write"
+
+
+def copy_file(source, destination):
+    """
+    Copy a file's data and metadata, as shutil.copy2() does, using copy_data().
+
+    Args:
+        source (str): The file to copy.
+        destination (str): The path to copy it to. An existing file is replaced.
+
+    Returns:
+        tuple: (bytes copied, method used).
+
+    Raises:
+        shutil.SameFileError: If source and destination are the same file.
+    """
+    with open(source, 'rb') as source_file:
+        source_stat = os.fstat(source_file.fileno())
+        try:
+            if os.path.samestat(source_stat, os.stat(destination)):
+                raise shutil.SameFileError(f"{source!r} and {destination!r} are the same file")
+        except FileNotFoundError:
+            pass
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+        destination_fd = os.open(destination, flags, stat.S_IMODE(source_stat.st_mode))
+        try:
+            method = copy_data(source_file.fileno(), destination_fd, source_stat.st_size)
+        finally:
+            os.close(destination_fd)
+    shutil.copystat(source, destination)
+    return source_stat.st_size, method
+
+
+def unchanged(source_stat, destination):
+    """Check whether destination is a file with the source's size and modification time."""
+    try:
+        destination_stat = os.stat(destination, follow_symlinks=False)
+    except OSError:
+        return False
+    return (
+        stat.S_ISREG(destination_stat.st_mode)
+        and destination_stat.st_size == source_stat.st_size
+        and destination_stat.st_mtime_ns == source_stat.st_mtime_ns
+    )
+
+
+class CopyReport:
+    """Counts from a copy, updated by the copying threads."""
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.links = 0
+        self.directories = 0
+        self.methods = {}
+        self.errors = []
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, size, method):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.methods[method] = self.methods.get(method, 0) + 1
+
+    def fail(self, path, error):
+        with self._lock:
+            self.errors.append((path, error))
+
+
+class TreeCopier:
+    """
+    Copies directory trees with a bounded pool of threads.
+
+    Each thread copies whole files with copy_file(). The kernel does the copying
+    and Python's lock is released meanwhile, so threads copy files in parallel.
+    """
+
+    def __init__(self, workers=8):
+        self.workers = workers
+
+    @classmethod
+    def from_environment(cls):
+        return cls(workers=int(os.environ.get('COPY_WORKERS', 8)))
+
+    def copy_tree(self, source, destination, incremental=False):
+        """
+        Copy a directory tree, keeping file metadata. Symbolic links are copied as links.
+
+        Args:
+            source (str): The directory to copy.
+            destination (str): Where to copy it. Unless incremental is set, it must not exist.
+            incremental (bool): Copy into an existing destination, skipping files whose
+                size and modification time already match the source's.
+
+        Returns:
+            CopyReport: What was copied and skipped, and the files that could not be copied.
+
+        Raises:
+            NotADirectoryError: If source is not a directory.
+            FileExistsError: If destination exists and incremental is not set.
+            ValueError: If destination is inside source.
+        """
+        started = time.perf_counter()
+        if not os.path.isdir(source):
+            if not os.path.exists(source):
+                raise FileNotFoundError(errno.ENOENT, "No such directory", source)
+            raise NotADirectoryError(errno.ENOTDIR, "Not a directory", source)
+        if not incremental and os.path.lexists(destination):
+            raise FileExistsError(errno.EEXIST, "Destination exists", destination)
+        if os.path.realpath(destination).startswith(os.path.realpath(source) + os.sep):
+            # The walk would find the copy and copy it again, without end
+            raise ValueError(f"Cannot copy {source} into itself")
+
+        report = CopyReport()
+        jobs = []  # (source path, destination path, source stat)
+        directories = []  # (source directory, destination directory), to copy their metadata last
+        pending = [(source, destination)]
+        while pending:
+            runtime.remaining()  # Stops the walk if the call was cancelled or has run out of time
+            source_directory, destination_directory = pending.pop()
+            os.makedirs(destination_directory, exist_ok=True)
+            directories.append((source_directory, destination_directory))
+            report.directories += 1
+            try:
+                with os.scandir(source_directory) as scan:
+                    entries = list(scan)
+            except OSError as e:
+                if source_directory == source:
+                    raise
+                report.fail(source_directory, e)
+                continue
+            for entry in entries:
+                target = os.path.join(destination_directory, entry.name)
+                try:
+                    if entry.is_symlink():
+                        self._copy_link(entry.path, target, incremental)
+                        report.links += 1
+                    elif entry.is_dir():
+                        pending.append((entry.path, target))
+                    else:
+                        entry_stat = entry.stat()
+                        if incremental and unchanged(entry_stat, target):
+                            report.skipped += 1
+                        else:
+                            jobs.append((entry.path, target, entry_stat))
+                except OSError as e:
+                    report.fail(entry.path, e)
+
+        # Largest files first, so one big file does not start last and hold up the end
+        jobs.sort(key=lambda job: job[2].st_size, reverse=True)
+        self._run(jobs, report)
+
+        # Copied after the files, whose creation changes the directories' mtimes
+        for source_directory, destination_directory in reversed(directories):
+            try:
+                shutil.copystat(source_directory, destination_directory)
+            except OSError:
+                pass
+        report.seconds = time.perf_counter() - started
+        return report
+
+    def _copy_link(self, path, target, incremental):
+        link = os.readlink(path)
+        if os.path.lexists(target):
+            if incremental and os.path.islink(target) and os.readlink(target) == link:
+                return
+            os.remove(target)
+        os.symlink(link, target)
+
+    def _run(self, jobs, report):
+        lock = threading.Lock()
+        queue = iter(jobs)
+        stop = threading.Event()
+
+        def copy_jobs():
+            while not stop.is_set():
+                with lock:
+                    job = next(queue, None)
+                if job is None:
+                    return
+                path, target, _ = job
+                try:
+                    report.add(*copy_file(path, target))
+                except OSError as e:
+                    report.fail(path, e)
+
+        threads = [
+            threading.Thread(target=copy_jobs, daemon=True, name="copy-worker")
+            for _ in range(max(1, min(self.workers, len(jobs))))
+        ] if jobs else []
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(runtime.remaining(1.0))
+        except BaseException:
+            # Cancelled or out of time: let the threads finish their current file and stop
+            stop.set()
+            raise
+
+
+tree_copier = TreeCopier.from_environment()
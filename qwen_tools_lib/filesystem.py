@@ -1,6 +1,10 @@
+import builtins
+import fnmatch
 import os
+import re
 import shutil
-import difflib
+import time
+from . import copying, line_index, patching, runtime, search
 
 def get_cwd():
     """
@@ -14,16 +18,20 @@ def get_cwd():
     except Exception as e:
         return f"Error getting current working directory: {e}"
 
-def read_file(path, enumerate=False, start_line=1, end_line=None, show_repr=False):
+def read_file(path, enumerate=False, start_line=1, end_line=None, show_repr=False, tail_lines=None):
     """
     Read the contents of a file with optional line numbering, range selection, and debug formatting.
     
+    Line ranges of large files are read through a memory map and a cached line index,
+    so reading a few lines costs time proportional to those lines, not to the file.
+    
     Args:
         path (str): The path to the file to read.
         enumerate (bool): Whether to include line numbers (defaults to False).
         start_line (int): First line to read, 1-indexed (defaults to 1).
         end_line (int): Last line to read, 1-indexed, None for all lines (defaults to None).
         show_repr (bool): Whether to show Python's repr() of each line, revealing whitespace and special characters (defaults to False).
+        tail_lines (int): Read only the last N lines of the file, instead of start_line and end_line (defaults to None).
         
     Returns:
         str: The contents of the file (potentially formatted), or an error message if reading fails.
@@ -32,13 +40,24 @@ def read_file(path, enumerate=False, start_line=1, end_line=None, show_repr=Fals
         if not os.path.isfile(path):
             return f"Not a file: {path}"
         
-        # Read file contents
-        with open(path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        
-        # Apply filtering if needed
-        if enumerate or start_line > 1 or end_line is not None:
-            lines = content.splitlines()
+        ranged = start_line > 1 or end_line is not None or tail_lines is not None
+        if ranged and os.path.getsize(path) >= line_index.MMAP_MIN_BYTES:
+            # Only the requested lines of a large file are read
+            filtered_lines, start_line = line_index.read_lines(path, start_line, end_line, tail_lines, numbered=enumerate)
+        else:
+            # Read file contents. Lines are split as for large files, so newlines are
+            # left untranslated whenever the content is split into lines
+            split = enumerate or ranged or show_repr
+            with open(path, 'r', encoding='utf-8', newline='' if split else None) as file:
+                content = file.read()
+            
+            if not split:
+                return content
+            
+            lines = line_index.split_lines(content)
+            if tail_lines is not None:
+                start_line = max(1, len(lines) - tail_lines + 1)
+                end_line = None
             
             # Apply line range
             start_idx = max(0, start_line - 1)  # Convert to 0-indexed
@@ -47,23 +66,15 @@ def read_file(path, enumerate=False, start_line=1, end_line=None, show_repr=Fals
                 filtered_lines = lines[start_idx:end_idx]
             else:
                 filtered_lines = lines[start_idx:]
-            
-            # Format lines
-            if enumerate:
-                if show_repr:
-                    content = "\n".join(f"{i:>6}  {repr(line)}" for i, line in enumerate(filtered_lines, start_line))
-                else:
-                    content = "\n".join(f"{i:>6}  {line}" for i, line in enumerate(filtered_lines, start_line))
-            else:
-                if show_repr:
-                    content = "\n".join(repr(line) for line in filtered_lines)
-                else:
-                    content = "\n".join(filtered_lines)
-        elif show_repr:
-            # Just show repr without line numbers
-            content = "\n".join(repr(line) for line in content.splitlines())
         
-        return content
+        # Format lines; the enumerate parameter hides the builtin
+        if enumerate:
+            if show_repr:
+                return "\n".join(f"{i:>6}  {repr(line)}" for i, line in builtins.enumerate(filtered_lines, start_line))
+            return "\n".join(f"{i:>6}  {line}" for i, line in builtins.enumerate(filtered_lines, start_line))
+        if show_repr:
+            return "\n".join(repr(line) for line in filtered_lines)
+        return "\n".join(filtered_lines)
         
     except FileNotFoundError:
         return f"File not found: {path}"
@@ -114,27 +125,219 @@ def create_directory(path):
     except Exception as e:
         return f"Error creating directory: {e}"
 
-def list_directory(path="."):
+# Entries a list_directory call collects at most, however many pages are read.
+# Wider or deeper trees are cut off here; narrow the call with depth or include/exclude.
+LIST_MAX_ENTRIES = 10000
+
+# Entries returned per list_directory page at most
+LIST_MAX_PAGE = 1000
+
+LIST_SORT_KEYS = {
+    "name": None,  # Tree order: each directory followed by its contents
+    "size": lambda entry: entry[2],
+    "mtime": lambda entry: entry[3],
+    "type": lambda entry: (entry[1], entry[0]),
+}
+
+def list_directory(path=".", depth=1, include=None, exclude=None, sort="name", reverse=False, cursor=None, limit=200):
     """
-    List the contents of a directory.
+    List the contents of a directory, optionally recursively, with type, size and modification time.
+    
+    Large listings are returned a page at a time; the result ends with the cursor
+    for the next page.
     
     Args:
         path (str): The path of the directory to list. Defaults to the current directory (".").
+        depth (int): How many levels to list; 1 lists only the directory itself (defaults to 1).
+        include (list): Only list entries whose name, or path relative to the directory, matches one
+            of these glob patterns. Directories are still descended into (defaults to all entries).
+        exclude (list): Leave out entries matching any of these glob patterns, and do not descend into
+            matching directories (defaults to none).
+        sort (str): "name" (tree order), "size", "mtime" or "type" (defaults to "name").
+        reverse (bool): Whether to reverse the sort order (defaults to False).
+        cursor (str): The cursor returned with the previous page, to continue the listing.
+        limit (int): Maximum number of entries to return (defaults to 200, at most 1000).
         
     Returns:
-        str: A list of files and directories, or an error message if listing fails.
+        str: One line per entry with its type, size, modification time and path, or an error message if listing fails.
     """
     try:
-        import time
-        contents = os.listdir(path)
-        return f"Contents of directory '{path}': {', '.join(contents)}"
+        if sort not in LIST_SORT_KEYS:
+            return f"Error: Unknown sort {sort!r}. Use one of: {', '.join(LIST_SORT_KEYS)}"
+        try:
+            offset = max(0, int(cursor)) if cursor else 0
+        except (TypeError, ValueError):
+            return f"Error: Invalid cursor {cursor!r}. Pass the cursor from the previous page unchanged"
+        depth = max(1, depth)
+        limit = max(1, min(limit, LIST_MAX_PAGE))
+        
+        entries, complete = _scan_directory(path, depth, include or [], exclude or [])
+        key = LIST_SORT_KEYS[sort]
+        if key is not None:
+            entries.sort(key=key, reverse=reverse)
+        elif reverse:
+            entries.reverse()
+        
+        total = f"{len(entries)}" if complete else f"first {len(entries)}"
+        header = f"Contents of directory '{path}' (depth {depth}, {total} entries, sorted by {sort})"
+        if not entries:
+            return f"{header}: no entries"
+        page = entries[offset:offset + limit]
+        if not page:
+            return f"{header}: no entries after cursor {offset}"
+        
+        lines = [f"{header}, showing {offset + 1}-{offset + len(page)}:"]
+        for relative, kind, size, mtime in page:
+            shown_size = "-" if kind == "dir" else _format_size(size)
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+            name = relative + "/" if kind == "dir" else relative
+            lines.append(f"{kind:<4} {shown_size:>7}  {modified}  {name}")
+        if offset + len(page) < len(entries):
+            lines.append(f"More entries: call again with cursor=\"{offset + len(page)}\"")
+        if not complete:
+            lines.append(f"Listing stopped at {LIST_MAX_ENTRIES} entries; lower depth or use include/exclude to see the rest")
+        return "\n".join(lines)
     except FileNotFoundError:
         return f"Directory not found: {path}"
+    except NotADirectoryError:
+        return f"Not a directory: {path}"
     except PermissionError:
         return f"Permission denied: {path}"
     except Exception as e:
         return f"Error listing directory: {e}"
 
+def _scan_directory(root, depth, include, exclude):
+    """
+    Collect the entries under a directory with os.scandir, in tree order.
+    
+    Returns:
+        tuple: (list of (relative path, type, size, mtime), whether every entry was collected).
+    """
+    entries = []
+    
+    def matches(patterns, name, relative):
+        return any(fnmatch.fnmatch(relative if "/" in pattern else name, pattern) for pattern in patterns)
+    
+    def visit(directory, prefix, level):
+        runtime.remaining()  # Stops the walk if the call was cancelled or has run out of time
+        try:
+            with os.scandir(directory) as scan:
+                children = sorted(scan, key=lambda entry: entry.name)
+        except OSError:
+            if level == 1:
+                raise
+            return True  # An unreadable subdirectory is listed, but not its contents
+        for entry in children:
+            relative = prefix + entry.name
+            if matches(exclude, entry.name, relative):
+                continue
+            if len(entries) >= LIST_MAX_ENTRIES:
+                return False
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            # Symbolic links are listed, never followed, so a link cannot loop the walk
+            if entry.is_symlink():
+                kind = "link"
+            elif entry.is_dir(follow_symlinks=False):
+                kind = "dir"
+            elif entry.is_file(follow_symlinks=False):
+                kind = "file"
+            else:
+                kind = "other"
+            if not include or matches(include, entry.name, relative):
+                entries.append((relative, kind, stat.st_size, stat.st_mtime))
+            if kind == "dir" and level < depth and entry.name != ".git":
+                if not visit(entry.path, relative + "/", level + 1):
+                    return False
+        return True
+    
+    return entries, visit(root, "", 1)
+
+def _format_size(size):
+    for unit in ("B", "K", "M", "G"):
+        if size < 1024 or unit == "G":
+            return f"{int(size)}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+def _format_rate(count, seconds, unit=""):
+    rate = count / seconds if seconds > 0 else 0.0
+    return f"{_format_size(rate)}/s" if unit == "bytes" else f"{rate:.0f} {unit}/s"
+
+def search_files(pattern, path=".", literal=False, ignore_case=False, glob=None, context_lines=0, max_results=100):
+    """
+    Search the files under a directory for a regular expression or literal text.
+    
+    Files ignored by git and binary files are skipped. Large trees are searched in
+    parallel by worker processes.
+    
+    Args:
+        pattern (str): The regular expression, or text if literal is True, to search for.
+        path (str): The directory to search. Defaults to the current directory (".").
+        literal (bool): Whether to search for the pattern as plain text (defaults to False).
+        ignore_case (bool): Whether to ignore case (defaults to False).
+        glob (str): Only search files whose name matches this pattern, e.g. "*.py" (defaults to None).
+        context_lines (int): Lines to show before and after each match (defaults to 0).
+        max_results (int): Maximum number of matching lines to return (defaults to 100).
+        
+    Returns:
+        str: Matching lines as path:line:text, with context lines as path-line-text, or an error message if the search fails.
+    """
+    try:
+        if not os.path.isdir(path):
+            return f"Directory not found: {path}"
+        if not pattern:
+            return "Error: The search pattern is empty"
+        
+        regex = re.escape(pattern) if literal else pattern
+        flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        try:
+            re.compile(regex.encode('utf-8'), flags)
+        except re.error as e:
+            return f"Error: Invalid regular expression: {e}"
+        
+        max_results = max(1, max_results)
+        context_lines = max(0, min(context_lines, 10))
+        files = search.list_files(path, glob)
+        results, searched = search.search_pool.search(path, files, regex, flags, context_lines, max_results)
+        
+        total = sum(count for _, count, _ in results)
+        if not total:
+            return f"No matches for {pattern!r} in {searched} files under {path}"
+        
+        output = []
+        shown = 0
+        shown_files = 0
+        for file_path, count, lines in results:
+            if shown >= max_results:
+                break
+            shown_files += 1
+            # As with grep, groups of lines are separated by "--" only when context is shown
+            if output and context_lines:
+                output.append("--")
+            previous = None
+            for number, text, is_match in lines:
+                if is_match:
+                    if shown >= max_results:
+                        break
+                    shown += 1
+                if context_lines and previous is not None and number != previous + 1:
+                    output.append("--")
+                separator = ":" if is_match else "-"
+                output.append(f"{file_path}{separator}{number}{separator}{text}")
+                previous = number
+        
+        header = f"{shown} matching lines in {shown_files} files (searched {searched} files under {path})"
+        if total >= max_results:
+            header += f". Stopped at {max_results} matches; narrow the pattern, path or glob to see others"
+        return header + ":\n" + "\n".join(output)
+        
+    except PermissionError:
+        return f"Permission denied: {path}"
+    except Exception as e:
+        return f"Error searching files: {e}"
+
 def copy_file(source, destination):
     """
     Copy a file from source to destination.
@@ -147,8 +350,18 @@ def copy_file(source, destination):
         str: A confirmation message, or an error message if copying fails.
     """
     try:
-        shutil.copy2(source, destination)
-        return f"File copied successfully from {source} to {destination}"
+        if os.path.isdir(source):
+            return f"Error: Source is a directory, use copy_directory: {source}"
+        # As with cp, a file copied to a directory keeps its name
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, os.path.basename(source))
+        started = time.perf_counter()
+        size, method = copying.copy_file(source, destination)
+        seconds = time.perf_counter() - started
+        return (
+            f"File copied successfully from {source} to {destination} "
+            f"({_format_size(size)} in {seconds:.2f} s, {_format_rate(size, seconds, 'bytes')}, {method})"
+        )
     except FileNotFoundError:
         return f"Source file not found: {source}"
     except PermissionError:
@@ -205,26 +418,49 @@ def remove_directory(path):
         return f"Error removing directory: {e}"
 
 
-def copy_directory(source, destination):
+def copy_directory(source, destination, incremental=False):
     """
     Copy a directory and all its contents to a new location.
     
+    Files are copied in parallel, in the kernel where the platform allows, and
+    symbolic links are copied as links.
+    
     Args:
         source (str): The path to the source directory to copy.
         destination (str): The path where the directory should be copied to.
+        incremental (bool): Copy into an existing destination, skipping files whose size and
+            modification time already match the source's (defaults to False).
         
     Returns:
-        str: A confirmation message, or an error message if copying fails.
+        str: A summary of what was copied with files and bytes per second, or an error message if copying fails.
     """
     try:
-        shutil.copytree(source, destination)
-        return f"Directory copied successfully from {source} to {destination}"
+        report = copying.tree_copier.copy_tree(source, destination, incremental)
+        
+        summary = (
+            f"{report.files} files, {_format_size(report.bytes)} in {report.seconds:.2f} s "
+            f"({_format_rate(report.files, report.seconds, 'files')}, {_format_rate(report.bytes, report.seconds, 'bytes')})"
+        )
+        if report.skipped:
+            summary += f"; {report.skipped} unchanged files skipped"
+        if report.links:
+            summary += f"; {report.links} symbolic links"
+        if report.methods:
+            summary += "; copied by " + ", ".join(f"{method} ({count})" for method, count in report.methods.items())
+        if not report.errors:
+            return f"Directory copied successfully from {source} to {destination}: {summary}"
+        
+        lines = [f"Directory copied from {source} to {destination} with {len(report.errors)} errors: {summary}"]
+        lines += [f"  {path}: {error.strerror or error}" for path, error in report.errors[:10]]
+        if len(report.errors) > 10:
+            lines.append(f"  ... and {len(report.errors) - 10} more")
+        return "\n".join(lines)
     except FileNotFoundError:
         return f"Source directory not found: {source}"
     except PermissionError:
         return f"Permission denied: Cannot copy from {source} to {destination}"
     except FileExistsError:
-        return f"Error: Destination directory already exists: {destination}"
+        return f"Error: Destination directory already exists: {destination}. Set incremental to update it"
     except NotADirectoryError:
         return f"Error: Source is not a directory: {source}"
     except Exception as e:
@@ -275,43 +511,19 @@ def edit_file(path, old_text, new_text, dry_run=False):
         if not os.path.isfile(path):
             return f"Error: Not a file: {path}"
         
-        # Read current content
-        with open(path, 'r', encoding='utf-8') as f:
-            original_content = f.read()
-        
-        # Make a copy for modifications
-        modified_content = original_content
-        
-        # Ensure old_text appears exactly once
-        if old_text not in modified_content:
-            return f"Edit failed: Could not find text '{old_text}' in file"
-        
-        if modified_content.count(old_text) > 1:
-            return f"Edit failed: Text '{old_text}' appears multiple times in file, but this tool only works with exactly one match."
-        
-        # Replace text
-        modified_content = modified_content.replace(old_text, new_text)
-        
-        # Generate diff
-        original_lines = original_content.splitlines(keepends=True)
-        modified_lines = modified_content.splitlines(keepends=True)
-        
-        diff = ''.join(difflib.unified_diff(
-            original_lines, 
-            modified_lines,
-            fromfile=f'a/{path}',
-            tofile=f'b/{path}',
-            n=3
-        ))
+        content, newline = patching.read_text(path)
+        try:
+            change = patching.apply_replacements(path, content, [{"old_text": old_text, "new_text": new_text}])
+        except patching.EditError as e:
+            return f"Edit failed: {e}"
+        diff = change.diff()
         
         # Apply changes if not a dry run
         if not dry_run:
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(modified_content)
-            
-            return f"Successfully edited file: {path}\\n\\nDiff:\\n{diff}"
+            patching.write_atomic(path, change.new_content, newline)
+            return f"Successfully edited file: {path}\n\nDiff:\n{diff}"
         else:
-            return f"Dry run: Changes not applied to {path}\\n\\nDiff:\\n{diff}"
+            return f"Dry run: Changes not applied to {path}\n\nDiff:\n{diff}"
             
     except PermissionError:
         return f"Permission denied: {path}"
@@ -319,3 +531,124 @@ def edit_file(path, old_text, new_text, dry_run=False):
         return f"Error: Unable to decode file as UTF-8: {path}"
     except Exception as e:
         return f"Error editing file: {e}"
+
+def multi_edit_file(path, edits, dry_run=False):
+    """
+    Make several replacements in a file at once. Either every edit is applied or none is.
+    
+    Every old_text is matched against the file as it was before the call, must appear
+    exactly once unless its replace_all is set, and must not overlap another edit.
+    
+    Args:
+        path (str): The path to the file to edit.
+        edits (list): The replacements, as objects with old_text, new_text and optionally
+            replace_all (replace every occurrence instead of exactly one).
+        dry_run (bool): If True, just return the diff without making changes.
+        
+    Returns:
+        str: A confirmation message with diff, or an error message if editing fails.
+    """
+    try:
+        if not os.path.isfile(path):
+            return f"Error: Not a file: {path}"
+        
+        content, newline = patching.read_text(path)
+        try:
+            change = patching.apply_replacements(path, content, edits)
+        except patching.EditError as e:
+            return f"Edit failed, no changes made: {e}"
+        diff = change.diff()
+        summary = f"{len(edits)} edits, {change.removed} lines replaced by {change.added}"
+        
+        if dry_run:
+            return f"Dry run: Changes not applied to {path} ({summary})\n\nDiff:\n{diff}"
+        patching.write_atomic(path, change.new_content, newline)
+        return f"Successfully edited file: {path} ({summary})\n\nDiff:\n{diff}"
+        
+    except PermissionError:
+        return f"Permission denied: {path}"
+    except UnicodeDecodeError:
+        return f"Error: Unable to decode file as UTF-8: {path}"
+    except Exception as e:
+        return f"Error editing file: {e}"
+
+def apply_patch(patch, path=".", dry_run=False):
+    """
+    Apply a unified diff, which may change, create, delete or rename several files.
+    
+    The whole patch is checked before any file is written. Hunks whose lines have moved
+    are applied where their old lines are found. If writing a file fails, the files
+    already written are restored, and files the patch created are removed.
+    
+    Args:
+        patch (str): The patch, as made by diff -u or git diff.
+        path (str): The directory the patch's file names are relative to. Defaults to the current directory (".").
+        dry_run (bool): If True, only check that the patch applies.
+        
+    Returns:
+        str: A summary of the changes per file, or an error message if the patch does not apply.
+    """
+    try:
+        try:
+            file_patches = patching.parse_patch(patch)
+        except patching.EditError as e:
+            return f"Error: Invalid patch: {e}"
+        
+        changes = []
+        notes = []
+        touched = set()
+        for file_patch in file_patches:
+            for name in (file_patch.old_path, file_patch.new_path):
+                if name is not None and os.path.normpath(name) in touched:
+                    return f"Error: Invalid patch: {name} appears more than once; give all its hunks under one header"
+            touched.update(os.path.normpath(name) for name in (file_patch.old_path, file_patch.new_path) if name)
+            old_path = os.path.join(path, file_patch.old_path) if file_patch.old_path else None
+            new_path = os.path.join(path, file_patch.new_path) if file_patch.new_path else None
+            if old_path is None:
+                if os.path.exists(new_path):
+                    return f"Patch failed, no changes made: {file_patch.new_path} already exists"
+                content, newline = "", "\n"
+            elif not os.path.isfile(old_path):
+                return f"Patch failed, no changes made: Not a file: {file_patch.old_path}"
+            else:
+                content, newline = patching.read_text(old_path)
+            try:
+                new_content, regions, hunk_notes = patching.apply_hunks(file_patch, content)
+            except patching.EditError as e:
+                return f"Patch failed, no changes made: {e}"
+            if new_path is None and new_content:
+                return f"Patch failed, no changes made: {file_patch.old_path} would not be empty after its deletion"
+            changes.append(patching.FileChange(
+                old_path or new_path,
+                None if old_path is None else content,
+                None if new_path is None else new_content,
+                regions,
+                newline,
+                new_path,
+            ))
+            notes += [f"{file_patch.path}: {note}" for note in hunk_notes]
+        
+        lines = []
+        for file_patch, change in zip(file_patches, changes):
+            if change.old_content is None:
+                action = "created"
+            elif change.new_content is None:
+                action = "deleted"
+            elif file_patch.old_path != file_patch.new_path:
+                action = f"renamed from {file_patch.old_path}"
+            else:
+                action = "modified"
+            lines.append(f"{file_patch.path}: {action}, +{change.added} -{change.removed}")
+        lines += notes
+        
+        if dry_run:
+            return f"Dry run: Patch applies cleanly to {len(changes)} files, no changes made:\n" + "\n".join(lines)
+        patching.write_changes(changes)
+        return f"Patch applied to {len(changes)} files:\n" + "\n".join(lines)
+        
+    except PermissionError as e:
+        return f"Permission denied: {e.filename or path}"
+    except UnicodeDecodeError:
+        return "Error: Unable to decode a patched file as UTF-8"
+    except Exception as e:
+        return f"Error applying patch: {e}"
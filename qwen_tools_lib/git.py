@@ -1,7 +1,7 @@
-import subprocess
 from typing import Optional, Dict, List
 import json
 from datetime import datetime
+from . import runtime
 
 def git_clone(repo_url: str, target_path: Optional[str] = None) -> str:
     """
@@ -15,11 +15,12 @@ def git_clone(repo_url: str, target_path: Optional[str] = None) -> str:
         str: A confirmation message, or an error message if cloning fails
     """
     try:
-        cmd = ["git", "clone", repo_url]
+        cmd = ["git", "clone", "--progress", repo_url]
         if target_path:
             cmd.append(target_path)
         
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # Progress is streamed to the client while the clone runs
+        result = runtime.run_process(cmd, stream_output=True)
         
         if result.returncode == 0:
             return f"Repository cloned successfully from {repo_url}"
@@ -42,14 +43,14 @@ def git_commit(message: str, path: str = ".") -> str:
     try:
         # First stage all changes
         stage_cmd = ["git", "-C", path, "add", "."]
-        stage_result = subprocess.run(stage_cmd, capture_output=True, text=True)
+        stage_result = runtime.run_process(stage_cmd)
         
         if stage_result.returncode != 0:
             return f"Error staging changes: {stage_result.stderr}"
         
         # Then commit
         commit_cmd = ["git", "-C", path, "commit", "-m", message]
-        commit_result = subprocess.run(commit_cmd, capture_output=True, text=True)
+        commit_result = runtime.run_process(commit_cmd)
         
         if commit_result.returncode == 0:
             return "Changes committed successfully"
@@ -82,7 +83,7 @@ def git_restore(commit_hash: Optional[str] = None, path: str = ".", files: Optio
             else:
                 cmd.append(".")
                 
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = runtime.run_process(cmd)
         
         if result.returncode == 0:
             if commit_hash:
@@ -108,7 +109,7 @@ def git_push(remote: str = "origin", branch: str = "main", path: str = ".") -> s
     """
     try:
         cmd = ["git", "-C", path, "push", remote, branch]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = runtime.run_process(cmd)
         
         if result.returncode == 0:
             return f"Successfully pushed to {remote}/{branch}"
@@ -138,7 +139,7 @@ def git_log(path: str = ".", max_count: Optional[int] = None, since: Optional[st
         if since:
             cmd.extend(["--since", since])
             
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = runtime.run_process(cmd)
         
         if result.returncode == 0:
             # Split the output into individual commits
@@ -183,11 +184,11 @@ def git_show(commit_hash: str, path: str = ".") -> str:
         meta_cmd = ["git", "-C", path, "show", "-s", 
                    "--format=%H%n%an%n%ai%n%B", commit_hash]
         
-        meta_result = subprocess.run(meta_cmd, capture_output=True, text=True)
+        meta_result = runtime.run_process(meta_cmd)
         
         # Get changed files
         files_cmd = ["git", "-C", path, "show", "--name-status", "--format=", commit_hash]
-        files_result = subprocess.run(files_cmd, capture_output=True, text=True)
+        files_result = runtime.run_process(files_cmd)
         
         if meta_result.returncode == 0 and files_result.returncode == 0:
             # Parse the metadata
@@ -232,7 +233,7 @@ def git_status(path: str = ".") -> str:
     try:
         # Get status in porcelain format for easier parsing
         cmd = ["git", "-C", path, "status", "--porcelain", "-b"]
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = runtime.run_process(cmd)
         
         if result.returncode == 0:
             lines = result.stdout.split('\n')
@@ -303,7 +304,7 @@ def git_diff(path: str = ".", commit1: Optional[str] = None, commit2: Optional[s
             cmd.append(file_path)
             
         # Get the raw diff
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = runtime.run_process(cmd)
         
         if result.returncode == 0:
             # Parse the diff output into a structured format
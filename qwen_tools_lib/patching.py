@@ -0,0 +1,454 @@
+import os
+import re
+import stat
+import tempfile
+from bisect import bisect_right
+
+# Unchanged lines shown around each change in the diffs the edit tools return
+DIFF_CONTEXT_LINES = 3
+
+_HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class EditError(ValueError):
+    """Raised when an edit or patch does not fit the file it is applied to. Nothing has been written."""
+
+
+class FileChange:
+    """
+    The new content of one file, worked out in memory before anything is written.
+
+    Regions record which lines changed, as (old start, old end, new lines) with line
+    indexes into old_lines, so the diff only covers the changed parts of the file.
+    """
+
+    def __init__(self, path, old_content, new_content, regions, newline="\n", new_path=None):
+        self.path = path
+        self.new_path = new_path or path
+        self.old_content = old_content  # None for a file the change creates
+        self.new_content = new_content  # None for a file the change deletes
+        self.regions = regions
+        self.newline = newline
+
+    @property
+    def added(self):
+        return sum(len(new_lines) for _, _, new_lines in self.regions)
+
+    @property
+    def removed(self):
+        return sum(end - start for start, end, _ in self.regions)
+
+    def diff(self, context=DIFF_CONTEXT_LINES):
+        """Unified diff of the change, with context lines only around the changed regions."""
+        old_lines = split_lines(self.old_content or "")
+        from_file = "/dev/null" if self.old_content is None else f"a/{self.path}"
+        to_file = "/dev/null" if self.new_content is None else f"b/{self.new_path}"
+        output = [f"--- {from_file}\n", f"+++ {to_file}\n"]
+
+        # Group regions whose context would touch into hunks
+        hunks = []
+        for region in self.regions:
+            if hunks and region[0] - context <= hunks[-1][-1][1] + context:
+                hunks[-1].append(region)
+            else:
+                hunks.append([region])
+
+        offset = 0  # new line index minus old line index before the current hunk
+        for hunk in hunks:
+            start = max(0, hunk[0][0] - context)
+            end = min(len(old_lines), hunk[-1][1] + context)
+            body = []
+            new_count = 0
+            position = start
+            for region_start, region_end, new_lines in hunk:
+                body += [" " + line for line in old_lines[position:region_start]]
+                body += ["-" + line for line in old_lines[region_start:region_end]]
+                body += ["+" + line for line in new_lines]
+                new_count += (region_start - position) + len(new_lines)
+                position = region_end
+            body += [" " + line for line in old_lines[position:end]]
+            new_count += end - position
+            old_count = end - start
+            output.append(
+                f"@@ -{start + (1 if old_count else 0)},{old_count} "
+                f"+{start + offset + (1 if new_count else 0)},{new_count} @@\n"
+            )
+            for line in body:
+                output.append(line if line.endswith("\n") else line + "\n\\ No newline at end of file\n")
+            offset += new_count - old_count
+        return "".join(output)
+
+
+def split_lines(text):
+    """Split text into lines that keep their "\\n", splitting on "\\n" only."""
+    lines = text.split("\n")
+    result = [line + "\n" for line in lines[:-1]]
+    if lines[-1]:
+        result.append(lines[-1])
+    return result
+
+
+def read_text(path):
+    """
+    Read a UTF-8 text file for editing.
+
+    Returns:
+        tuple: (content with "\\n" line endings, the file's line ending).
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        content = f.read()
+    if "\r\n" in content:
+        return content.replace("\r\n", "\n"), "\r\n"
+    return content, "\n"
+
+
+def write_atomic(path, content, newline="\n"):
+    """
+    Replace a file's content in one step: readers see the old or the new file, never
+    part of one. The file's permissions are kept, and a symbolic link is written through.
+    """
+    target = os.path.realpath(path)
+    directory = os.path.dirname(target) or "."
+    try:
+        mode = stat.S_IMODE(os.stat(target).st_mode)
+    except FileNotFoundError:
+        mode = None
+    if newline != "\n":
+        content = content.replace("\n", newline)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(target)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(content)
+        if mode is not None:
+            os.chmod(temp_path, mode)
+        os.replace(temp_path, target)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def apply_replacements(path, content, edits):
+    """
+    Apply a batch of text replacements to a file's content, in memory.
+
+    Every old_text is looked up in the content as it was before the batch, so the
+    edits are checked against the same text and cannot depend on each other. Each
+    must match exactly once unless it sets replace_all, and no two may overlap.
+
+    Args:
+        path (str): The file, for the FileChange.
+        content (str): The file's content.
+        edits (list): Dicts with "old_text", "new_text" and optionally "replace_all".
+
+    Returns:
+        FileChange: The new content and the changed regions.
+
+    Raises:
+        EditError: If an edit is malformed, does not match, or overlaps another.
+    """
+    if not edits:
+        raise EditError("No edits given")
+
+    spans = []  # (start, end, new_text, edit number)
+    for number, edit in enumerate(edits, 1):
+        label = f"Edit {number}: " if len(edits) > 1 else ""
+        if not isinstance(edit, dict):
+            raise EditError(f"Edit {number} must be an object with old_text and new_text")
+        old_text, new_text = edit.get("old_text"), edit.get("new_text")
+        replace_all = edit.get("replace_all", False)
+        if not isinstance(old_text, str) or not isinstance(new_text, str):
+            raise EditError(f"Edit {number} must have string old_text and new_text")
+        if not isinstance(replace_all, bool):
+            raise EditError(f"{label}replace_all must be true or false")
+        if not old_text:
+            raise EditError(f"{label}old_text is empty")
+
+        first = content.find(old_text)
+        if first == -1:
+            raise EditError(f"{label}Could not find text '{old_text}' in file")
+        if replace_all:
+            position = first
+            while position != -1:
+                spans.append((position, position + len(old_text), new_text, number))
+                position = content.find(old_text, position + len(old_text))
+        elif content.find(old_text, first + len(old_text)) != -1:
+            raise EditError(
+                f"{label}Text '{old_text}' appears {content.count(old_text)} times in file, but must match "
+                "exactly once. Include more surrounding text to make it unique"
+            )
+        else:
+            spans.append((first, first + len(old_text), new_text, number))
+
+    spans.sort()
+    for previous, span in zip(spans, spans[1:]):
+        if span[0] < previous[1]:
+            raise EditError(f"Edits {previous[3]} and {span[3]} overlap; combine them into one edit")
+
+    line_starts = [0] + [match.end() for match in re.finditer("\n", content)]
+
+    def line_of(offset):
+        return bisect_right(line_starts, offset) - 1
+
+    # Group spans that share lines, so each group replaces whole lines
+    groups = []
+    for span in spans:
+        first_line = line_of(span[0])
+        last_line = line_of(max(span[0], span[1] - 1))
+        if groups and first_line <= groups[-1][1]:
+            groups[-1][1] = max(groups[-1][1], last_line)
+            groups[-1][2].append(span)
+        else:
+            groups.append([first_line, last_line, [span]])
+
+    pieces = []
+    regions = []
+    position = 0
+    for first_line, last_line, group in groups:
+        block_start = line_starts[first_line]
+        block_end = line_starts[last_line + 1] if last_line + 1 < len(line_starts) else len(content)
+        block = []
+        cursor = block_start
+        for start, end, new_text, _ in group:
+            block.append(content[cursor:start])
+            block.append(new_text)
+            cursor = end
+        block.append(content[cursor:block_end])
+        new_block = "".join(block)
+        pieces.append(content[position:block_start])
+        pieces.append(new_block)
+        position = block_end
+        if regions and regions[-1][1] == first_line:
+            # Changes on adjacent lines read better as one block in the diff
+            start, _, new_lines = regions.pop()
+            regions.append((start, last_line + 1, new_lines + split_lines(new_block)))
+        else:
+            regions.append((first_line, last_line + 1, split_lines(new_block)))
+    pieces.append(content[position:])
+    return FileChange(path, content, "".join(pieces), regions)
+
+
+class FilePatch:
+    """The hunks of one file in a unified diff."""
+
+    def __init__(self, old_path, new_path):
+        self.old_path = old_path  # None when the patch creates the file
+        self.new_path = new_path  # None when the patch deletes the file
+        self.hunks = []  # (old start line, [(kind, text)]) with kind one of " ", "-", "+"
+
+    @property
+    def path(self):
+        return self.new_path if self.new_path is not None else self.old_path
+
+
+def _patch_path(header):
+    path = header[4:].rstrip("\n").split("\t")[0].strip()
+    return None if path == "/dev/null" else path
+
+
+def parse_patch(text):
+    """
+    Parse a unified diff, as made by diff -u or git diff, that may cover several files.
+
+    A hunk runs until the next line that is not part of one, so a header whose
+    counts are too small still works. A blank line without the leading space is
+    taken as an empty context line while the header's counts are unmet; blank lines
+    at the end of a hunk or of the patch, as a pasted patch often has, are dropped.
+
+    Returns:
+        list: FilePatch objects in patch order.
+
+    Raises:
+        EditError: If the text has no file headers or hunks.
+    """
+    lines = split_lines(text)
+    patches = []
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        if line.startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ "):
+            old_path, new_path = _patch_path(line), _patch_path(lines[index + 1])
+            if old_path is None and new_path is None:
+                raise EditError(f"Patch line {index + 1}: both file names are /dev/null")
+            # git diff prefixes paths with a/ and b/
+            if (old_path or "a/").startswith("a/") and (new_path or "b/").startswith("b/"):
+                old_path = old_path[2:] if old_path else None
+                new_path = new_path[2:] if new_path else None
+            patches.append(FilePatch(old_path, new_path))
+            index += 2
+            continue
+        match = _HUNK_HEADER.match(line)
+        if match:
+            if not patches:
+                raise EditError(f"Patch line {index + 1}: hunk before any ---/+++ file header")
+            index += 1
+            # Lines the header says the hunk still has; a missing count means 1
+            old_left = int(match.group(2)) if match.group(2) is not None else 1
+            new_left = int(match.group(4)) if match.group(4) is not None else 1
+            hunk_lines = []
+            bare_blanks = 0  # trailing blank lines without the leading space
+            while index < len(lines):
+                line = lines[index]
+                if line.startswith("\\"):
+                    # "\ No newline at end of file" applies to the line before it
+                    if hunk_lines:
+                        kind, previous = hunk_lines[-1]
+                        hunk_lines[-1] = (kind, previous.rstrip("\n"))
+                elif line == "\n":
+                    # Taken as an empty context line only while the header's counts
+                    # are unmet; after them it is the blank line a pasted patch ends with
+                    if old_left <= 0 and new_left <= 0:
+                        break
+                    hunk_lines.append((" ", "\n"))
+                    bare_blanks += 1
+                    old_left, new_left = old_left - 1, new_left - 1
+                elif line[0] == " ":
+                    hunk_lines.append((" ", line[1:]))
+                    bare_blanks = 0
+                    old_left, new_left = old_left - 1, new_left - 1
+                elif line[0] in "+-" and not (line.startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ ")):
+                    hunk_lines.append((line[0], line[1:]))
+                    bare_blanks = 0
+                    if line[0] == "-":
+                        old_left -= 1
+                    else:
+                        new_left -= 1
+                else:
+                    break
+                index += 1
+            # Counts that were too large still let trailing blank lines in
+            if bare_blanks:
+                del hunk_lines[-bare_blanks:]
+            patches[-1].hunks.append((int(match.group(1)), hunk_lines))
+            continue
+        index += 1
+
+    if not patches:
+        raise EditError("No file headers (--- and +++ lines) found in the patch")
+    for patch in patches:
+        if not patch.hunks:
+            raise EditError(f"No hunks found for {patch.path} in the patch")
+    return patches
+
+
+def apply_hunks(patch, content):
+    """
+    Apply a file's hunks to its content, in memory.
+
+    Each hunk is first tried at the line its header gives, then at the nearest line
+    where its old lines match, after the previous hunk.
+
+    Args:
+        patch (FilePatch): The file's hunks.
+        content (str): The file's content, with "\\n" line endings; "" for a new file.
+
+    Returns:
+        tuple: (new content, changed regions as for FileChange, list of notes on hunks
+            that applied away from their stated line).
+
+    Raises:
+        EditError: If a hunk's old lines are not found.
+    """
+    lines = split_lines(content)
+    regions = []
+    notes = []
+    search_from = 0
+    for number, (start_line, hunk_lines) in enumerate(patch.hunks, 1):
+        old = [text for kind, text in hunk_lines if kind != "+"]
+        # A hunk with no old lines inserts after its stated line; others start at it
+        stated = start_line if not old else max(start_line - 1, 0)
+        position = _find_block(lines, old, stated, search_from)
+        if position is None:
+            expected = "".join(old[:3]).rstrip("\n") or "(nothing)"
+            raise EditError(
+                f"Hunk {number} of {patch.path} does not apply: its old lines were not found "
+                f"at or after line {search_from + 1}. They start with:\n{expected}"
+            )
+        if position != stated:
+            notes.append(f"hunk {number} applied {abs(position - stated)} lines {'after' if position > stated else 'before'} its stated line")
+
+        # Split the hunk into runs of changes between context lines
+        cursor = position
+        removed = 0
+        added = []
+        for kind, text in hunk_lines + [(" ", None)]:
+            if kind == " ":
+                if removed or added:
+                    regions.append((cursor, cursor + removed, added))
+                    cursor += removed
+                    removed, added = 0, []
+                cursor += 1
+            elif kind == "-":
+                removed += 1
+            else:
+                added.append(text)
+        search_from = position + len(old)
+
+    # Splice the regions in, keeping each new line's terminator unless it ends the file
+    result = []
+    position = 0
+    for start, end, new_lines in regions:
+        result += lines[position:start]
+        result += new_lines
+        position = end
+    result += lines[position:]
+    for index in range(len(result) - 1):
+        if not result[index].endswith("\n"):
+            result[index] += "\n"
+    return "".join(result), regions, notes
+
+
+def _find_block(lines, block, hint, start):
+    """Index of the occurrence of block in lines nearest to hint, at or after start, or None."""
+    if not block:
+        return min(max(hint, start), len(lines))
+    strip = lambda line: line.rstrip("\n")
+    block = [strip(line) for line in block]
+    last = len(lines) - len(block)
+    hint = min(max(hint, start), max(last, start))
+    for distance in range(0, max(last - start, 0) + 1):
+        for position in (hint - distance, hint + distance) if distance else (hint,):
+            if start <= position <= last and all(
+                strip(lines[position + offset]) == text for offset, text in enumerate(block)
+            ):
+                return position
+    return None
+
+
+def write_changes(changes):
+    """
+    Write a set of file changes, undoing those already made if one fails.
+
+    Args:
+        changes (list): FileChange objects, already checked.
+
+    Raises:
+        OSError: If a write fails. The files changed before it are restored, and
+            the files created before it are removed.
+    """
+    started = []
+    try:
+        for change in changes:
+            started.append(change)
+            if change.new_content is not None:
+                directory = os.path.dirname(change.new_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                write_atomic(change.new_path, change.new_content, change.newline)
+            # A deleted or renamed file's old path goes
+            if change.new_content is None or (change.old_content is not None and change.new_path != change.path):
+                os.remove(change.path)
+    except BaseException:
+        for change in reversed(started):
+            try:
+                # A created or renamed file's new path goes
+                created = change.old_content is None or change.new_path != change.path
+                if change.new_content is not None and created and os.path.exists(change.new_path):
+                    os.remove(change.new_path)
+                if change.old_content is not None:
+                    write_atomic(change.path, change.old_content, change.newline)
+            except OSError as e:
+                print(f"Could not restore {change.path} after a failed write: {e}")
+        raise
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PagePrefetcher:
+    """
+    Background fetches of pages the model is likely to read next, and a cache of the results.
+
+    After a web search, the top result pages are fetched concurrently while the model
+    is still reading the search results, so a later fetch_web_page of one of them
+    returns at once, or waits only for the rest of a download already under way.
+    Pages are kept for ttl seconds, and the least recently used are dropped when
+    the cache grows past max_bytes.
+    """
+
+    def __init__(self, results=0, max_bytes=16 * 1024 * 1024, ttl=300, workers=4):
+        """
+        Args:
+            results (int): Pages to prefetch per search, from the top. 0 disables prefetching.
+            max_bytes (int): Maximum total size of cached pages, in characters.
+            ttl (float): Seconds a prefetched page is reused.
+            workers (int): Pages fetched at the same time.
+        """
+        self.results = results
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pages = OrderedDict()  # url -> (expires, page, size), least recently used first
+        self._pending = {}  # url -> Future of a fetch still running
+        self._bytes = 0
+        self._executor = None  # Started on first use
+
+    @classmethod
+    def from_environment(cls):
+        return cls(
+            results=int(os.environ.get('WEB_PREFETCH_RESULTS', 0)),
+            max_bytes=int(os.environ.get('WEB_PREFETCH_MB', 16)) * 1024 * 1024,
+            ttl=float(os.environ.get('WEB_PREFETCH_TTL', 300)),
+        )
+
+    @property
+    def enabled(self):
+        return self.results > 0 and self.max_bytes > 0
+
+    def prefetch(self, urls, fetch):
+        """
+        Start fetching the first pages of a list in the background.
+
+        Args:
+            urls (list): Page URLs, most likely to be read first.
+            fetch (callable): Called with a URL on a worker thread. Returns the page
+                to cache as a dict of strings, or None to cache nothing.
+
+        Returns:
+            int: Number of fetches started. Pages already cached or being fetched are skipped.
+        """
+        if not self.enabled:
+            return 0
+        started = 0
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="web-prefetch")
+            for url in urls[:self.results]:
+                if url in self._pending or self._fresh(url) is not None:
+                    continue
+                self._pending[url] = self._executor.submit(self._run, url, fetch)
+                started += 1
+        return started
+
+    def get(self, url, timeout=None):
+        """
+        Get a prefetched page, waiting for its fetch if it is still running.
+
+        Args:
+            url (str): The page URL.
+            timeout (float, optional): Seconds to wait for a running fetch.
+
+        Returns:
+            dict: The page as returned by the fetch function, or None if it was not
+                prefetched, the fetch failed or did not finish in time, or the page expired.
+        """
+        with self._lock:
+            page = self._fresh(url)
+            future = self._pending.get(url) if page is None else None
+        if page is None and future is not None:
+            try:
+                page = future.result(timeout=timeout)
+            except Exception:
+                page = None
+        with self._lock:
+            if page is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return page
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._pages),
+                "bytes": self._bytes,
+                "pending": len(self._pending),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _run(self, url, fetch):
+        try:
+            page = fetch(url)
+        except Exception as e:
+            print(f"Prefetch of {url} failed: {e}")
+            page = None
+        with self._lock:
+            self._pending.pop(url, None)
+            if page is not None:
+                self._store(url, page)
+        return page
+
+    def _fresh(self, url):
+        # Called with the lock held
+        entry = self._pages.get(url)
+        if entry is None:
+            return None
+        expires, page, size = entry
+        if expires <= time.monotonic():
+            del self._pages[url]
+            self._bytes -= size
+            return None
+        self._pages.move_to_end(url)
+        return page
+
+    def _store(self, url, page):
+        # Called with the lock held
+        size = sum(len(value) for value in page.values() if isinstance(value, str))
+        if size > self.max_bytes:
+            return
+        old = self._pages.pop(url, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._pages[url] = (time.monotonic() + self.ttl, page, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, _, evicted) = self._pages.popitem(last=False)
+            self._bytes -= evicted
+
+
+# Filled by brave_web_search and read by fetch_web_page
+page_prefetcher = PagePrefetcher.from_environment()
@@ -1,9 +1,22 @@
 import os
-import sys
-import ast
-import io
-import traceback
-from contextlib import redirect_stdout, redirect_stderr
+from . import runtime
+from .code_cache import compile_cache
+from .sandbox import worker_pool, kernels
+
+
+def _format_output(result, no_output_message, error_prefix):
+    # Keeps the wording of the tool results from before execution moved to worker processes
+    if "error" in result:
+        if not result["traceback"]:
+            return f"{error_prefix}: {result['error']}"
+        return f"{error_prefix}: {result['error']}\n\nTraceback:\n{result['traceback']}"
+    output = ""
+    if result["stdout"]:
+        output += f"Standard Output:\n{result['stdout']}\n"
+    if result["stderr"]:
+        output += f"Standard Error:\n{result['stderr']}\n"
+    return output or no_output_message
+
 
 def python_execute_file(file_path):
     """
@@ -22,40 +35,13 @@ def python_execute_file(file_path):
         return f"Error: File does not have a .py extension: {file_path}"
     
     try:
-        # Capture stdout and stderr
-        stdout_capture = io.StringIO()
-        stderr_capture = io.StringIO()
-        
-        with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture):
-            # Execute the file
-            with open(file_path, 'r') as f:
-                code = f.read()
-            
-            # Create a namespace for execution
-            namespace = {'__file__': file_path}
-            
-            # Execute the code
-            exec(code, namespace)
-        
-        # Get the captured output
-        stdout_output = stdout_capture.getvalue()
-        stderr_output = stderr_capture.getvalue()
-        
-        # Prepare the result
-        result = ""
-        if stdout_output:
-            result += f"Standard Output:\n{stdout_output}\n"
-        if stderr_output:
-            result += f"Standard Error:\n{stderr_output}\n"
-        
-        if not result:
-            result = "File executed successfully with no output."
-            
-        return result
-        
-    except Exception as e:
-        tb = traceback.format_exc()
-        return f"Error executing file: {e}\n\nTraceback:\n{tb}"
+        compiled = compile_cache.lookup_file(file_path).code
+    except Exception:
+        compiled = None  # The worker reads and compiles the file itself, and reports any error
+
+    # Runs in a worker process, with the timeout and resource limits of the pool
+    result = worker_pool.run(file_path=file_path, compiled=compiled)
+    return _format_output(result, "File executed successfully with no output.", "Error executing file")
 
 
 def python_check_syntax(code=None, file_path=None):
@@ -76,34 +62,37 @@ def python_check_syntax(code=None, file_path=None):
         if not os.path.exists(file_path):
             return f"Error: File not found: {file_path}"
         
+        # Unchanged files are neither read nor parsed again
         try:
-            with open(file_path, 'r') as f:
-                code = f.read()
-        except Exception as e:
+            compiled = compile_cache.lookup_file(file_path)
+        except (OSError, UnicodeDecodeError) as e:
             return f"Error reading file: {e}"
+        except Exception as e:
+            return f"Error checking syntax: {e}"
+    else:
+        try:
+            compiled = compile_cache.lookup(code)
+        except Exception as e:
+            return f"Error checking syntax: {e}"
     
-    try:
-        ast.parse(code)
+    if compiled.syntax_error is None:
         return "Syntax check passed. No syntax errors found."
-    except SyntaxError as e:
-        line_no = e.lineno
-        col_no = e.offset
-        line = code.split('\n')[line_no - 1] if line_no <= len(code.split('\n')) else "Line not available"
-        error_message = str(e)
-        
-        result = f"Syntax error at line {line_no}, column {col_no}:\n"
-        result += f"{line}\n"
-        result += f"{' ' * (col_no - 1)}^\n" if col_no else "\n"
-        result += f"Error message: {error_message}"
-        
-        return result
-    except Exception as e:
-        return f"Error checking syntax: {e}"
+
+    error_message, line_no, col_no = compiled.syntax_error
+    result = f"Syntax error at line {line_no}, column {col_no}:\n"
+    result += f"{compiled.error_line}\n"
+    result += f"{' ' * (col_no - 1)}^\n" if col_no else "\n"
+    result += f"Error message: {error_message}"
+    
+    return result
 
 
 def python_execute_code(code):
     """
     Execute arbitrary Python code and return its output.
+
+    Within a conversation session, code runs in the session's persistent kernel, so
+    variables, imports and functions defined by one call are available to the next.
     
     Args:
         code (str): Python code to execute.
@@ -115,33 +104,29 @@ def python_execute_code(code):
         return "Error: No code provided."
     
     try:
-        # Capture stdout and stderr
-        stdout_capture = io.StringIO()
-        stderr_capture = io.StringIO()
-        
-        with redirect_stdout(stdout_capture), redirect_stderr(stderr_capture):
-            # Create a namespace for execution
-            namespace = {}
-            
-            # Execute the code
-            exec(code, namespace)
-        
-        # Get the captured output
-        stdout_output = stdout_capture.getvalue()
-        stderr_output = stderr_capture.getvalue()
-        
-        # Prepare the result
-        result = ""
-        if stdout_output:
-            result += f"Standard Output:\n{stdout_output}\n"
-        if stderr_output:
-            result += f"Standard Error:\n{stderr_output}\n"
-        
-        if not result:
-            result = "Code executed successfully with no output."
-            
-        return result
-        
-    except Exception as e:
-        tb = traceback.format_exc()
-        return f"Error executing code: {e}\n\nTraceback:\n{tb}"
\ No newline at end of file
+        compiled = compile_cache.lookup(code).code
+    except Exception:
+        compiled = None  # The worker compiles the code itself, and reports any error
+
+    session_id = runtime.session_id()
+    if session_id is not None:
+        result = kernels.run(session_id, code=None if compiled else code, compiled=compiled)
+    else:
+        # Runs in a worker process, with the timeout and resource limits of the pool
+        result = worker_pool.run(code=None if compiled else code, compiled=compiled)
+    return _format_output(result, "Code executed successfully with no output.", "Error executing code")
+
+
+def python_reset_kernel():
+    """
+    Discard the variables, imports and functions kept by python_execute_code in this session.
+    
+    Returns:
+        str: Confirmation that the next python_execute_code call starts from a fresh interpreter.
+    """
+    session_id = runtime.session_id()
+    if session_id is None:
+        return "No kernel to reset: outside a session, every python_execute_code call already starts from a fresh interpreter."
+    if kernels.shutdown(session_id):
+        return "Kernel reset. The next python_execute_code call starts from a fresh interpreter."
+    return "No kernel was running for this session. The next python_execute_code call starts from a fresh interpreter."
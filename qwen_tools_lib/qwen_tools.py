@@ -32,6 +32,56 @@ def tools_to_string(tools_dict):
     return result
 
 
+# JSON Schema type of each parameter type used in get_tools_dict()
+JSON_SCHEMA_TYPES = {
+    "string": "string",
+    "integer": "integer",
+    "number": "number",
+    "boolean": "boolean",
+    "list": "array",
+    "dictionary": "object",
+}
+
+
+def tools_to_schema(tools_dict):
+    """
+    Convert the tools dictionary to OpenAI function-calling tool definitions.
+    
+    A "list" parameter may name the type of its items with an "items" key, using
+    the same type names as parameters; items are strings by default.
+    
+    Args:
+        tools_dict (dict): Dictionary containing tool definitions.
+        
+    Returns:
+        list: One {"type": "function", "function": {...}} entry per tool, for the tools= argument of a chat completion.
+    """
+    schema = []
+    for category, category_tools in tools_dict.items():
+        for tool_name, tool_info in category_tools.items():
+            properties = {}
+            required = []
+            for param in tool_info['parameters']:
+                properties[param['name']] = {
+                    "type": JSON_SCHEMA_TYPES[param['type']],
+                    "description": param['description']
+                }
+                if param['type'] == "list":
+                    # Strict validators reject arrays without an item type
+                    properties[param['name']]["items"] = {"type": JSON_SCHEMA_TYPES[param.get('items', "string")]}
+                if param.get("required", True):
+                    required.append(param['name'])
+            schema.append({
+                "type": "function",
+                "function": {
+                    "name": tool_name,
+                    "description": f"{tool_info['description'].rstrip('.')}. Returns: {tool_info['returns']}",
+                    "parameters": {"type": "object", "properties": properties, "required": required}
+                }
+            })
+    return schema
+
+
 def get_tools_dict():
     """
     Define and return a dictionary of all available tools.
@@ -53,7 +103,8 @@ def get_tools_dict():
                     {"name": "enumerate", "required": False, "type": "boolean", "description": "whether to include line numbers (defaults to False)"},
                     {"name": "start_line", "required": False, "type": "integer", "description": "first line to read, 1-indexed (defaults to 1)"},
                     {"name": "end_line", "required": False, "type": "integer", "description": "last line to read, 1-indexed, None for all lines (defaults to None)"},
-                    {"name": "show_repr", "required": False, "type": "boolean", "description": "whether to show Python's repr() of each line, revealing whitespace and special characters (defaults to False)"}
+                    {"name": "show_repr", "required": False, "type": "boolean", "description": "whether to show Python's repr() of each line, revealing whitespace and special characters (defaults to False)"},
+                    {"name": "tail_lines", "required": False, "type": "integer", "description": "read only the last N lines of the file, instead of start_line and end_line (defaults to None)"}
                 ],
                 "returns": "String - the contents of the file (potentially formatted with line numbers or repr), or an error message if reading fails"
             },
@@ -83,6 +134,24 @@ def get_tools_dict():
                 ],
                 "returns": "String - confirmation message with diff showing changes, or error message if editing fails"
             },
+            "multi_edit_file": {
+                "description": "Make several replacements in one file in a single call. Every old_text is matched against the file as it was before the call; either all edits are applied or none is. Prefer this to repeated edit_file calls on the same file",
+                "parameters": [
+                    {"name": "path", "required": True, "type": "string", "description": "path and filename of the file to edit"},
+                    {"name": "edits", "required": True, "type": "list", "items": "dictionary", "description": "list of objects with old_text (text to replace, must match exactly once and not overlap another edit), new_text (replacement text) and optionally replace_all (true to replace every occurrence of old_text)"},
+                    {"name": "dry_run", "required": False, "type": "boolean", "description": "if True, just return the diff without making changes (defaults to False)"}
+                ],
+                "returns": "String - confirmation message with a diff of the changed regions, or error message naming the edit that failed"
+            },
+            "apply_patch": {
+                "description": "Apply a unified diff (as made by diff -u or git diff) that may modify, create, delete or rename several files. The whole patch is checked before any file is written, and hunks whose lines have moved are applied where their old lines are found",
+                "parameters": [
+                    {"name": "patch", "required": True, "type": "string", "description": "the unified diff, with ---/+++ file headers and @@ hunks"},
+                    {"name": "path", "required": False, "type": "string", "description": "directory the file names in the patch are relative to (defaults to the current directory)"},
+                    {"name": "dry_run", "required": False, "type": "boolean", "description": "if True, only check that the patch applies (defaults to False)"}
+                ],
+                "returns": "String - the files changed with lines added and removed, or error message naming the hunk that does not apply"
+            },
             "create_directory": {
                 "description": "Create a new directory in the filesystem",
                 "parameters": [
@@ -91,19 +160,39 @@ def get_tools_dict():
                 "returns": "String - confirmation message indicating success or failure"
             },
             "list_directory": {
-                "description": "List the contents of a directory in the filesystem",
+                "description": "List the contents of a directory in the filesystem, optionally recursively, with each entry's type, size and modification time. Use depth to survey a tree in one call; long listings are paged",
+                "parameters": [
+                    {"name": "path", "required": False, "type": "string", "description": "path of the directory to list. If not provided, lists the current working directory."},
+                    {"name": "depth", "required": False, "type": "integer", "description": "how many levels to list; 1 lists only the directory itself (defaults to 1)"},
+                    {"name": "include", "required": False, "type": "list", "description": "only list entries whose name matches one of these glob patterns, e.g. ['*.py']; patterns containing '/' match the path relative to the directory. Directories are still descended into"},
+                    {"name": "exclude", "required": False, "type": "list", "description": "leave out entries matching any of these glob patterns, and do not descend into matching directories, e.g. ['node_modules', '*.pyc']"},
+                    {"name": "sort", "required": False, "type": "string", "description": "'name' (tree order), 'size', 'mtime' or 'type' (defaults to 'name')"},
+                    {"name": "reverse", "required": False, "type": "boolean", "description": "whether to reverse the sort order, e.g. largest or newest first (defaults to False)"},
+                    {"name": "cursor", "required": False, "type": "string", "description": "the cursor given at the end of the previous page, to get the next page"},
+                    {"name": "limit", "required": False, "type": "integer", "description": "maximum number of entries to return, at most 1000 (defaults to 200)"}
+                ],
+                "returns": "String - one line per entry with its type, size, modification time and path, and the cursor of the next page if there are more entries"
+            },
+            "search_files": {
+                "description": "Search the contents of all files under a directory for a regular expression or literal text, like grep -rn. Skips binary files and files ignored by git. Use this to find where something is defined or used instead of reading files one by one",
                 "parameters": [
-                    {"name": "path", "required": False, "type": "string", "description": "path of the directory to list. If not provided, lists the current working directory."}
+                    {"name": "pattern", "required": True, "type": "string", "description": "regular expression to search for (Python syntax), or plain text if literal is true"},
+                    {"name": "path", "required": False, "type": "string", "description": "directory to search (defaults to the current directory)"},
+                    {"name": "literal", "required": False, "type": "boolean", "description": "whether to search for the pattern as plain text rather than a regular expression (defaults to False)"},
+                    {"name": "ignore_case", "required": False, "type": "boolean", "description": "whether to ignore case (defaults to False)"},
+                    {"name": "glob", "required": False, "type": "string", "description": "only search files whose name matches this pattern, e.g. '*.py' (defaults to all files)"},
+                    {"name": "context_lines", "required": False, "type": "integer", "description": "lines to show before and after each match, at most 10 (defaults to 0)"},
+                    {"name": "max_results", "required": False, "type": "integer", "description": "maximum number of matching lines to return (defaults to 100)"}
                 ],
-                "returns": "String - a list of files and directories in the specified path"
+                "returns": "String - matching lines as path:line:text, with context lines as path-line-text, and a summary of how many files were searched"
             },
             "copy_file": {
-                "description": "Copy a file from source to destination",
+                "description": "Copy a file from source to destination, keeping its permissions and modification time",
                 "parameters": [
                     {"name": "source", "required": True, "type": "string", "description": "path to the source file to copy"},
-                    {"name": "destination", "required": True, "type": "string", "description": "path where the file should be copied to"}
+                    {"name": "destination", "required": True, "type": "string", "description": "path where the file should be copied to, or a directory to copy it into"}
                 ],
-                "returns": "String - confirmation message indicating success or failure"
+                "returns": "String - confirmation message with the size copied and the transfer rate, or error message"
             },
             "remove_file": {
                 "description": "Remove/delete a single file",
@@ -120,12 +209,13 @@ def get_tools_dict():
                 "returns": "String - confirmation message indicating success or failure"
             },
             "copy_directory": {
-                "description": "Copy a directory and all its contents to a new location",
+                "description": "Copy a directory and all its contents to a new location, copying files in parallel. Symbolic links are copied as links. With incremental, an existing copy is brought up to date by copying only changed files, which also resumes an interrupted copy",
                 "parameters": [
                     {"name": "source", "required": True, "type": "string", "description": "path to the source directory to copy"},
-                    {"name": "destination", "required": True, "type": "string", "description": "path where the directory should be copied to"}
+                    {"name": "destination", "required": True, "type": "string", "description": "path where the directory should be copied to"},
+                    {"name": "incremental", "required": False, "type": "boolean", "description": "if True, copy into an existing destination and skip files whose size and modification time already match (defaults to False)"}
                 ],
-                "returns": "String - confirmation message indicating success or failure"
+                "returns": "String - files and bytes copied with files and bytes per second, files skipped, and any files that could not be copied"
             }
         },
         
@@ -239,11 +329,30 @@ def get_tools_dict():
                 "returns": "String - Result of the syntax check"
             },
             "python_execute_code": {
-                "description": "Execute arbitrary Python code and return its output",
+                "description": "Execute arbitrary Python code and return its output. In a session, variables, imports and functions persist between calls, so later calls can reuse data loaded earlier instead of loading it again",
                 "parameters": [
                     {"name": "code", "required": True, "type": "string", "description": "Python code to execute"}
                 ],
                 "returns": "String - The output of the execution or an error message if execution fails"
+            },
+            "python_reset_kernel": {
+                "description": "Discard the variables, imports and functions kept by python_execute_code, so the next call starts from a fresh interpreter",
+                "parameters": [],
+                "returns": "String - Confirmation that the kernel was reset"
+            }
+        },
+
+        "result_tools": {
+            "read_tool_result": {
+                "description": "Read part of a large tool result. Results too long to return in full are shown as a preview naming a handle; use this tool with the handle to read the rest, by character offset or by line range",
+                "parameters": [
+                    {"name": "handle", "required": True, "type": "string", "description": "the handle named in the result's preview, e.g. result-0123456789abcdef"},
+                    {"name": "offset", "required": False, "type": "integer", "description": "first character to return, 0-indexed, defaults to 0"},
+                    {"name": "length", "required": False, "type": "integer", "description": "number of characters to return, defaults to 8000, at most 16000"},
+                    {"name": "start_line", "required": False, "type": "integer", "description": "first line to return, 1-indexed; use instead of offset"},
+                    {"name": "end_line", "required": False, "type": "integer", "description": "last line to return, 1-indexed"}
+                ],
+                "returns": "String - the requested part of the result and its position in the whole result"
             }
         }
     }
@@ -258,8 +367,8 @@ def list_tools():
     Returns:
         str: Formatted string describing all tools.
     """
-    tools_dict = get_tools_dict()
-    return tools_to_string(tools_dict)
+    from .registry import tool_registry
+    return tool_registry.describe()
 
 
 def get_tools_format():
@@ -340,4 +449,23 @@ After receiving the results of a tool call, do not parrot everything back to the
 Instead, just briefly summarize the results in 1-2 sentences.
 
 """
-    return tools_format
\ No newline at end of file
+    return tools_format
+
+def get_tools_version():
+    """
+    Get the current version of the tool registry.
+    
+    Returns:
+        int: A number that changes whenever the available tools change.
+    """
+    # Imported here: the registry is built from get_tools_dict() in this module
+    from .registry import tool_registry
+    return tool_registry.version
+
+
+def invalidate_tools():
+    """
+    Mark the tool registry as changed, so anything built from it is rebuilt.
+    """
+    from .registry import tool_registry
+    tool_registry.invalidate()
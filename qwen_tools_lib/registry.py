@@ -0,0 +1,332 @@
+import importlib
+import inspect
+import json
+import os
+import threading
+
+from .qwen_tools import get_tools_dict, tools_to_schema, tools_to_string
+
+# Module that implements each category (tool group) of get_tools_dict(). A group's
+# module, and the dependencies it imports, are loaded when one of its tools is first used.
+CATEGORY_MODULES = {
+    "filesystem_tools": "filesystem",
+    "git_tools": "git",
+    "web_tools": "web",
+    "python_tools": "python",
+    "result_tools": "results",
+}
+
+
+class ToolArgumentError(ValueError):
+    """Raised when a tool call names an unknown tool or its arguments do not fit the tool."""
+
+
+def _coerce_string(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        # Models often pass JSON file content as an object rather than a string
+        return json.dumps(value, indent=2)
+    raise ToolArgumentError(f"expected a string, got {type(value).__name__}")
+
+
+def _coerce_integer(value):
+    if isinstance(value, bool):
+        raise ToolArgumentError("expected an integer, got a boolean")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(value.strip())
+        except ValueError:
+            pass
+    raise ToolArgumentError(f"expected an integer, got {value!r}")
+
+
+def _coerce_number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise ToolArgumentError(f"expected a number, got {value!r}")
+
+
+_BOOLEAN_STRINGS = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+
+def _coerce_boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in _BOOLEAN_STRINGS:
+        return _BOOLEAN_STRINGS[value.strip().lower()]
+    raise ToolArgumentError(f"expected a boolean, got {value!r}")
+
+
+def _coerce_list(value):
+    if isinstance(value, list):
+        return value
+    if isinstance(value, tuple):
+        return list(value)
+    if isinstance(value, str):
+        if value.lstrip().startswith("["):
+            try:
+                parsed = json.loads(value)
+            except ValueError:
+                raise ToolArgumentError("expected a list, got a string that is not a valid JSON array")
+            if isinstance(parsed, list):
+                return parsed
+        # A single item given without the list around it
+        return [value]
+    raise ToolArgumentError(f"expected a list, got {type(value).__name__}")
+
+
+def _coerce_dictionary(value):
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict):
+            return parsed
+    raise ToolArgumentError(f"expected a JSON object, got {type(value).__name__}")
+
+
+COERCERS = {
+    "string": _coerce_string,
+    "integer": _coerce_integer,
+    "number": _coerce_number,
+    "boolean": _coerce_boolean,
+    "list": _coerce_list,
+    "dictionary": _coerce_dictionary,
+}
+
+
+class ToolSpec:
+    """
+    A tool and its argument checks, prepared once when the registry is built.
+
+    The tool's module is imported when the function is first needed.
+    """
+
+    def __init__(self, name, category, info):
+        """
+        Args:
+            name (str): The tool name the model calls.
+            category (str): The get_tools_dict() category the tool is listed under.
+            info (dict): The tool's entry in get_tools_dict().
+
+        Raises:
+            TypeError: If a parameter has a type with no coercer.
+        """
+        self.name = name
+        self.category = category
+        self.info = info
+        self._function = None
+
+        self._coercers = {}
+        self._required = []
+        for param in info["parameters"]:
+            if param["type"] not in COERCERS:
+                raise TypeError(f"Tool {name} declares parameter {param['name']!r} with unknown type {param['type']!r}")
+            self._coercers[param["name"]] = COERCERS[param["type"]]
+            if param.get("required", True):
+                self._required.append(param["name"])
+
+        # A bare value is accepted for tools with a single obvious parameter
+        self._sole = self._required[0] if len(self._required) == 1 else (
+            next(iter(self._coercers)) if len(self._coercers) == 1 else None
+        )
+        self._usage = ", ".join(
+            f"{param['name']} ({param['type']}, {'required' if param.get('required', True) else 'optional'})"
+            for param in info["parameters"]
+        ) or "none"
+
+    @property
+    def function(self):
+        """
+        The tool function, importing its module on first use.
+
+        Raises:
+            TypeError: If the declared parameters do not match the function's signature.
+        """
+        if self._function is None:
+            module = importlib.import_module(f"{__package__}.{CATEGORY_MODULES[self.category]}")
+            function = getattr(module, self.name)
+            self._check_signature(function)
+            self._function = function
+        return self._function
+
+    def _check_signature(self, function):
+        parameters = inspect.signature(function).parameters
+        for name in self._coercers:
+            if name not in parameters:
+                raise TypeError(f"Tool {self.name} declares parameter {name!r}, which {function.__name__}() does not accept")
+        missing = [
+            name for name, param in parameters.items()
+            if param.default is inspect.Parameter.empty and name not in self._required
+        ]
+        if missing:
+            raise TypeError(f"Tool {self.name} does not declare required parameters {missing} of {function.__name__}()")
+
+    def bind(self, tool_input):
+        """
+        Check and coerce the arguments of a call.
+
+        Args:
+            tool_input: The "input" of the tool call: a dict of arguments, or "" or None
+                for no arguments.
+
+        Returns:
+            dict: Keyword arguments for the tool function. Optional arguments given as
+                null are left out, so the function's defaults apply.
+
+        Raises:
+            ToolArgumentError: If the arguments cannot be made to fit the tool.
+        """
+        if tool_input is None or tool_input == "":
+            tool_input = {}
+        elif not isinstance(tool_input, dict):
+            if self._sole is None:
+                raise self._error("the input must be a JSON object of named parameters")
+            tool_input = {self._sole: tool_input}
+
+        arguments = {}
+        for name, value in tool_input.items():
+            coerce = self._coercers.get(name)
+            if coerce is None:
+                raise self._error(f"unknown parameter {name!r}")
+            if value is None:
+                continue
+            try:
+                arguments[name] = coerce(value)
+            except ToolArgumentError as e:
+                raise self._error(f"parameter {name!r}: {e}")
+        for name in self._required:
+            if name not in arguments:
+                raise self._error(f"missing required parameter {name!r}")
+        return arguments
+
+    def _error(self, problem):
+        return ToolArgumentError(f"Invalid input for tool '{self.name}': {problem}. Parameters: {self._usage}")
+
+
+class ToolRegistry:
+    """
+    The tools the model can call, built once from get_tools_dict().
+
+    The registry is the single source for dispatch and for the tool list in the
+    system prompt: only tools of enabled groups can be called, and each call's
+    arguments are checked against the declared parameter types before the tool runs.
+    Building the registry imports no tool module; each group is loaded on first use.
+    """
+
+    def __init__(self, catalogue=None, enabled_groups=None):
+        """
+        Args:
+            catalogue (dict, optional): Tool definitions by category, as returned by
+                get_tools_dict(). Defaults to get_tools_dict().
+            enabled_groups (list, optional): Categories whose tools are offered to
+                the model. Defaults to all of them.
+        """
+        self._lock = threading.Lock()
+        catalogue = catalogue if catalogue is not None else get_tools_dict()
+        if enabled_groups is not None:
+            unknown = set(enabled_groups) - set(catalogue)
+            if unknown:
+                print(f"Ignoring unknown tool groups: {', '.join(sorted(unknown))}. Known groups: {', '.join(catalogue)}")
+            catalogue = {group: tools for group, tools in catalogue.items() if group in enabled_groups}
+        self._catalogue = catalogue
+        self._tools = {}
+        self._description = None
+        self._schema = None
+        self.version = 1
+        for category, tools in self._catalogue.items():
+            for name, info in tools.items():
+                self._tools[name] = ToolSpec(name, category, info)
+
+    @classmethod
+    def from_environment(cls):
+        groups = os.environ.get('ENABLED_TOOL_GROUPS', '').strip()
+        if not groups or groups.lower() == 'all':
+            return cls()
+        return cls(enabled_groups=[group.strip() for group in groups.split(',') if group.strip()])
+
+    def enabled(self, group):
+        """Check whether a tool group is offered to the model."""
+        return group in self._catalogue
+
+    def load(self):
+        """
+        Import the modules of every enabled group now, and check their signatures,
+        instead of on each group's first call.
+        """
+        for tool in self._tools.values():
+            tool.function
+
+    def get(self, name):
+        """
+        Look up a tool.
+
+        Returns:
+            ToolSpec: The tool, or None if there is no tool by that name.
+        """
+        if not isinstance(name, str):
+            return None
+        return self._tools.get(name)
+
+    def bind(self, name, tool_input):
+        """
+        Look up a tool and check a call's arguments.
+
+        Returns:
+            tuple: (ToolSpec, dict of keyword arguments).
+
+        Raises:
+            ToolArgumentError: If there is no such tool or the arguments do not fit it.
+        """
+        tool = self.get(name)
+        if tool is None:
+            raise ToolArgumentError(f"Unknown tool: {name}. Available tools: {', '.join(self._tools)}")
+        return tool, tool.bind(tool_input)
+
+    def names(self):
+        return list(self._tools)
+
+    def catalogue(self):
+        """Tool definitions by category, in the format of get_tools_dict()."""
+        return self._catalogue
+
+    def describe(self):
+        """The tool list for the system prompt, rendered once per version."""
+        with self._lock:
+            if self._description is None:
+                self._description = tools_to_string(self._catalogue)
+            return self._description
+
+    def schema(self):
+        """The tool definitions for native function calling, built once per version."""
+        with self._lock:
+            if self._schema is None:
+                self._schema = tools_to_schema(self._catalogue)
+            return self._schema
+
+    def invalidate(self):
+        """Mark the registry as changed, so prompts built from it are rebuilt."""
+        with self._lock:
+            self._description = None
+            self._schema = None
+            self.version += 1
+
+
+tool_registry = ToolRegistry.from_environment()
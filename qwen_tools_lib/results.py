@@ -0,0 +1,64 @@
+from . import spill
+
+# Characters returned by one read_tool_result call, by default and at most
+DEFAULT_PAGE_CHARS = 8000
+MAX_PAGE_CHARS = 16000
+
+
+def read_tool_result(handle, offset=None, length=None, start_line=None, end_line=None):
+    """
+    Read part of a large tool result that was stored instead of being returned in full.
+
+    Args:
+        handle (str): The handle named in the result's preview.
+        offset (int, optional): First character to return, 0-indexed. Defaults to 0.
+        length (int, optional): Number of characters to return. Defaults to 8000, at most 16000.
+        start_line (int, optional): First line to return, 1-indexed. Use instead of offset.
+        end_line (int, optional): Last line to return, 1-indexed. Defaults to the last line
+            that fits in length characters.
+
+    Returns:
+        str: The requested part of the result, with its position in the whole result.
+    """
+    try:
+        text = spill.spill_store.get(handle)
+    except spill.ResultNotFound:
+        return f"Error: No stored tool result with handle {handle!r}. It may have been deleted to make room; run the tool again."
+    except OSError as e:
+        return f"Error reading stored tool result: {e}"
+
+    try:
+        length = DEFAULT_PAGE_CHARS if length is None else int(length)
+        length = max(1, min(length, MAX_PAGE_CHARS))
+
+        if start_line is None and end_line is None:
+            offset = 0 if offset is None else max(0, int(offset))
+            page = text[offset:offset + length]
+            end = offset + len(page)
+            return f"Characters {offset}-{end} of {len(text)} ({handle}):\n{page}"
+
+        # Split on newlines only, so line numbers match the preview's line count
+        lines = [line + '\n' for line in text.split('\n')]
+        lines[-1] = lines[-1][:-1]
+        if not lines[-1]:
+            lines.pop()
+        start_line = 1 if start_line is None else max(1, int(start_line))
+        end_line = len(lines) if end_line is None else min(len(lines), int(end_line))
+        if start_line > len(lines):
+            return f"Error: start_line {start_line} is past the end of the result, which has {len(lines)} lines."
+
+        page = ""
+        last_line = start_line - 1
+        for line in lines[start_line - 1:end_line]:
+            if page and len(page) + len(line) > length:
+                break
+            page += line
+            last_line += 1
+        truncated = ""
+        if len(page) > length:
+            # A single line longer than a page
+            page = page[:length]
+            truncated = f"\n[... line {last_line} continues; read it with offset and length ...]"
+        return f"Lines {start_line}-{last_line} of {len(lines)} ({handle}):\n{page}{truncated}"
+    except (TypeError, ValueError) as e:
+        return f"Error: Invalid range: {e}"
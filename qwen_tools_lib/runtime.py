@@ -0,0 +1,237 @@
+import contextvars
+import io
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class ToolTimeout(Exception):
+    """Raised when a tool runs past its deadline."""
+
+
+class ToolCancelled(Exception):
+    """Raised when the request a tool was running for has gone away."""
+
+
+class ToolInvocation:
+    """
+    Deadline and cancellation state of one tool call.
+
+    The API server creates one per call and activates it while the tool runs. Tools
+    read their timeouts from it with remaining(), register the subprocesses they
+    start with track(), so cancel() can stop them, and report progress with emit().
+    """
+
+    def __init__(self, timeout=None, on_output=None, session_id=None):
+        """
+        Args:
+            timeout (float, optional): Seconds the tool may run, counted from activation.
+            on_output (callable, optional): Called with each piece of output the tool
+                emits while it runs. Must be thread-safe.
+            session_id (str, optional): The conversation session the call belongs to.
+        """
+        self.timeout = timeout
+        self.on_output = on_output
+        self.session_id = session_id
+        self.deadline = None
+        self._cancelled = threading.Event()
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.timeout is not None and self.deadline is None:
+            self.deadline = time.monotonic() + self.timeout
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def expired(self, grace=0.0):
+        return self.deadline is not None and time.monotonic() > self.deadline + grace
+
+    def remaining(self, default=None):
+        """
+        Seconds left before the deadline, capped at default.
+
+        Raises:
+            ToolCancelled: If the call was cancelled.
+            ToolTimeout: If the deadline has passed.
+        """
+        if self.cancelled:
+            raise ToolCancelled("Tool call cancelled")
+        if self.deadline is None:
+            return default
+        left = self.deadline - time.monotonic()
+        if left <= 0:
+            raise ToolTimeout(f"Tool call exceeded its {self.timeout:g} second deadline")
+        return left if default is None else min(default, left)
+
+    def emit(self, text):
+        if self.on_output is not None and text:
+            self.on_output(text)
+
+    def cancel(self):
+        """Cancel the call and kill any subprocess it is waiting for."""
+        self._cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            kill_process(process)
+
+    @contextmanager
+    def track(self, process):
+        with self._lock:
+            self._processes.add(process)
+        if self.cancelled:
+            kill_process(process)
+        try:
+            yield process
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+
+_current = contextvars.ContextVar("qwen_tool_invocation", default=None)
+
+
+@contextmanager
+def activate(invocation):
+    """Make invocation the current tool call for the code run inside the block."""
+    invocation.start()
+    token = _current.set(invocation)
+    try:
+        yield invocation
+    finally:
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def remaining(default=None):
+    """
+    Seconds the current tool call has left, capped at default.
+
+    Outside a tool call (for example when a tool is used as a library), this is default.
+    """
+    invocation = current()
+    return default if invocation is None else invocation.remaining(default)
+
+
+def emit(text):
+    """
+    Stream a piece of output to the client while the current tool call is running.
+
+    The tool's return value is still what the model gets; this is only for showing
+    progress. Outside a tool call it does nothing.
+    """
+    invocation = current()
+    if invocation is not None:
+        invocation.emit(text)
+
+
+def session_id():
+    """The conversation session of the current tool call, or None for stateless requests."""
+    invocation = current()
+    return None if invocation is None else invocation.session_id
+
+
+def track(process):
+    """Register a subprocess with the current tool call, so cancelling the call kills it."""
+    invocation = current()
+    return nullcontext(process) if invocation is None else invocation.track(process)
+
+
+def kill_process(process):
+    # Tools start their subprocesses in a new session, so helpers such as
+    # git-remote-https are killed along with the command itself
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "posix" and os.getpgid(process.pid) == process.pid:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def collapse_progress(text):
+    """Keep only the final state of lines that a progress meter rewrote with carriage returns."""
+    return re.sub(r'[^\r\n]*\r(?!\n)', '', text)
+
+
+def _stream_pipe(pipe, captured, invocation):
+    # newline='' keeps carriage returns, so progress updates arrive one at a time
+    for line in io.TextIOWrapper(pipe, encoding='utf-8', errors='replace', newline=''):
+        captured.append(line)
+        if invocation is not None:
+            invocation.emit(line[:-1] + '\n' if line.endswith('\r') else line)
+
+
+def run_process(cmd, stream_output=False, **kwargs):
+    """
+    Run a command and capture its output, within the current tool call's deadline.
+
+    A drop-in for subprocess.run(cmd, capture_output=True, text=True).
+
+    Args:
+        cmd (list): The command.
+        stream_output (bool): Also emit() each line of stdout and stderr as it is
+            written. Progress meters are collapsed to their final state in the
+            captured output.
+
+    Returns:
+        subprocess.CompletedProcess: The finished process.
+
+    Raises:
+        ToolTimeout: If the command runs past the deadline; it is killed.
+        ToolCancelled: If the tool call is cancelled; the command is killed.
+    """
+    timeout = remaining()
+    # No terminal to prompt on: credential prompts fail instead of hanging
+    kwargs.setdefault("stdin", subprocess.DEVNULL)
+    if os.name == "posix":
+        kwargs.setdefault("start_new_session", True)
+    invocation = current()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=not stream_output, **kwargs)
+    with track(process):
+        try:
+            if stream_output:
+                stdout, stderr = _communicate_streaming(process, timeout, invocation)
+            else:
+                stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process(process)
+            process.wait()
+            raise ToolTimeout(f"Command timed out after {timeout:.0f} seconds: {' '.join(cmd[:3])}")
+        except BaseException:
+            kill_process(process)
+            raise
+    if invocation is not None and invocation.cancelled:
+        raise ToolCancelled("Tool call cancelled")
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def _communicate_streaming(process, timeout, invocation):
+    captured = {"stdout": [], "stderr": []}
+    readers = [
+        threading.Thread(target=_stream_pipe, args=(process.stdout, captured["stdout"], invocation), daemon=True),
+        threading.Thread(target=_stream_pipe, args=(process.stderr, captured["stderr"], invocation), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        process.wait(timeout=timeout)
+    finally:
+        # The pipes reach end-of-file once the process exits or is killed
+        if process.poll() is None:
+            kill_process(process)
+        for reader in readers:
+            reader.join()
+    return collapse_progress("".join(captured["stdout"])), collapse_progress("".join(captured["stderr"]))
@@ -0,0 +1,526 @@
+import atexit
+import base64
+import io
+import json
+import marshal
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from . import runtime
+except ImportError:  # Run as a worker script, which only needs _worker_main
+    runtime = None
+
+# Modules each worker imports while it waits for a job
+DEFAULT_PREIMPORT = "json,math,re,random,datetime,collections,itertools,functools,statistics,decimal,fractions"
+
+
+def _apply_limits(cpu_seconds, memory_mb):
+    if resource is None:
+        return
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _limit_cpu_time(cpu_seconds):
+    # RLIMIT_CPU counts a process's whole lifetime, so a kernel moves the limit
+    # forward before each job to give every job its own allowance
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def _format_traceback(e):
+    # Start at the job's own code rather than at the exec() call below
+    return "".join(traceback.format_exception(type(e), e, e.__traceback__.tb_next))
+
+
+class _StreamingCapture(io.TextIOBase):
+    """
+    Captures a job's stdout or stderr, and forwards it to the API server line by line
+    as it is written, so long-running jobs show progress.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.captured = io.StringIO()
+        self.pending = ""
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        self.captured.write(text)
+        self.pending += text
+        if "\n" in text or len(self.pending) >= 4096:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            self.send({"output": self.pending})
+            self.pending = ""
+
+    def getvalue(self):
+        self.flush()
+        return self.captured.getvalue()
+
+
+def _run_job(job, send, namespace=None):
+    """
+    Run one job inside a worker and return its captured output.
+
+    A kernel passes the same namespace for every job, so globals persist between them.
+    """
+    os.chdir(job["cwd"])
+    if job["cwd"] not in sys.path:
+        sys.path.insert(0, job["cwd"])
+    stdout_capture = _StreamingCapture(send)
+    stderr_capture = _StreamingCapture(send)
+    sys.stdout, sys.stderr = stdout_capture, stderr_capture
+    try:
+        if namespace is None:
+            namespace = {'__file__': job["file_path"]} if job["file_path"] is not None else {}
+        if job.get("compiled"):
+            # Compiled by the API server, which caches code objects across calls
+            code = marshal.loads(base64.b64decode(job["compiled"]))
+        elif job["file_path"] is not None:
+            with open(job["file_path"], 'r') as f:
+                code = compile(f.read(), job["file_path"], "exec")
+        else:
+            code = compile(job["code"], "<string>", "exec")
+        exec(code, namespace)
+        return {"stdout": stdout_capture.getvalue(), "stderr": stderr_capture.getvalue()}
+    except SystemExit as e:
+        if e.code in (None, 0):
+            return {"stdout": stdout_capture.getvalue(), "stderr": stderr_capture.getvalue()}
+        return {"error": f"exit code {e.code}", "traceback": _format_traceback(e)}
+    except BaseException as e:
+        stdout_capture.flush()
+        stderr_capture.flush()
+        return {"error": str(e) or type(e).__name__, "traceback": _format_traceback(e)}
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+
+
+def _worker_main(argv, kernel=False):
+    """
+    Entry point of a worker process: import the preloaded modules, wait for one job on
+    stdin, run it and write the result to stdout.
+
+    Messages to the API server are JSON lines: {"output": ...} for each piece of output
+    while the job runs, then {"result": ...}.
+
+    Workers are single-use, so nothing a job does to the interpreter leaks into the next one.
+    A kernel instead runs jobs until stdin is closed, all in the same namespace.
+    """
+    # The job's own writes to file descriptor 1 must not corrupt the result
+    result_out = os.fdopen(os.dup(1), 'w')
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 1)
+
+    cpu_seconds, memory_mb = int(argv[0]), int(argv[1])
+    for name in argv[2:]:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+    def send(message):
+        result_out.write(json.dumps(message) + "\n")
+        result_out.flush()
+
+    if kernel:
+        # Jobs arrive on a private copy of stdin, so a job reading sys.stdin cannot swallow the next one
+        jobs = os.fdopen(os.dup(0), 'r')
+        os.dup2(devnull, 0)
+        _apply_limits(0, memory_mb)
+        namespace = {}
+        for line in iter(jobs.readline, ''):
+            _limit_cpu_time(cpu_seconds)
+            send({"result": _run_job(json.loads(line), send, namespace)})
+        return
+
+    line = sys.stdin.readline()
+    if not line:
+        return
+    os.dup2(devnull, 0)
+    _apply_limits(cpu_seconds, memory_mb)
+
+    send({"result": _run_job(json.loads(line), send)})
+
+
+def _discard(process):
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+    for pipe in (process.stdin, process.stdout):
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _read_messages(process, result, invocation):
+    # Stops at the result, so a kernel's pipe is left ready for its next job
+    for line in iter(process.stdout.readline, ''):
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if "output" in message:
+            if invocation is not None:
+                invocation.emit(message["output"])
+        else:
+            result.update(message["result"])
+            return
+
+
+def _exchange(process, job, timeout, invocation, close_stdin=True):
+    """
+    Send a job to a worker process and wait for its result, forwarding output as it arrives.
+
+    Returns:
+        dict: The job's result, an empty dict if the worker exited without one, or None
+            if the timeout passed first; the worker is then killed.
+    """
+    result = {}
+    try:
+        process.stdin.write(json.dumps(job) + "\n")
+        if close_stdin:
+            process.stdin.close()
+        else:
+            process.stdin.flush()
+    except (OSError, ValueError):
+        pass  # The worker died; reported by the caller from its exit code
+    reader = threading.Thread(target=_read_messages, args=(process, result, invocation), daemon=True)
+    reader.start()
+    reader.join(timeout)
+    if reader.is_alive():
+        _discard(process)
+        reader.join()
+        return None
+    return result
+
+
+def _spawn(cpu_seconds, memory_mb, preimport, kernel=False):
+    command = [sys.executable, os.path.abspath(__file__)]
+    if kernel:
+        command.append("--kernel")
+    command += [str(cpu_seconds), str(memory_mb)] + list(preimport)
+    return subprocess.Popen(
+        command,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+
+
+class WorkerPool:
+    """
+    Pool of warm, single-use Python worker processes.
+
+    Idle workers are started ahead of time and have already imported the commonly used
+    modules, so a job does not wait for interpreter startup. A job runs in its own process
+    with CPU time and memory limits and a wall-clock timeout, so concurrent jobs cannot
+    capture each other's output or stall the server. The worker exits after the job and
+    a fresh one is started in the background to take its place.
+    """
+
+    def __init__(self, size=2, timeout=30.0, cpu_seconds=30, memory_mb=1024, preimport=()):
+        self.size = size
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.preimport = list(preimport)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    @classmethod
+    def from_environment(cls):
+        preimport = os.environ.get('PYTHON_PREIMPORT', DEFAULT_PREIMPORT)
+        return cls(
+            size=int(os.environ.get('PYTHON_WORKERS', 2)),
+            timeout=float(os.environ.get('PYTHON_TIMEOUT', 30)),
+            cpu_seconds=int(os.environ.get('PYTHON_CPU_SECONDS', 30)),
+            memory_mb=int(os.environ.get('PYTHON_MEMORY_MB', 1024)),
+            preimport=[name.strip() for name in preimport.split(',') if name.strip()],
+        )
+
+    def _spawn(self):
+        return _spawn(self.cpu_seconds, self.memory_mb, self.preimport)
+
+    def _refill(self):
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= self.size:
+                    return
+            process = self._spawn()
+            with self._lock:
+                if self._closed or len(self._idle) >= self.size:
+                    _discard(process)
+                    return
+                self._idle.append(process)
+
+    def start(self):
+        """Start the idle workers now instead of on the first job."""
+        self._refill()
+
+    def _acquire(self):
+        with self._lock:
+            while self._idle:
+                process = self._idle.pop()
+                if process.poll() is None:
+                    return process
+        return self._spawn()
+
+    def run(self, code=None, file_path=None, compiled=None, timeout=None):
+        """
+        Run Python code or a file in a worker process.
+
+        Args:
+            code (str, optional): Source code to execute.
+            file_path (str, optional): Path of a file to execute instead.
+            compiled (str, optional): The code or file already compiled, as a marshalled
+                code object in base64 (see code_cache). The worker then skips compiling.
+            timeout (float, optional): Wall-clock limit in seconds, defaults to the pool's.
+
+        Returns:
+            dict: "stdout" and "stderr" on success, or "error" and "traceback" on failure.
+        """
+        if self._closed:
+            return {"error": "Python worker pool is shut down", "traceback": ""}
+        try:
+            # The API server's per-tool deadline can be shorter than the pool's timeout
+            timeout = runtime.remaining(self.timeout if timeout is None else timeout)
+        except (runtime.ToolTimeout, runtime.ToolCancelled) as e:
+            return {"error": str(e), "traceback": ""}
+        process = self._acquire()
+        invocation = runtime.current()
+        job = {"code": code, "file_path": file_path, "compiled": compiled, "cwd": os.getcwd()}
+        try:
+            with runtime.track(process):
+                result = _exchange(process, job, timeout, invocation)
+                if result is None:
+                    return {"error": f"Execution timed out after {timeout:.0f} seconds", "traceback": ""}
+                process.wait()
+        finally:
+            _discard(process)
+            # Replace the used worker off the request path
+            threading.Thread(target=self._refill, daemon=True).start()
+
+        if invocation is not None and invocation.cancelled:
+            return {"error": "Execution cancelled", "traceback": ""}
+        if result:
+            return result
+        if hasattr(signal, 'SIGXCPU') and process.returncode == -signal.SIGXCPU:
+            return {"error": f"Execution exceeded the CPU time limit of {self.cpu_seconds} seconds", "traceback": ""}
+        return {"error": f"Python worker exited unexpectedly (exit code {process.returncode})", "traceback": ""}
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for process in idle:
+            _discard(process)
+
+
+class _Kernel:
+    def __init__(self, process):
+        self.process = process
+        self.lock = threading.Lock()  # Held while a job runs
+        self.last_used = time.monotonic()
+
+
+class KernelManager:
+    """
+    Persistent Python kernels, one per conversation session.
+
+    A kernel is a long-lived worker process that runs every python_execute_code call of
+    its session in the same namespace, so variables, imports and loaded data carry over
+    from one call to the next. Kernels have the worker pool's memory limit and a CPU time
+    limit per call. A kernel is shut down after idle_timeout seconds without a call, and
+    the least recently used idle kernel is shut down when more than max_kernels are running.
+    A kernel that times out, exceeds a limit or is cancelled is killed, and the session's
+    next call starts a fresh one.
+    """
+
+    def __init__(self, pool, max_kernels=8, idle_timeout=900.0):
+        """
+        Args:
+            pool (WorkerPool): Pool whose timeout, limits and preloaded modules kernels use.
+            max_kernels (int): Kernels kept running at most, unless all of them are busy.
+            idle_timeout (float): Seconds without a call after which a kernel is shut down.
+        """
+        self.pool = pool
+        self.max_kernels = max_kernels
+        self.idle_timeout = idle_timeout
+        self._kernels = OrderedDict()  # session id -> _Kernel, least recently used first
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._reaper = None
+        atexit.register(self.close)
+
+    @classmethod
+    def from_environment(cls, pool):
+        return cls(
+            pool,
+            max_kernels=int(os.environ.get('PYTHON_KERNELS', 8)),
+            idle_timeout=float(os.environ.get('PYTHON_KERNEL_IDLE_SECONDS', 900)),
+        )
+
+    def run(self, session_id, code=None, compiled=None, timeout=None):
+        """
+        Run Python code in a session's kernel, starting the kernel if needed.
+
+        Args:
+            session_id (str): The conversation session the kernel belongs to.
+            code (str, optional): Source code to execute.
+            compiled (str, optional): The code already compiled (see WorkerPool.run).
+            timeout (float, optional): Wall-clock limit in seconds, defaults to the pool's.
+
+        Returns:
+            dict: "stdout" and "stderr" on success, or "error" and "traceback" on failure.
+        """
+        if self._stopped.is_set():
+            return {"error": "Python kernels are shut down", "traceback": ""}
+        try:
+            timeout = runtime.remaining(self.pool.timeout if timeout is None else timeout)
+        except (runtime.ToolTimeout, runtime.ToolCancelled) as e:
+            return {"error": str(e), "traceback": ""}
+        invocation = runtime.current()
+        job = {"code": code, "file_path": None, "compiled": compiled, "cwd": os.getcwd()}
+
+        while True:
+            kernel = self._get(session_id)
+            with kernel.lock:
+                # Shut down by the reaper between _get() and taking the lock
+                if kernel.process.poll() is not None:
+                    self._remove(session_id, kernel)
+                    continue
+                with runtime.track(kernel.process):
+                    result = _exchange(kernel.process, job, timeout, invocation, close_stdin=False)
+                kernel.last_used = time.monotonic()
+                break
+
+        lost = "The kernel was restarted, so variables from earlier calls are lost."
+        if invocation is not None and invocation.cancelled:
+            self._remove(session_id, kernel)
+            return {"error": "Execution cancelled", "traceback": ""}
+        if result is None:
+            self._remove(session_id, kernel)
+            return {"error": f"Execution timed out after {timeout:.0f} seconds. {lost}", "traceback": ""}
+        if result:
+            return result
+
+        self._remove(session_id, kernel)
+        if hasattr(signal, 'SIGXCPU') and kernel.process.returncode == -signal.SIGXCPU:
+            return {"error": f"Execution exceeded the CPU time limit of {self.pool.cpu_seconds} seconds. {lost}", "traceback": ""}
+        return {"error": f"Python kernel exited unexpectedly (exit code {kernel.process.returncode}). {lost}", "traceback": ""}
+
+    def shutdown(self, session_id):
+        """
+        Shut down a session's kernel, discarding its state.
+
+        Returns:
+            bool: True if the session had a kernel.
+        """
+        with self._lock:
+            kernel = self._kernels.pop(session_id, None)
+        if kernel is None:
+            return False
+        _discard(kernel.process)
+        return True
+
+    def evict_idle(self):
+        """Shut down kernels that have been idle for longer than idle_timeout."""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [session_id for session_id, kernel in self._kernels.items()
+                    if kernel.last_used < cutoff and not kernel.lock.locked()]
+            evicted = [self._kernels.pop(session_id) for session_id in idle]
+        for kernel in evicted:
+            _discard(kernel.process)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "kernels": len(self._kernels),
+                "busy": sum(1 for kernel in self._kernels.values() if kernel.lock.locked()),
+                "max_kernels": self.max_kernels,
+            }
+
+    def close(self):
+        self._stopped.set()
+        with self._lock:
+            kernels, self._kernels = list(self._kernels.values()), OrderedDict()
+        for kernel in kernels:
+            _discard(kernel.process)
+
+    def _get(self, session_id):
+        evicted = []
+        with self._lock:
+            kernel = self._kernels.get(session_id)
+            if kernel is None:
+                kernel = _Kernel(_spawn(self.pool.cpu_seconds, self.pool.memory_mb, self.pool.preimport, kernel=True))
+                self._kernels[session_id] = kernel
+                # Make room by shutting down the least recently used idle kernels
+                for other_id, other in list(self._kernels.items()):
+                    if len(self._kernels) <= self.max_kernels:
+                        break
+                    if other is not kernel and not other.lock.locked():
+                        evicted.append(self._kernels.pop(other_id))
+                if self._reaper is None:
+                    self._reaper = threading.Thread(target=self._reap, daemon=True)
+                    self._reaper.start()
+            self._kernels.move_to_end(session_id)
+        for other in evicted:
+            _discard(other.process)
+        return kernel
+
+    def _remove(self, session_id, kernel):
+        with self._lock:
+            if self._kernels.get(session_id) is kernel:
+                del self._kernels[session_id]
+        _discard(kernel.process)
+
+    def _reap(self):
+        while not self._stopped.wait(min(60.0, self.idle_timeout / 2)):
+            self.evict_idle()
+
+
+worker_pool = WorkerPool.from_environment()
+
+# Kernels of sessions that use python_execute_code
+kernels = KernelManager.from_environment(worker_pool)
+
+
+if __name__ == "__main__":
+    # Started by WorkerPool as a script, so drop this package's directory from the import path
+    sys.path.pop(0)
+    if sys.argv[1:2] == ["--kernel"]:
+        _worker_main(sys.argv[2:], kernel=True)
+    else:
+        _worker_main(sys.argv[1:])
@@ -0,0 +1,381 @@
+import atexit
+import fnmatch
+import json
+import mmap
+import os
+import re
+import subprocess
+import sys
+import threading
+
+try:
+    from . import runtime
+except ImportError:  # Run as a worker script, which only needs search_paths
+    runtime = None
+
+# Files with a NUL byte in their first block are treated as binary and skipped
+BINARY_CHECK_BYTES = 8192
+
+# Matched and context lines longer than this are cut, so minified files do not flood the result
+MAX_LINE_CHARS = 300
+
+# Below these totals a search runs in the calling thread; starting work on the
+# worker processes costs more than it saves
+PARALLEL_MIN_FILES = 200
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+
+class IgnoreRules:
+    """
+    The .gitignore rules that apply in one directory, for trees that are not git work trees.
+
+    Supports comments, negation with "!", directory-only patterns ending in "/", and
+    patterns anchored to their .gitignore's directory by a "/". The last matching
+    rule wins, as in git.
+    """
+
+    def __init__(self, parent=None):
+        self.rules = list(parent.rules) if parent is not None else []
+
+    def add_file(self, directory, relative_dir):
+        try:
+            with open(os.path.join(directory, '.gitignore'), encoding='utf-8', errors='replace') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.strip('/') if dir_only else line
+            anchored = '/' in line
+            if anchored:
+                line = line.lstrip('/')
+                base = f"{relative_dir}/" if relative_dir else ""
+                line = base + line
+            self.rules.append((line, negate, dir_only, anchored))
+
+    def ignored(self, relative_path, is_dir):
+        name = relative_path.rsplit('/', 1)[-1]
+        ignored = False
+        for pattern, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if fnmatch.fnmatchcase(relative_path if anchored else name, pattern):
+                ignored = not negate
+        return ignored
+
+
+def list_files(root, glob=None):
+    """
+    List the files under a directory that git would not ignore.
+
+    In a git work tree this asks git, which applies every ignore rule exactly.
+    Elsewhere the tree is walked, applying the .gitignore files found on the way.
+
+    Args:
+        root (str): The directory to search.
+        glob (str, optional): Only list files whose name matches this pattern, e.g. "*.py".
+
+    Returns:
+        list: Paths relative to root, with "/" separators.
+    """
+    try:
+        result = runtime.run_process(
+            ["git", "-C", root, "ls-files", "-z", "--cached", "--others", "--exclude-standard"]
+        )
+        files = [path for path in result.stdout.split('\0') if path] if result.returncode == 0 else None
+    except OSError:
+        files = None
+
+    if files is None:
+        files = []
+        rules = {root: IgnoreRules()}
+        for directory, dirnames, filenames in os.walk(root):
+            runtime.remaining()  # Stops the walk if the call was cancelled or has run out of time
+            relative_dir = os.path.relpath(directory, root).replace(os.sep, '/')
+            relative_dir = "" if relative_dir == "." else relative_dir
+            directory_rules = rules.pop(directory)
+            if '.gitignore' in filenames:
+                directory_rules.add_file(directory, relative_dir)
+            kept = []
+            for name in sorted(dirnames):
+                relative = f"{relative_dir}/{name}" if relative_dir else name
+                if name != '.git' and not directory_rules.ignored(relative, True):
+                    kept.append(name)
+                    rules[os.path.join(directory, name)] = IgnoreRules(directory_rules)
+            dirnames[:] = kept
+            for name in sorted(filenames):
+                relative = f"{relative_dir}/{name}" if relative_dir else name
+                if not directory_rules.ignored(relative, False):
+                    files.append(relative)
+
+    if glob:
+        files = [path for path in files if fnmatch.fnmatch(path.rsplit('/', 1)[-1], glob)]
+    # Git lists untracked files first; results are reported in path order
+    files.sort()
+    return files
+
+
+def search_paths(root, paths, pattern, flags, context_lines, max_matches):
+    """
+    Search files for a pattern. Runs in a worker process, so it only takes and returns
+    JSON-serializable data.
+
+    Args:
+        root (str): The directory the paths are relative to.
+        paths (list): Paths of the files to search.
+        pattern (str): Regular expression to search for.
+        flags (int): re flags.
+        context_lines (int): Lines to include before and after each match.
+        max_matches (int): Stop after this many matching lines.
+
+    Returns:
+        tuple: (list of [path, match count, [[line number, text, is_match]]] for files
+            with matches, number of files searched).
+    """
+    regex = re.compile(pattern.encode('utf-8'), flags)
+    results = []
+    searched = 0
+    for path in paths:
+        if max_matches <= 0:
+            break
+        try:
+            with open(os.path.join(root, path), 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if b'\0' in mm[:BINARY_CHECK_BYTES]:
+                        continue
+                    searched += 1
+                    count, lines = _search_mapped(mm, regex, context_lines, max_matches)
+        except (OSError, ValueError):
+            continue
+        if count:
+            results.append([path, count, lines])
+            max_matches -= count
+    return results, searched
+
+
+def _search_mapped(mm, regex, context_lines, max_matches):
+    size = len(mm)
+    lines = {}  # line number -> (text, is_match)
+    count = 0
+    line_number = 1
+    counted_to = 0  # newlines before this offset are counted in line_number
+    pos = 0
+    while count < max_matches and pos <= size:
+        match = regex.search(mm, pos)
+        if match is None:
+            break
+        start = mm.rfind(b'\n', 0, match.start()) + 1
+        end = mm.find(b'\n', match.start())
+        end = size if end == -1 else end
+        line_number += mm[counted_to:start].count(b'\n')
+        counted_to = start
+        count += 1
+        lines[line_number] = (_decode(mm[start:end]), True)
+
+        # Context before the match, walking back one line at a time
+        before_end = start
+        for offset in range(1, context_lines + 1):
+            if before_end == 0 or line_number - offset in lines:
+                break
+            before_start = mm.rfind(b'\n', 0, before_end - 1) + 1
+            lines[line_number - offset] = (_decode(mm[before_start:before_end - 1]), False)
+            before_end = before_start
+        # Context after the match
+        after_start = end + 1
+        for offset in range(1, context_lines + 1):
+            if after_start >= size:
+                break
+            after_end = mm.find(b'\n', after_start)
+            after_end = size if after_end == -1 else after_end
+            lines.setdefault(line_number + offset, (_decode(mm[after_start:after_end]), False))
+            after_start = after_end + 1
+
+        # One result per line: continue after the matched line
+        pos = end + 1
+    return count, [[number, text, is_match] for number, (text, is_match) in sorted(lines.items())]
+
+
+def _decode(data):
+    text = data.decode('utf-8', errors='replace').rstrip('\r')
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + " [...]"
+    return text
+
+
+class SearchPool:
+    """
+    Pool of worker processes that search large trees in parallel, started on first use.
+
+    Like the Python sandbox workers, each worker runs this file as a script, so it
+    imports neither this package nor the server, and takes batches of files as JSON
+    lines on stdin. Workers stay up between searches. A worker that dies is replaced
+    and its batch is searched in the calling process instead.
+    """
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._idle = []
+        atexit.register(self.close)
+
+    @classmethod
+    def from_environment(cls):
+        return cls(workers=int(os.environ.get('SEARCH_WORKERS', min(4, os.cpu_count() or 1))))
+
+    def search(self, root, paths, pattern, flags, context_lines, max_matches):
+        """
+        Search files, on the pool if there are enough of them to be worth it.
+
+        Returns:
+            tuple: As for search_paths(), with results in the order of paths.
+        """
+        total_bytes = 0
+        for path in paths:
+            try:
+                total_bytes += os.path.getsize(os.path.join(root, path))
+            except OSError:
+                pass
+        if self.workers <= 1 or (len(paths) < PARALLEL_MIN_FILES and total_bytes < PARALLEL_MIN_BYTES):
+            return search_paths(root, paths, pattern, flags, context_lines, max_matches)
+
+        # Several batches per worker, so one slow batch does not leave the others idle
+        batch_size = max(1, -(-len(paths) // (self.workers * 4)))
+        queue = list(range(0, len(paths), batch_size))
+        starts = list(queue)
+        done_batches = {}
+        state = {"stop": False}
+        state_lock = threading.Lock()
+
+        def run_batches(process):
+            while True:
+                with state_lock:
+                    if state["stop"] or not queue:
+                        break
+                    start = queue.pop(0)
+                job = {
+                    "root": root, "paths": paths[start:start + batch_size], "pattern": pattern,
+                    "flags": flags, "context_lines": context_lines, "max_matches": max_matches,
+                }
+                try:
+                    batch = _exchange(process, job)
+                except (OSError, ValueError) as e:
+                    print(f"Search worker failed, searching its batch in-process: {e}")
+                    _discard(process)
+                    process = None
+                    batch = search_paths(**job)
+                with state_lock:
+                    done_batches[start] = batch
+                    # Stop early once the first batches, in path order, have enough matches
+                    found = 0
+                    for batch_start in starts:
+                        if batch_start not in done_batches:
+                            break
+                        found += sum(count for _, count, _ in done_batches[batch_start][0])
+                    if found >= max_matches:
+                        state["stop"] = True
+                if process is None:
+                    process = self._spawn()
+            self._release(process)
+
+        threads = [
+            threading.Thread(target=run_batches, args=(process,), daemon=True)
+            for process in self._acquire(min(self.workers, len(queue)))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(runtime.remaining(1.0))
+        except BaseException:
+            # Cancelled or out of time: workers finish their current batch and go back to the pool
+            with state_lock:
+                state["stop"] = True
+            raise
+
+        results = []
+        searched = 0
+        for start in sorted(done_batches):
+            batch_results, batch_searched = done_batches[start]
+            results.extend(batch_results)
+            searched += batch_searched
+        return results, searched
+
+    def close(self):
+        """Stop the idle workers."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for process in idle:
+            _discard(process)
+
+    def _spawn(self):
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+
+    def _acquire(self, count):
+        processes = []
+        with self._lock:
+            while self._idle and len(processes) < count:
+                process = self._idle.pop()
+                if process.poll() is None:
+                    processes.append(process)
+        while len(processes) < count:
+            processes.append(self._spawn())
+        return processes
+
+    def _release(self, process):
+        with self._lock:
+            if len(self._idle) < self.workers and process.poll() is None:
+                self._idle.append(process)
+                return
+        _discard(process)
+
+
+def _exchange(process, job):
+    process.stdin.write(json.dumps(job) + "\n")
+    process.stdin.flush()
+    line = process.stdout.readline()
+    if not line:
+        raise OSError(f"worker exited with code {process.wait()}")
+    reply = json.loads(line)
+    return reply["results"], reply["searched"]
+
+
+def _discard(process):
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+    for pipe in (process.stdin, process.stdout):
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _worker_main():
+    for line in iter(sys.stdin.readline, ''):
+        results, searched = search_paths(**json.loads(line))
+        sys.stdout.write(json.dumps({"results": results, "searched": searched}) + "\n")
+        sys.stdout.flush()
+
+
+search_pool = SearchPool.from_environment()
+
+
+if __name__ == "__main__":
+    # Started by SearchPool as a script, so drop this package's directory from the import path
+    sys.path.pop(0)
+    _worker_main()
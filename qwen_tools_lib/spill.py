@@ -0,0 +1,146 @@
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+_HANDLE = re.compile(r"^result-[0-9a-f]{16}$")
+
+
+class ResultNotFound(KeyError):
+    pass
+
+
+class SpillStore:
+    """
+    Disk-backed store of tool results too large to put in the prompt.
+
+    Each result is a UTF-8 text file named after its handle. Files are kept until the
+    store grows past max_bytes and then deleted oldest first, so handles in a session's
+    history stay valid across requests and server restarts for as long as space allows.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            directory (str): Directory the result files are kept in.
+            max_bytes (int): Maximum total size of stored results, in bytes.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = None  # handle -> file size, oldest first; loaded on first use
+        self._bytes = 0
+
+    @classmethod
+    def from_environment(cls):
+        return cls(
+            os.environ.get('TOOL_RESULT_DIR', '.tool_results'),
+            max_bytes=int(os.environ.get('TOOL_RESULT_STORE_MB', 256)) * 1024 * 1024,
+        )
+
+    def put(self, text):
+        """
+        Store a result.
+
+        Args:
+            text (str): The full tool result.
+
+        Returns:
+            str: The handle to read it back with.
+        """
+        handle = f"result-{uuid.uuid4().hex[:16]}"
+        data = text.encode('utf-8', 'surrogatepass')
+        path = self._path(handle)
+        with self._lock:
+            self._load_index()
+            temporary = f"{path}.tmp"
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+            self._sizes[handle] = len(data)
+            self._bytes += len(data)
+            # Delete the oldest results, but never the one just stored
+            while self._bytes > self.max_bytes and len(self._sizes) > 1:
+                oldest, size = self._sizes.popitem(last=False)
+                self._bytes -= size
+                try:
+                    os.remove(self._path(oldest))
+                except OSError:
+                    pass
+        return handle
+
+    def get(self, handle):
+        """
+        Read a stored result.
+
+        Args:
+            handle (str): The handle returned by put().
+
+        Returns:
+            str: The full result.
+
+        Raises:
+            ResultNotFound: If the handle is malformed, or the result was never stored or has been deleted.
+        """
+        if not isinstance(handle, str) or not _HANDLE.match(handle):
+            raise ResultNotFound(handle)
+        try:
+            with open(self._path(handle), 'rb') as f:
+                return f.read().decode('utf-8', 'surrogatepass')
+        except FileNotFoundError:
+            raise ResultNotFound(handle)
+
+    def _load_index(self):
+        if self._sizes is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if _HANDLE.match(entry.name):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._sizes = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._bytes = sum(self._sizes.values())
+
+    def _path(self, handle):
+        return os.path.join(self.directory, handle)
+
+
+def make_preview(text, handle, preview_chars):
+    """
+    Build the compact stand-in for a stored result: its head and tail, and how to read the rest.
+
+    Args:
+        text (str): The full result.
+        handle (str): The result's handle in the store.
+        preview_chars (int): Characters of the result to show, split between head and tail.
+
+    Returns:
+        str: The preview.
+    """
+    preview_chars = min(preview_chars, len(text) // 2)
+    head_end = preview_chars * 3 // 4
+    tail_start = len(text) - (preview_chars - head_end)
+    # Cut at line boundaries where that does not lose much of the preview
+    newline = text.rfind('\n', 0, head_end)
+    if newline > head_end // 2:
+        head_end = newline + 1
+    newline = text.find('\n', tail_start, tail_start + (preview_chars - head_end) // 2)
+    if newline != -1:
+        tail_start = newline + 1
+
+    total_lines = text.count('\n') + (0 if text.endswith('\n') else 1)
+    omitted_lines = text.count('\n', head_end, tail_start)
+    return (
+        f"{text[:head_end]}"
+        f"\n[... {tail_start - head_end} characters ({omitted_lines} lines) omitted. "
+        f"The full result is {len(text)} characters and {total_lines} lines, stored as {handle}. "
+        f"Call read_tool_result with this handle and an offset or a line range to read the rest ...]\n"
+        f"{text[tail_start:]}"
+    )
+
+
+# Shared by the API server, which stores results, and the read_tool_result tool
+spill_store = SpillStore.from_environment()
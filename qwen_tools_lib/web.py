@@ -1,6 +1,25 @@
 import os
+import re
 import requests
 import json
+from . import prefetch, runtime
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+# Class names of elements likely to be ads, banners, navigation and the like
+_NOISE_CLASSES = re.compile('(ad|banner|menu|sidebar|footer|header|nav|comment|popup|cookie)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Prefetched pages larger than this are abandoned; fetch_web_page downloads them when asked
+PREFETCH_MAX_PAGE_BYTES = 2 * 1024 * 1024
+PREFETCH_TIMEOUT = 30
 
 def brave_web_search(query, count=10):
     """
@@ -32,11 +51,16 @@ def brave_web_search(query, count=10):
         }
         
         # Make the API request
-        response = requests.get(url, headers=headers, params=params)
+        response = requests.get(url, headers=headers, params=params, timeout=runtime.remaining(15))
         response.raise_for_status()  # Raise an exception for HTTP errors
-        
+        results = response.json()
+
+        # Start downloading the top results while the model reads the summaries
+        if prefetch.page_prefetcher.enabled:
+            prefetch.page_prefetcher.prefetch(_result_urls(results), _prefetch_page)
+
         # Return the JSON response
-        return response.json()
+        return results
     
     except requests.exceptions.RequestException as e:
         return {"error": f"API request failed: {str(e)}"}
@@ -62,45 +86,75 @@ def fetch_web_page(url, headers=None, timeout=30, clean=True):
     try:
         # Set default headers if none provided
         if headers is None:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
+            # A page prefetched after a search was fetched with the default headers
+            if prefetch.page_prefetcher.enabled:
+                page = prefetch.page_prefetcher.get(url, timeout=runtime.remaining(timeout))
+                if page is not None and (page["clean"] is not None or not clean):
+                    return page["clean"] if clean else page["raw"]
+            headers = DEFAULT_HEADERS
         
         # Make the request
-        response = requests.get(url, headers=headers, timeout=timeout)
+        response = requests.get(url, headers=headers, timeout=runtime.remaining(timeout))
         response.raise_for_status()  # Raise an exception for HTTP errors
         
         if not clean:
             return response.text
         
         # Clean and extract main content using BeautifulSoup
-        try:
-            from bs4 import BeautifulSoup
-            import re
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script, style, and other non-content elements
-            for element in soup(["script", "style", "header", "footer", "nav", "aside", "form", "iframe", "noscript"]):
-                element.decompose()
-                
-            # Remove elements likely to be ads, banners, etc.
-            for element in soup.find_all(class_=re.compile('(ad|banner|menu|sidebar|footer|header|nav|comment|popup|cookie)', re.IGNORECASE)):
-                element.decompose()
-                
-            
-            clean_text = soup.get_text(separator=' ', strip=True)
-                
-            # Clean up extra whitespace
-            clean_text = re.sub(r'\s+', ' ', clean_text).strip()
-            
-            return clean_text
-            
-        except ImportError:
-            # If BeautifulSoup is not available, return the raw text
+        if BeautifulSoup is None:
             return {"error": "BeautifulSoup is required for content cleaning but not installed. Install with: pip install beautifulsoup4"}
+
+        return _clean_html(response.text)
             
     except requests.exceptions.RequestException as e:
         return {"error": f"Request failed: {str(e)}"}
     except Exception as e:
-        return {"error": f"An unexpected error occurred: {str(e)}"}
\ No newline at end of file
+        return {"error": f"An unexpected error occurred: {str(e)}"}
+
+
+def _clean_html(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Remove script, style, and other non-content elements
+    for element in soup(["script", "style", "header", "footer", "nav", "aside", "form", "iframe", "noscript"]):
+        element.decompose()
+        
+    # Remove elements likely to be ads, banners, etc.
+    for element in soup.find_all(class_=_NOISE_CLASSES):
+        element.decompose()
+        
+    clean_text = soup.get_text(separator=' ', strip=True)
+        
+    # Clean up extra whitespace
+    return _WHITESPACE.sub(' ', clean_text).strip()
+
+
+def _result_urls(results):
+    """The page URLs of a Brave search response, in ranking order."""
+    web_results = results.get("web", {}).get("results", []) if isinstance(results, dict) else []
+    return [
+        result["url"] for result in web_results
+        if isinstance(result, dict) and str(result.get("url", "")).startswith(("http://", "https://"))
+    ]
+
+
+def _prefetch_page(url):
+    """
+    Download a page for the prefetcher and clean it the way fetch_web_page does.
+
+    Returns:
+        dict: {"raw": page text, "clean": cleaned text or None without BeautifulSoup},
+            or None for pages that are not text or are too large.
+    """
+    with requests.get(url, headers=DEFAULT_HEADERS, timeout=PREFETCH_TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        content_type = response.headers.get("Content-Type", "")
+        if content_type and not content_type.startswith(("text/", "application/xhtml")):
+            return None
+        data = bytearray()
+        for block in response.iter_content(64 * 1024):
+            data += block
+            if len(data) > PREFETCH_MAX_PAGE_BYTES:
+                return None
+        raw = data.decode(response.encoding or 'utf-8', errors='replace')
+    return {"raw": raw, "clean": _clean_html(raw) if BeautifulSoup is not None else None}
\ No newline at end of file
@@ -24,6 +24,8 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 let chat_context = [];
+let session_id = null;
+const API_BASE_URL = 'http://localhost:5001';
 let currentMessageElement = null;
 let currentTextElement = null;
 let isFirstAssistantChunk = true;
@@ -91,18 +93,9 @@ function sendMessage(regenerate = false) {
         clearChatButton.disabled = true;
         showTypingIndicator();
 
-        // Use fetch to POST the message to the query endpoint API
-        fetch('http://localhost:5001/api/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                messages: chatContext,
-                temperature: 0.4,
-                max_output_tokens: 1000,
-            }),
-        })
+        // Use fetch to POST the message to the query endpoint API.
+        // The server keeps the conversation in a session, so only the new message is sent.
+        postChat(chatContext, regenerate ? null : message)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Network response was not ok');
@@ -149,7 +142,12 @@ function sendMessage(regenerate = false) {
                             let chunkType = isFirstAssistantChunk ? 'first_chunk' : 'chunk';
                             appendMessage('assistant', data.content, chunkType);
                             isFirstAssistantChunk = false;
+                        } else if (data.role === 'tool_chunk') {
+                            // Output of a tool that is still running
+                            appendToolOutput(data.index || 0, data.tool, data.content);
                         } else if (data.role === 'tool_call' || data.role === 'user') {
+                            // The tool's result replaces its live output
+                            removeToolOutput(data.index || 0);
                             // Handle non-streaming tool calls and user messages
                             // Force these to be new messages by resetting current elements
                             currentMessageElement = null;
@@ -167,6 +165,58 @@ function sendMessage(regenerate = false) {
     }
 }
 
+function createSession(messages) {
+    return fetch(`${API_BASE_URL}/api/sessions`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ messages: messages }),
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error('Could not create a chat session');
+        }
+        return response.json();
+    })
+    .then(data => {
+        session_id = data.session_id;
+        return session_id;
+    });
+}
+
+function postChat(chatContext, message, retried = false) {
+    // A new session is seeded with everything before the new message
+    const history = message === null ? chatContext : chatContext.slice(0, -1);
+    const ready = session_id === null ? createSession(history) : Promise.resolve(session_id);
+
+    return ready.then(id => {
+        const body = {
+            session_id: id,
+            temperature: 0.4,
+            max_output_tokens: 1000,
+        };
+        if (message !== null) {
+            body.message = message;
+        }
+        return fetch(`${API_BASE_URL}/api/chat`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(body),
+        });
+    })
+    .then(response => {
+        if (response.status === 404 && !retried) {
+            // The server no longer has the session; start a new one from our copy
+            session_id = null;
+            return postChat(chatContext, message, true);
+        }
+        return response;
+    });
+}
+
 function regenerateLastMessage() {
     let chatContext = [];
     let typingIndicatorId = '';
@@ -204,6 +254,9 @@ function regenerateLastMessage() {
     // Remove the last bot message from the context
     chatContext.pop();
 
+    // The server-side session still has the old response, so start a new one from our copy
+    session_id = null;
+
     sendMessage(true);
 }
 
@@ -288,6 +341,41 @@ function appendMessage(sender, message, type = 'regular') {
     scrollToBottom();
 }
 
+// Live output of running tool calls, keyed by call index
+const toolOutputElements = {};
+
+function appendToolOutput(index, tool, text) {
+    let element = toolOutputElements[index];
+    if (!element) {
+        const chatArea = document.getElementById('chat-area');
+        const typingIndicator = document.getElementById('typing-indicator');
+        element = document.createElement('div');
+        element.classList.add('chat-message', 'tool_call', 'tool-running');
+        const botTitle = document.createElement('div');
+        botTitle.classList.add('bot-title');
+        const botImage = document.createElement('i');
+        botImage.classList = 'bot-logo bi bi-hourglass-split';
+        botTitle.appendChild(botImage);
+        botTitle.appendChild(document.createTextNode(` ${tool || 'tool'}`));
+        element.appendChild(botTitle);
+        const output = document.createElement('pre');
+        element.appendChild(output);
+        chatArea.insertBefore(element, typingIndicator);
+        toolOutputElements[index] = element;
+    }
+    // Not part of chat_context: the model gets the tool's final result instead
+    element.querySelector('pre').textContent += text;
+    scrollToBottom();
+}
+
+function removeToolOutput(index) {
+    const element = toolOutputElements[index];
+    if (element) {
+        element.remove();
+        delete toolOutputElements[index];
+    }
+}
+
 // Function to apply Prism.js syntax highlighting
 function applyPrismHighlighting(element) {
     if (!element) return;
@@ -388,6 +476,7 @@ function clearChatHistory() {
 
         //Clear the context for this tab
         chat_context = [];
+        session_id = null;
     }
 }
 
@@ -428,6 +517,7 @@ function restoreChat(event) {
 
                     // Update context
                     chat_context = restoredChat;
+                    session_id = null;
                 } else {
                     throw new Error('Invalid file format');
                 }
@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from qwen_api_lib import agent
+
+
+def text_chunk(content):
+    """A streamed chat completion chunk carrying some response text."""
+    delta = SimpleNamespace(content=content, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def tool_block(name, tool_input):
+    return "[[qwen-tool-start]]\n" + json.dumps({"name": name, "input": tool_input}) + "\n[[qwen-tool-end]]\n"
+
+
+class SingleCallDispatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "notes.txt")
+        with open(self.path, "w") as f:
+            f.write("before\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_turn(self, chunks):
+        turn = agent.AssistantTurn(parallel_tools=False)
+        turn.native_tools = False
+        turn.detector = agent.ToolCallDetector()
+        for chunk in chunks:
+            turn.feed(text_chunk(chunk))
+        messages = []
+        lines = list(turn.finish(messages))
+        return turn, messages, lines
+
+    def test_mutating_call_followed_by_second_call_never_runs(self):
+        chunks = [
+            tool_block("append_file", {"path": self.path, "content": "after\n"}),
+            "and then\n",
+            tool_block("read_file", {"path": self.path}),
+        ]
+        turn, messages, _ = self.run_turn(chunks)
+
+        self.assertEqual(turn.started, {})
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "before\n")
+        self.assertIn("Multiple tool calls found", messages[-1]["content"])
+
+    def test_single_mutating_call_runs_after_the_stream(self):
+        turn, messages, _ = self.run_turn([tool_block("append_file", {"path": self.path, "content": "after\n"})])
+
+        self.assertIn(0, turn.started)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "before\nafter\n")
+
+    def test_read_only_call_starts_while_streaming(self):
+        turn = agent.AssistantTurn(parallel_tools=False)
+        turn.native_tools = False
+        turn.detector = agent.ToolCallDetector()
+        turn.feed(text_chunk(tool_block("read_file", {"path": self.path})))
+
+        self.assertIn(0, turn.started)
+        list(turn.finish([]))
+
+
+if __name__ == "__main__":
+    unittest.main()
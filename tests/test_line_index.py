@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from qwen_tools_lib import filesystem, line_index
+
+
+class LineSplittingTest(unittest.TestCase):
+
+    CONTENT = "one\x0cstill one\r\ntwo\u2028still two\nthree\x85\x1c\x0b\nfour\n"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "lines.txt")
+        with open(self.path, "w", encoding="utf-8", newline="") as f:
+            f.write(self.CONTENT)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_both(self, **kwargs):
+        """read_file through the in-memory path and through the memory-mapped index."""
+        small = filesystem.read_file(self.path, **kwargs)
+        line_index.line_indexes = line_index.LineIndexCache()
+        with mock.patch.object(line_index, "MMAP_MIN_BYTES", 0):
+            large = filesystem.read_file(self.path, **kwargs)
+        return small, large
+
+    def test_ranges_agree_for_small_and_large_files(self):
+        for kwargs in (
+            {"start_line": 1, "end_line": 1},
+            {"start_line": 2, "end_line": 3},
+            {"start_line": 2, "enumerate": True},
+            {"tail_lines": 2},
+            {"tail_lines": 3, "enumerate": True},
+            {"end_line": 4, "show_repr": True},
+        ):
+            with self.subTest(**kwargs):
+                small, large = self.read_both(**kwargs)
+                self.assertEqual(small, large)
+
+    def test_only_newlines_end_lines(self):
+        self.assertEqual(filesystem.read_file(self.path, start_line=2, end_line=2), "two\u2028still two")
+        self.assertEqual(
+            line_index.split_lines(self.CONTENT),
+            ["one\x0cstill one", "two\u2028still two", "three\x85\x1c\x0b", "four"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
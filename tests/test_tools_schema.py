@@ -0,0 +1,37 @@
+import unittest
+
+from qwen_tools_lib.qwen_tools import JSON_SCHEMA_TYPES, get_tools_dict, tools_to_schema
+
+
+class ToolsSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = {entry["function"]["name"]: entry["function"] for entry in tools_to_schema(get_tools_dict())}
+
+    def test_every_tool_is_a_function_with_object_parameters(self):
+        self.assertTrue(self.schema)
+        for name, function in self.schema.items():
+            with self.subTest(tool=name):
+                parameters = function["parameters"]
+                self.assertEqual(parameters["type"], "object")
+                self.assertLessEqual(set(parameters["required"]), set(parameters["properties"]))
+
+    def test_every_array_property_has_items(self):
+        arrays = 0
+        for name, function in self.schema.items():
+            for property_name, prop in function["parameters"]["properties"].items():
+                if prop["type"] != "array":
+                    continue
+                arrays += 1
+                with self.subTest(tool=name, parameter=property_name):
+                    self.assertIn(prop["items"]["type"], JSON_SCHEMA_TYPES.values())
+        self.assertGreater(arrays, 0)
+
+    def test_array_item_types(self):
+        self.assertEqual(self.schema["multi_edit_file"]["parameters"]["properties"]["edits"]["items"], {"type": "object"})
+        self.assertEqual(self.schema["list_directory"]["parameters"]["properties"]["include"]["items"], {"type": "string"})
+        self.assertEqual(self.schema["git_restore"]["parameters"]["properties"]["files"]["items"], {"type": "string"})
+
+
+if __name__ == "__main__":
+    unittest.main()